@@ -1,5 +1,9 @@
 from configparser import RawConfigParser, ExtendedInterpolation
-from app.repository import get_engine, get_session_fabric
+from app.repository import get_engine, get_session_fabric, get_async_engine, get_async_session_fabric
+from app.logging_config import setup_logging
+from app.services.cache import configure_cache
+from app.services.auth import configure_auth
+import logging
 import sys
 import os
 
@@ -15,12 +19,31 @@ app_config.read('.\\app.ini')
 # путь на сервере
 # app_config.read('/opt/WarehouseProject/app.ini')
 #app_config.read('C:\\Users\\bl1nk999\\PycharmProjects\\SQL-AIS\\app.ini')
-print("Секции в config.ini:", app_config.sections())
+# Логирование настраивается до создания движков и импорта маршрутов (раздел [Logging] необязательный)
+setup_logging(app_config['Logging'] if app_config.has_section('Logging') else None)
+logging.getLogger(__name__).debug("Секции в config.ini: %s", app_config.sections())
 
 db_config = app_config['Database']      # получаем значения раздела "Database"
 
 # Инициализируем драйвер соединения с БД используя параметры конфигурации 'database_url' (строка подключения к БД)
-# и 'database_sync' - флаг автоматической генерации таблиц БД при запуске приложения
-engine = get_engine(db_url=db_config['database_url'], db_sync=db_config['database_sync'])
+# и 'database_sync' - флаг автоматической генерации таблиц БД при запуске приложения.
+# Остальные параметры раздела (PRAGMA SQLite, настройки пула соединений) применяются к каждому соединению
+engine = get_engine(db_url=db_config['database_url'], db_sync=db_config['database_sync'], db_options=db_config)
 
 SessionLocal = get_session_fabric(engine)
+
+# Асинхронный движок для маршрутов API (тот же 'database_url' с асинхронным драйвером)
+async_engine = get_async_engine(db_url=db_config['database_url'], db_options=db_config)
+
+AsyncSessionLocal = get_async_session_fabric(async_engine)
+
+# Раздел [Debug] - режим разработки (трассировка SQL-запросов); раздел необязательный
+debug_config = app_config['Debug'] if app_config.has_section('Debug') else {}
+
+log_config = app_config['Logging'] if app_config.has_section('Logging') else {}
+
+# Раздел [Cache] - кэш справочников (категории, склады, пользователи); раздел необязательный
+configure_cache(app_config['Cache'] if app_config.has_section('Cache') else None)
+
+# Раздел [Auth] - ключ подписи и время действия токенов доступа; раздел необязательный
+configure_auth(app_config['Auth'] if app_config.has_section('Auth') else None)
@@ -0,0 +1,174 @@
+import atexit
+import json
+import logging
+import queue
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Mapping, Optional
+from app.metrics import route_template
+
+"""
+    Настройка логирования приложения (раздел [Logging] файла конфигурации).
+
+    Записи лога передаются через очередь (QueueHandler): в потоке запроса выполняются только проверка уровня
+    и добавление полей контекста, а форматирование (в том числе подстановка аргументов сообщения)
+    и запись в консоль/файл - в отдельном потоке QueueListener. Поэтому аргументы сообщений - простые
+    значения (id, числа, строки), а не объекты ORM.
+
+    К каждой записи добавляются структурированные поля: переданные через extra (id_product, id_purchase, ...)
+    и поля текущего HTTP-запроса (method, route). Формат вывода - text (поля key=value) или json.
+"""
+
+DEFAULT_LEVEL = 'INFO'
+DEFAULT_LEVELS = 'sqlalchemy.engine:WARNING, app.requests:WARNING'
+SLOW_REQUEST_MS = 1000
+
+# HTTP-запрос текущего контекста (scope ASGI) - для полей method и route записей лога
+LOG_REQUEST: ContextVar[Optional[dict]] = ContextVar('log_request', default=None)
+
+# Стандартные атрибуты LogRecord - все остальные атрибуты записи считаются структурированными полями
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+request_logger = logging.getLogger('app.requests')
+
+listener: Optional[QueueListener] = None
+
+
+def record_fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES}
+
+
+class StructuredFormatter(logging.Formatter):
+    """ Формат text: "время уровень логгер: сообщение key=value ..."; формат json: объект JSON в строке """
+
+    def __init__(self, output_format: str = 'text'):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        self.output_format = output_format
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = record_fields(record)
+        if self.output_format == 'json':
+            data = {
+                "time": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage(),
+                **fields,
+            }
+            if record.exc_info:
+                data["exception"] = self.formatException(record.exc_info)
+            return json.dumps(data, ensure_ascii=False, default=str)
+
+        line = super().format(record)
+        if fields:
+            extra = ' '.join(f'{key}={value}' for key, value in fields.items())
+            # поля - в конце первой строки (до трассировки исключения)
+            first, sep, rest = line.partition('\n')
+            line = f'{first} {extra}{sep}{rest}'
+        return line
+
+
+class RequestContextFilter(logging.Filter):
+    """ Добавляет к записи поля текущего HTTP-запроса (выполняется в потоке запроса) """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        scope = LOG_REQUEST.get()
+        if scope is not None:
+            if not hasattr(record, 'method'):
+                record.method = scope['method']
+            if not hasattr(record, 'route'):
+                record.route = route_template(scope)
+        return True
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """ QueueHandler без форматирования в потоке запроса: запись передается в очередь как есть """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def parse_levels(value: str) -> dict:
+    """ "логгер:уровень, логгер:уровень" -> {логгер: уровень} """
+    levels = {}
+    for item in value.split(','):
+        if item.strip():
+            name, _, level = item.partition(':')
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def stop_logging():
+    """ Останавливает поток записи лога, предварительно выведя оставшиеся в очереди записи """
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+def setup_logging(log_options: Optional[Mapping] = None):
+    """ Настраивает корневой логгер: очередь + поток записи в консоль (и файл), уровни логгеров модулей """
+    global listener
+    log_options = log_options or {}
+    stop_logging()
+
+    formatter = StructuredFormatter(log_options.get('format') or 'text')
+    handlers = [logging.StreamHandler()]
+    if log_options.get('file'):
+        handlers.append(logging.FileHandler(log_options['file'], encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = BackgroundQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, BackgroundQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(log_options.get('level') or DEFAULT_LEVEL)
+    for name, level in parse_levels(log_options.get('levels') or DEFAULT_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # оставшиеся в очереди записи выводятся при завершении процесса
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
+
+
+class RequestLogMiddleware:
+    """ ASGI middleware: контекст HTTP-запроса для записей лога и строка лога на запрос (логгер app.requests).
+        Запросы дольше slow_request_ms - уровень WARNING, остальные - DEBUG """
+
+    def __init__(self, app, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        response_status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                response_status[0] = message['status']
+            await send(message)
+
+        token = LOG_REQUEST.set(scope)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            level = logging.WARNING if duration_ms >= self.slow_request_ms else logging.DEBUG
+            if request_logger.isEnabledFor(level):
+                request_logger.log(level, "%s %s %s", scope['method'], scope['path'], response_status[0],
+                                   extra={"status": response_status[0], "duration_ms": duration_ms})
+            LOG_REQUEST.reset(token)
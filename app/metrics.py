@@ -0,0 +1,214 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.responses import Response
+
+"""
+    Модуль метрик приложения в текстовом формате Prometheus (/metrics).
+
+    MetricsMiddleware (ASGI) измеряет длительность запросов по шаблону маршрута (/api/products/{id_product},
+    а не фактическому пути - число рядов метрик ограничено), число выполняемых запросов и ошибки.
+    События движков SQLAlchemy (instrument_engine) считают SQL-запросы и время БД текущего HTTP-запроса:
+    статистика запроса хранится в ContextVar, который наследуется потоками run_in_threadpool
+    и greenlet-ами асинхронного движка.
+"""
+
+# Границы корзин гистограмм: длительность запроса (с) и число SQL-запросов на HTTP-запрос
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+# Метка маршрута для запросов, не сопоставленных ни одному маршруту API (404, статические файлы)
+UNMATCHED_ROUTE = 'unmatched'
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names: Tuple[str, ...], values: tuple, extra: str = '') -> str:
+    labels = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """ Базовый класс метрики: ряды значений по наборам меток """
+    kind = 'untyped'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        with self.lock:
+            rows = list(self.values.items())
+        return self.header() + [f'{self.name}{format_labels(self.labels, labels)} {format_value(value)}'
+                                for labels, value in rows]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+
+class Histogram(Metric):
+    """ Гистограмма: для каждого набора меток - счетчики корзин (не накопительные), сумма и число наблюдений """
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect_left(self.buckets, value)  # value <= buckets[index]
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        with self.lock:
+            rows = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.values.items()]
+        lines = self.header()
+        for labels, counts, total, count in rows:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{format_labels(self.labels, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labels, labels)} {format_value(total)}')
+            lines.append(f'{self.name}_count{format_labels(self.labels, labels)} {count}')
+        return lines
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Длительность обработки HTTP-запроса',
+                             ('method', 'route'))
+REQUESTS = Counter('http_requests_total', 'Число HTTP-запросов', ('method', 'route', 'status'))
+REQUEST_ERRORS = Counter('http_request_errors_total', 'Число HTTP-запросов, завершившихся ошибкой сервера (5xx)',
+                         ('method', 'route'))
+REQUESTS_IN_PROGRESS = Gauge('http_requests_in_progress', 'Число выполняемых HTTP-запросов', ('method',))
+DB_STATEMENTS = Counter('db_statements_total', 'Число SQL-запросов при обработке HTTP-запросов', ('route',))
+DB_DURATION = Counter('db_duration_seconds_total', 'Время выполнения SQL-запросов при обработке HTTP-запросов',
+                      ('route',))
+REQUEST_STATEMENTS = Histogram('http_request_db_statements', 'Число SQL-запросов на один HTTP-запрос',
+                               ('route',), STATEMENT_BUCKETS)
+
+METRICS = (REQUEST_DURATION, REQUESTS, REQUEST_ERRORS, REQUESTS_IN_PROGRESS, DB_STATEMENTS, DB_DURATION,
+           REQUEST_STATEMENTS)
+
+
+class RequestStats:
+    """ SQL-запросы текущего HTTP-запроса: число и суммарное время """
+    __slots__ = ('statements', 'db_time', 'started')
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.started = 0.0
+
+
+REQUEST_STATS: ContextVar[Optional[RequestStats]] = ContextVar('request_stats', default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = REQUEST_STATS.get()
+    if stats is not None:
+        stats.started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = REQUEST_STATS.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += time.perf_counter() - stats.started
+
+
+def instrument_engine(engine: Engine):
+    """ Подключает подсчет SQL-запросов к движку (для асинхронного движка передается async_engine.sync_engine) """
+    if not event.contains(engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def route_template(scope: dict) -> str:
+    """ Шаблон пути маршрута, который FastAPI сохраняет в scope при сопоставлении запроса """
+    route = scope.get('route')
+    return getattr(route, 'path', UNMATCHED_ROUTE) if route is not None else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """ ASGI middleware метрик HTTP-запросов (без буферизации ответа, в отличие от BaseHTTPMiddleware) """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        response_status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                response_status[0] = message['status']
+            await send(message)
+
+        stats = RequestStats()
+        token = REQUEST_STATS.set(stats)
+        REQUESTS_IN_PROGRESS.inc((method,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_PROGRESS.dec((method,))
+            REQUEST_STATS.reset(token)
+
+            route = route_template(scope)
+            REQUEST_DURATION.observe((method, route), elapsed)
+            REQUESTS.inc((method, route, str(response_status[0])))
+            if response_status[0] >= 500:
+                REQUEST_ERRORS.inc((method, route))
+            if stats.statements:
+                DB_STATEMENTS.inc((route,), stats.statements)
+                DB_DURATION.inc((route,), stats.db_time)
+            REQUEST_STATEMENTS.observe((route,), stats.statements)
+
+
+def render_metrics() -> str:
+    return '\n'.join(line for metric in METRICS for line in metric.render()) + '\n'
+
+
+async def metrics_endpoint():
+    """ Метрики в текстовом формате Prometheus """
+    return Response(render_metrics(), media_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, ForeignKey, Boolean, Integer, Numeric, String, Text, DateTime
+from sqlalchemy import Column, ForeignKey, Boolean, Integer, Numeric, String, Text, Date, DateTime, Index, literal_column, \
+    and_
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, foreign
 from datetime import datetime
 
 Base = declarative_base()
@@ -32,15 +33,37 @@ class Param(Base):
     description = Column(String(255), nullable=True)
 
 
+class ParamDelta(Base):
+    """ Журнал приращений накопительных параметров (Rev, DirectSoldCosts, IndirectCosts, DirectCosts).
+        Операции только добавляют строки, не обновляя общую строку в params, поэтому не конкурируют
+        за блокировку. Текущее значение параметра = params.value + сумма приращений журнала. """
+    __tablename__ = 'param_ledger'
+    id = Column(Integer, primary_key=True)
+    key = Column(String(100), ForeignKey('params.key'), nullable=False)
+    delta = Column(Numeric, nullable=False)
+    created_on = Column(DateTime(), default=datetime.now)
+
+    __table_args__ = (
+        Index('ix_param_ledger_key', 'key', 'id'),
+    )
+
+
 class Product(Base):
     __tablename__ = 'product'
     id = Column(Integer, primary_key=True)
     name = Column(String(100), unique=True)
-    id_category = Column(Integer, ForeignKey('category.id'))
+    id_category = Column(Integer, ForeignKey('category.id'), index=True)
     total_count = Column(Integer, default=0)
-    id_purchase = Column(Integer, ForeignKey('purchase.id'))
+    id_purchase = Column(Integer, ForeignKey('purchase.id'), index=True)
     price_mod = Column(Integer, default=0)
 
+    category = relationship('Category')
+    # открытые (не израсходованные) партии товара в порядке FIFO, только для чтения
+    open_batches = relationship('Purchase',
+                                primaryjoin=lambda: and_(Product.id == foreign(Purchase.id_product), Purchase.is_open),
+                                order_by=lambda: Purchase.created_on,
+                                viewonly=True)
+
 
 class Purchase(Base):
     __tablename__ = 'purchase'
@@ -48,12 +71,34 @@ class Purchase(Base):
     id_product = Column(Integer, ForeignKey('product.id'))
     purchase_price = Column(Numeric, nullable=False)
     selling_price = Column(Numeric, nullable=False)
-    id_warehouse = Column(Integer, ForeignKey('warehouse.id'))
+    id_warehouse = Column(Integer, ForeignKey('warehouse.id'), index=True)
     count = Column(Integer, default=0)
     current_count = Column(Integer, default=0)
-    id_user = Column(Integer, ForeignKey('users.id'))
+    id_user = Column(Integer, ForeignKey('users.id'), index=True)
     created_on = Column(DateTime(), default=datetime.now)
 
+    warehouse = relationship('Warehouse')
+
+    __table_args__ = (
+        # все закупки товара (get_purchase_by_product, get_transactions_by_id_product)
+        Index('ix_purchase_product_created', 'id_product', 'created_on'),
+        # частичный индекс только по открытым партиям - поиск следующей партии по FIFO (find_next_purchase)
+        Index('ix_purchase_open_batches', 'id_product', 'created_on',
+              sqlite_where=current_count != literal_column('0'),
+              postgresql_where=current_count != literal_column('0')),
+    )
+
+    @hybrid_property
+    def is_open(self):
+        """ Партия еще не израсходована.
+            В SQL условие рендерится с литералом (а не параметром), иначе SQLite не сможет
+            использовать частичный индекс ix_purchase_open_batches """
+        return self.current_count != 0
+
+    @is_open.expression
+    def is_open(cls):
+        return cls.current_count != literal_column('0')
+
 
 class Category(Base):
     __tablename__ = 'category'
@@ -73,20 +118,78 @@ class Transaction(Base):
     __tablename__ = 'transaction'
     id = Column(Integer, primary_key=True)
     id_type = Column(Integer, ForeignKey('types_transaction.id'))
-    id_purchase = Column(Integer, ForeignKey('purchase.id'))
+    id_purchase = Column(Integer, ForeignKey('purchase.id'), index=True)
     amount = Column(Integer, nullable=False)
-    id_user = Column(Integer, ForeignKey('users.id'))
+    id_user = Column(Integer, ForeignKey('users.id'), index=True)
     created_on = Column(DateTime(), default=datetime.now)
 
+    __table_args__ = (
+        # выборка операций по типу за период (get_transactions_by_type, отчеты по выручке)
+        Index('ix_transaction_type_created', 'id_type', 'created_on'),
+        # выборка операций за период без учета типа
+        Index('ix_transaction_created', 'created_on'),
+    )
+
 
 class Expense(Base):
     __tablename__ = 'expense'
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
     cost = Column(Numeric, nullable=False)  # Сумма расхода
-    id_user = Column(Integer, ForeignKey('users.id'))
+    id_user = Column(Integer, ForeignKey('users.id'), index=True)
     description = Column(String(255), nullable=True)  # Описание расхода
-    created_on = Column(DateTime, default=datetime.now)  # Дата расхода
+    created_on = Column(DateTime, default=datetime.now, index=True)  # Дата расхода
+
+
+class DailySales(Base):
+    """ Дневные итоги операций по товару, складу и типу операции.
+        Обновляются в той же транзакции БД, что и сами операции, поэтому отчеты за любой период
+        читают (дни x товары) строк вместо всех операций. revenue - по цене продажи (только продажи),
+        cost - по цене закупки. """
+    __tablename__ = 'daily_sales'
+    day = Column(Date, primary_key=True)
+    id_product = Column(Integer, primary_key=True)
+    id_warehouse = Column(Integer, primary_key=True)  # 0 - партия без склада
+    id_type = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric, nullable=False, default=0)
+    cost = Column(Numeric, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)  # число операций
+    margin_sum = Column(Numeric, nullable=False, default=0)  # сумма маржи (%) операций - для средней маржи
+
+    __table_args__ = (
+        Index('ix_daily_sales_product_day', 'id_product', 'day'),
+    )
+
+
+class DailyExpenses(Base):
+    """ Дневные итоги косвенных расходов (таблица expense) """
+    __tablename__ = 'daily_expenses'
+    day = Column(Date, primary_key=True)
+    cost = Column(Numeric, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ProductSales(Base):
+    """ Итоги продаж товара за все время (обновляются в той же транзакции БД, что и продажи) """
+    __tablename__ = 'product_sales'
+    id_product = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric, nullable=False, default=0)
+    cost = Column(Numeric, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)  # число операций продажи
+
+
+class ProductRanking(Base):
+    """ Результаты ABC-анализа и места товаров в рейтингах по прибыли, выручке и марже.
+        Пересчитываются по product_sales, когда sales_count строки расходится с product_sales.count """
+    __tablename__ = 'product_ranking'
+    id_product = Column(Integer, primary_key=True)
+    sales_count = Column(Integer, nullable=False)  # product_sales.count на момент расчета
+    abc_group = Column(String(1), nullable=False)
+    rank_profit = Column(Integer, nullable=False, index=True)
+    rank_sales = Column(Integer, nullable=False, index=True)
+    rank_margin = Column(Integer, nullable=False, index=True)
 
 
 class TypesTransaction(Base):
@@ -99,7 +202,7 @@ class Users(Base):
     id = Column(Integer, primary_key=True)
     login = Column(String(100), unique=True, nullable=False)
     password = Column(String(255), nullable=False)
-    id_role = Column(Integer, ForeignKey('role.id'))  # can be admin or user
+    id_role = Column(Integer, ForeignKey('role.id'), index=True)  # can be admin or user
 
 class Role(Base):
     __tablename__ = 'role'
@@ -0,0 +1,84 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class KpiDTO(BaseModel):
+    """ Ключевые показатели за период """
+    totalRevenue: float
+    totalCost: float
+    totalProfit: float
+    averageMargin: float
+    activeProductsCount: int
+    averageCheck: float
+    stockTurnover: float
+    transactionCount: int
+
+
+class ProductSalesDTO(BaseModel):
+    """ Продажи товара за период """
+    id: int
+    name: Optional[str] = None
+    revenue: float
+    profit: float
+    quantity: int
+    margin: float
+
+
+class CategorySalesDTO(BaseModel):
+    revenue: float
+    profit: float
+    count: int
+    margin: float
+
+
+class TopProductsDTO(BaseModel):
+    """ Топ товаров по прибыли, выручке и марже """
+    byProfit: List[ProductSalesDTO]
+    bySales: List[ProductSalesDTO]
+    byMargin: List[ProductSalesDTO]
+
+
+class AnalyticsDTO(BaseModel):
+    """ Аналитика продаж за период (/api/analytics); ключи словарей по дням - даты ISO """
+    kpi: KpiDTO
+    revenueByDay: Dict[str, float]
+    expensesByDay: Dict[str, float]
+    profitByDay: Dict[str, float]
+    salesByCategory: Dict[str, CategorySalesDTO]
+    productSales: Dict[int, ProductSalesDTO]
+    topProducts: TopProductsDTO
+
+
+class AbcGroupDTO(BaseModel):
+    """ Группа ABC-анализа: товары группы, их прибыль и доля в общей прибыли (%) """
+    products: List[ProductSalesDTO]
+    profit: float
+    count: int
+    profitPercent: float
+
+
+class AbcDTO(BaseModel):
+    """ ABC-анализ (/api/abc) """
+    A: AbcGroupDTO
+    B: AbcGroupDTO
+    C: AbcGroupDTO
+    topProducts: TopProductsDTO
+
+
+class ForecastSeriesDTO(BaseModel):
+    """ История и прогноз одного ряда на общей шкале дат labels (None - нет значения для даты) """
+    labels: List[str]
+    actualValues: List[Optional[float]]
+    forecastValues: List[Optional[float]]
+    confidenceLower: List[Optional[float]]
+    confidenceUpper: List[Optional[float]]
+    trendSlope: float
+    seasonalPattern: List[float]
+    dayOfWeekPattern: List[float]
+
+
+class ForecastDTO(BaseModel):
+    """ Прогноз общей выручки и прогнозы запрошенных товаров (/api/forecast) """
+    total: ForecastSeriesDTO
+    products: Dict[int, ForecastSeriesDTO]
@@ -0,0 +1,8 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class BatchRequest(BaseModel):
+    """ DTO для пакетного получения записей по списку id """
+    ids: List[int] = Field(max_length=10000)
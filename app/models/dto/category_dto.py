@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class CategoryBase(BaseModel):
@@ -6,4 +6,6 @@ class CategoryBase(BaseModel):
 
 
 class CategoryDTO(CategoryBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
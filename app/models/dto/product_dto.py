@@ -1,6 +1,7 @@
 from datetime import datetime
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class ProductBase(BaseModel):
@@ -10,7 +11,40 @@ class ProductBase(BaseModel):
 
 
 class ProductDTO(ProductBase):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    id_category: Optional[int] = None
+    total_count: Optional[int] = None
+    id_purchase: Optional[int] = None
+    price_mod: Optional[int] = None
+
+
+class ProductPageDTO(BaseModel):
+    """ Страница товаров (следующая страница - after_id = next_after_id) """
+    items: List[ProductDTO]
+    next_after_id: Optional[int] = None
+
+
+class InventoryBatchDTO(BaseModel):
+    """ Открытая партия товара в обзоре склада """
     id: int
-    id_purchase: int
-    total: int
+    purchase_price: float
+    selling_price: float
+    count: Optional[int] = None
+    current_count: Optional[int] = None
+    id_warehouse: Optional[int] = None
+    warehouse: Optional[str] = None
+    created_on: Optional[datetime] = None
 
+
+class InventoryProductDTO(BaseModel):
+    """ Товар в обзоре склада: категория, общий остаток и открытые партии """
+    id: int
+    name: Optional[str] = None
+    id_category: Optional[int] = None
+    category: Optional[str] = None
+    total_count: Optional[int] = None
+    id_purchase: Optional[int] = None
+    price_mod: Optional[int] = None
+    batches: List[InventoryBatchDTO]
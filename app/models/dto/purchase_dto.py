@@ -1,6 +1,7 @@
 from datetime import datetime
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class PurchaseBase(BaseModel):
@@ -13,7 +14,24 @@ class PurchaseBase(BaseModel):
 
 
 class PurchaseDTO(PurchaseBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
+    id_product: Optional[int] = None
+    id_warehouse: Optional[int] = None
+    id_user: Optional[int] = None
     selling_price: float
     current_count: int
-    created_on: datetime
+    created_on: Optional[datetime] = None
+
+
+class ImportErrorDTO(BaseModel):
+    line: int
+    error: str
+
+
+class ImportReportDTO(BaseModel):
+    """ Отчет импорта закупок: число загруженных партий и ошибки по номерам строк файла """
+    imported: int
+    error_count: int
+    errors: List[ImportErrorDTO]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class RoleBase(BaseModel):
@@ -6,5 +6,7 @@ class RoleBase(BaseModel):
 
 
 class RoleDTO(RoleBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
 
@@ -1,6 +1,7 @@
 from datetime import datetime
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class TransactionBase(BaseModel):
@@ -11,10 +12,42 @@ class TransactionBase(BaseModel):
 
 
 class TransactionDTO(TransactionBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
-    created_on: datetime
+    id_type: Optional[int] = None
+    id_purchase: Optional[int] = None
+    id_user: Optional[int] = None
+    created_on: Optional[datetime] = None
+
+
+class TransactionPageDTO(BaseModel):
+    """ Страница операций (следующая страница - cursor = next_cursor) """
+    items: List[TransactionDTO]
+    next_cursor: Optional[str] = None
 
 
 class TypeTransactionDTO(BaseModel):
     id: int
-    name: int
+    name: str
+
+
+class BulkTransactionLine(BaseModel):
+    """ Строка пакетной операции: продажа (1) или списание (3) количества товара.
+        id_purchase - партия для списания (по умолчанию - по FIFO, как продажа) """
+    id_type: Literal[1, 3]
+    id_product: int
+    amount: int = Field(gt=0)
+    id_purchase: Optional[int] = None
+
+
+class BulkAllocationDTO(BaseModel):
+    """ Операция, созданная строкой пакетной операции: партия и списанное с нее количество """
+    id_purchase: int
+    amount: int
+
+
+class BulkTransactionRequest(BaseModel):
+    """ DTO для пакетной продажи/списания (например, всего чека) """
+    id_user: int
+    lines: List[BulkTransactionLine] = Field(min_length=1, max_length=10000)
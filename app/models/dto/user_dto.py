@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
 
 
 class UserBase(BaseModel):
@@ -7,10 +9,19 @@ class UserBase(BaseModel):
     id_role: int
 
 
-class UserDTO(UserBase):
+class UserDTO(BaseModel):
+    """ Пользователь в ответах API (без хеша пароля) """
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
+    login: str
+    id_role: Optional[int] = None
+
 
 class UserRoleUpdate(BaseModel):
     user_login: str
     new_role_id: int
 
+
+class StatusDTO(BaseModel):
+    status: str
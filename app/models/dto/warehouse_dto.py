@@ -1,6 +1,7 @@
 from datetime import datetime
+from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class WarehouseBase(BaseModel):
@@ -9,5 +10,7 @@ class WarehouseBase(BaseModel):
 
 
 class WarehouseDTO(WarehouseBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
-    created_on: datetime
+    created_on: Optional[datetime] = None
@@ -1,25 +1,136 @@
+import re
 import sqlalchemy
-from sqlalchemy.engine import Engine
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from app.models import dao
-from typing import Optional
+from typing import Optional, List, Mapping
 
 
 """
     Модуль инициализации "Соя Хранения Данных" приложения (Persistence Layer, Repository Layer)
 """
 
+# Асинхронные драйверы, которыми заменяется синхронный драйвер из строки подключения
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'mysql': 'mysql+aiomysql',
+    'mariadb': 'mariadb+aiomysql',
+}
 
-def get_engine(db_url: str, db_sync: str = 'false') -> Optional[Engine]:
-    """ Функция создает движок для управления подключениями к БД """
-    sqla_engine = sqlalchemy.create_engine(url=db_url)
+# PRAGMA SQLite, задаваемые в разделе [Database] файла конфигурации: ключ конфигурации -> PRAGMA
+SQLITE_PRAGMAS = {
+    'sqlite_journal_mode': 'journal_mode',
+    'sqlite_synchronous': 'synchronous',
+    'sqlite_cache_size': 'cache_size',
+    'sqlite_mmap_size': 'mmap_size',
+    'sqlite_busy_timeout': 'busy_timeout',
+    'sqlite_temp_store': 'temp_store',
+}
+
+# Параметры пула соединений для серверных БД (MariaDB/MySQL): ключ конфигурации -> тип значения
+POOL_OPTIONS = {
+    'pool_size': int,
+    'max_overflow': int,
+    'pool_recycle': int,
+    'pool_timeout': int,
+    'pool_pre_ping': lambda value: value.lower() == 'true',
+}
+
+
+def get_engine_options(db_url, db_options: Optional[Mapping] = None) -> dict:
+    """ Функция возвращает параметры create_engine из конфигурации.
+        Для SQLite параметры пула не применяются (соединения с файлом БД дешевые) """
+    if not db_options or make_url(db_url).get_backend_name() == 'sqlite':
+        return {}
+    return {key: convert(db_options[key]) for key, convert in POOL_OPTIONS.items() if db_options.get(key)}
+
+
+def get_sqlite_pragmas(db_options: Optional[Mapping] = None) -> dict:
+    """ Функция возвращает PRAGMA SQLite из конфигурации """
+    pragmas = {}
+    for key, pragma in SQLITE_PRAGMAS.items():
+        value = (db_options or {}).get(key)
+        if not value:
+            continue
+        # значение подставляется в текст PRAGMA, поэтому допускаем только слова и числа
+        if not re.fullmatch(r'-?\w+', value):
+            raise ValueError(f"Недопустимое значение параметра {key}: {value}")
+        pragmas[pragma] = value
+    return pragmas
+
+
+def set_sqlite_pragmas(engine: Engine, pragmas: dict):
+    """ Функция применяет PRAGMA к каждому новому соединению с БД SQLite """
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+        cursor.close()
+
+
+def get_engine(db_url: str, db_sync: str = 'false', db_options: Optional[Mapping] = None) -> Optional[Engine]:
+    """ Функция создает движок для управления подключениями к БД.
+        db_options - раздел [Database] конфигурации с параметрами PRAGMA SQLite и пула соединений """
+    sqla_engine = sqlalchemy.create_engine(url=db_url, **get_engine_options(db_url, db_options))
+    set_sqlite_pragmas(sqla_engine, get_sqlite_pragmas(db_options))
     # если в конфигурации приложения указан флаг синхронизации БД,
     # то пытаемся сгененрировать таблицы при запуске приложения
     if db_sync == 'true':
         dao.Base.metadata.create_all(bind=sqla_engine)
+        # create_all не трогает уже существующие таблицы, поэтому индексы досоздаем отдельно
+        sync_indexes(sqla_engine)
     return sqla_engine
 
 
+def sync_indexes(engine: Engine) -> List[str]:
+    """ Функция создает в существующей БД индексы, объявленные в моделях, но отсутствующие в схеме.
+        Позволяет добавить новые индексы без пересоздания БД. Возвращает имена созданных индексов """
+    inspector = sqlalchemy.inspect(engine)
+    created = []
+    for table in dao.Base.metadata.tables.values():
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                created.append(index.name)
+    return created
+
+
+def explain_query_plan(engine: Engine, statement: str, parameters=None) -> List[str]:
+    """ Функция возвращает план выполнения запроса (EXPLAIN QUERY PLAN, только для SQLite) """
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters or ())
+        return [row[-1] for row in rows]
+
+
 def get_session_fabric(engine: Engine):
     """ Функция создает фабрику подключений (сессий) к БД """
     return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def get_async_url(db_url: str) -> URL:
+    """ Функция заменяет драйвер в строке подключения на асинхронный (sqlite -> aiosqlite, pymysql -> aiomysql) """
+    url = make_url(db_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def get_async_engine(db_url: str, db_options: Optional[Mapping] = None) -> AsyncEngine:
+    """ Функция создает асинхронный движок для управления подключениями к БД """
+    async_engine = create_async_engine(url=get_async_url(db_url), **get_engine_options(db_url, db_options))
+    # события соединений регистрируются на синхронном "ядре" асинхронного движка
+    set_sqlite_pragmas(async_engine.sync_engine, get_sqlite_pragmas(db_options))
+    return async_engine
+
+
+def get_async_session_fabric(engine: AsyncEngine):
+    """ Функция создает фабрику асинхронных сессий к БД.
+        Объекты не "протухают" после commit, т.к. сериализуются в ответ уже после закрытия сессии """
+    return async_sessionmaker(autoflush=False, expire_on_commit=False, bind=engine)
@@ -0,0 +1,40 @@
+from decimal import Decimal
+from typing import Any
+from starlette.responses import JSONResponse
+import orjson
+
+"""
+    Класс ответа API по умолчанию: JSON через orjson.
+
+    Маршруты объявляют response_model (DTO из app/models/dto), поэтому FastAPI преобразует результат
+    сервиса валидатором pydantic-core, минуя jsonable_encoder, а готовые словари и списки
+    сериализует orjson - в несколько раз быстрее json.dumps.
+
+    Большие списки строк таблиц (функции сервиса возвращают строки Row, а не объекты ORM) маршруты
+    отдают напрямую: ORJSONResponse(row_dicts(rows)) - без валидации каждой строки по response_model,
+    который в этом случае описывает ответ только в схеме OpenAPI.
+"""
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def json_default(value: Any):
+    """ Типы, которые orjson не сериализует сам: Decimal - как в jsonable_encoder (целое или float) """
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+class ORJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=json_default, option=ORJSON_OPTIONS)
+
+
+def row_dicts(rows: list) -> list:
+    """ Строки Row -> словари {столбец: значение} """
+    if not rows:
+        return []
+    fields = rows[0]._fields
+    return [dict(zip(fields, row)) for row in rows]
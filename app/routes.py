@@ -1,20 +1,29 @@
-from fastapi import APIRouter, HTTPException, status, Request, Response, Depends
+from fastapi import APIRouter, HTTPException, status, Request, Response, Depends, Query
 from starlette.responses import RedirectResponse
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from app.services import service
-from .config import SessionLocal
-from models.dto.product_dto import ProductDTO, ProductBase
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
+from app.services import service, async_service, export_service, import_service, cache, auth
+from .config import AsyncSessionLocal, SessionLocal
+from models.dto.product_dto import ProductDTO, ProductBase, ProductPageDTO, InventoryProductDTO
 from models.dto.warehouse_dto import WarehouseDTO, WarehouseBase
 from models.dto.category_dto import CategoryDTO, CategoryBase
-from models.dto.user_dto import UserDTO, UserBase, UserRoleUpdate
+from models.dto.user_dto import UserDTO, UserBase, UserRoleUpdate, StatusDTO
 from models.dto.role_dto import RoleDTO, RoleBase
-from models.dto.purchase_dto import PurchaseDTO, PurchaseBase
-from models.dto.transaction_dto import TransactionDTO, TransactionBase, TypeTransactionDTO
+from models.dto.purchase_dto import PurchaseDTO, PurchaseBase, ImportReportDTO
+from models.dto.transaction_dto import TransactionDTO, TransactionBase, TypeTransactionDTO, BulkTransactionRequest, \
+    TransactionPageDTO, BulkAllocationDTO
+from models.dto.batch_dto import BatchRequest
+from models.dto.analytics_dto import AnalyticsDTO, AbcDTO, ForecastDTO
+from app.responses import ORJSONResponse, row_dicts
 from pydantic import BaseModel
+from typing import Optional, List, Dict
 import os
+import io
+import logging
 import datetime
-import secrets
+import tempfile
 from pathlib import Path
 from werkzeug.security import check_password_hash
 
@@ -29,6 +38,57 @@ class AuthResponse(BaseModel):
     token: str
     token_type: str = "bearer"
     expires: datetime.datetime
+    id_user: int
+    login: str
+    id_role: Optional[int] = None
+
+
+logger = logging.getLogger(__name__)
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+async def current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> dict:
+    """ Зависимость маршрутов, доступных только после входа: данные токена из заголовка Authorization: Bearer.
+        Проверяется подпись и срок действия токена, без запроса к БД """
+    claims = auth.verify_token(credentials.credentials) if credentials is not None else None
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Требуется вход в систему",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims
+
+
+async def admin_user(user: dict = Depends(current_user)) -> dict:
+    """ Зависимость маршрутов управления пользователями: роль администратора из токена, сверенная с текущей ролью
+        пользователя из кэша справочника (изменение роли или удаление в другом процессе uvicorn отзывает
+        токены только в нем) """
+    if user['role'] == auth.ADMIN_ROLE:
+        async with AsyncSessionLocal() as session:
+            users = await async_service.get_all_users(session)
+        if any(account.id == user['sub'] and account.id_role == auth.ADMIN_ROLE for account in users):
+            return user
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+
+
+def not_modified(request: Request, response: Response, *regions: str) -> Optional[Response]:
+    """ Условный GET списка: ETag - версии регионов кэша (счетчики изменений таблиц).
+        Если ETag совпадает с If-None-Match, возвращает ответ 304 - список не читается из БД и не сериализуется;
+        иначе добавляет ETag к ответу и возвращает None. Без общего счетчика версий (backend = local)
+        ETag не выдается """
+    etag = cache.etag(*regions)
+    if etag is None:
+        return None
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        if etag in tags or '*' in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
 
 
 # Инициализируем шаблоны - используем относительный путь
@@ -36,7 +96,8 @@ template_dir = Path(__file__).parent.parent / "templates"
 templates = Jinja2Templates(directory=template_dir)
 
 # API маршруты
-router = APIRouter(prefix='/api', tags=['Warehouse API'])
+# ответы сериализуются по response_model маршрута и выводятся через orjson (app/responses.py)
+router = APIRouter(prefix='/api', tags=['Warehouse API'], default_response_class=ORJSONResponse)
 
 # Веб-маршруты
 web_router = APIRouter(tags=['Web Pages'])
@@ -71,8 +132,8 @@ async def inventory_page(request: Request):
 @router.post('/authenticate', status_code=200, response_model=AuthResponse)
 async def authenticate(auth_data: AuthRequest):
     """Аутентификация пользователя и получение токена"""
-    with SessionLocal() as session:
-        user = service.get_user_by_login(session, auth_data.login)
+    async with AsyncSessionLocal() as session:
+        user = await async_service.get_user_by_login(session, auth_data.login)
 
         if not user:
             raise HTTPException(
@@ -82,24 +143,40 @@ async def authenticate(auth_data: AuthRequest):
             )
 
         # Проверка пароля с использованием werkzeug.security
-        if not check_password_hash(user.password, auth_data.password):
+        # (хеширование выполняется в пуле потоков, чтобы не блокировать цикл событий)
+        if not await run_in_threadpool(check_password_hash, user.password, auth_data.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверные учетные данные",
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        # Генерируем токен
-        token = secrets.token_hex(32)
-        expires = datetime.datetime.now() + datetime.timedelta(hours=24)
+        # Подписанный токен с id пользователя и ролью: маршруты проверяют его без запроса к БД
+        token, expires = auth.create_token(user.id, user.login, user.id_role)
 
         return {
             "token": token,
             "token_type": "bearer",
-            "expires": expires
+            "expires": datetime.datetime.fromtimestamp(expires),
+            "id_user": user.id,
+            "login": user.login,
+            "id_role": user.id_role
         }
 
 
+@router.get('/me', response_model=UserDTO)
+async def get_current_user(user: dict = Depends(current_user)):
+    """ Пользователь текущего токена """
+    return {"id": user['sub'], "login": user['login'], "id_role": user['role']}
+
+
+@router.post('/logout', status_code=200, response_model=StatusDTO)
+async def logout(user: dict = Depends(current_user)):
+    """ Выход из системы: токен отзывается до окончания срока действия """
+    auth.revoke_token(user)
+    return {"status": "success"}
+
+
 # Существующие API маршруты
 @router.get('/')
 async def api_root():
@@ -110,95 +187,220 @@ async def api_root():
 ''' Все get методы ниже '''
 
 
-@router.get('/get_product_by_id/{id_product}')
+@router.get('/get_product_by_id/{id_product}', response_model=Optional[ProductDTO])
 async def get_product_by_id(id_product: int):
     """ Получение продукта по ID """
-    with SessionLocal() as session:
-        return service.get_product_by_id(session, id_product)
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_product_by_id(session, id_product)
 
 
-@router.get('/get_product_all')
-async def get_product_all():
+@router.get('/get_product_all', response_model=List[ProductDTO])
+async def get_product_all(request: Request, response: Response):
     """ Получение всех продуктов """
-    with SessionLocal() as session:
-        return service.get_product_all(session)
+    cached_response = not_modified(request, response, cache.PRODUCT)
+    if cached_response is not None:
+        return cached_response
+    async with AsyncSessionLocal() as session:
+        products = await async_service.get_product_all(session)
+        return ORJSONResponse(row_dicts(products), headers=dict(response.headers))
+
 
+@router.get('/products', response_model=ProductPageDTO)
+async def get_products_page(id_warehouse: Optional[int] = None,
+                            after_id: Optional[int] = None,
+                            limit: int = Query(service.DEFAULT_PAGE_SIZE, ge=1, le=service.MAX_PAGE_SIZE)):
+    """ Постраничное получение товаров (следующая страница - after_id из ответа) """
+    async with AsyncSessionLocal() as session:
+        products, next_after_id = await async_service.get_products_page(session, id_warehouse, after_id, limit)
+        return ORJSONResponse({"items": row_dicts(products), "next_after_id": next_after_id})
 
-@router.get('/get_warehouses')
-async def get_warehouses():
+
+@router.get('/inventory_overview', response_model=List[InventoryProductDTO])
+async def get_inventory_overview():
+    """ Товары с категорией, общим остатком и открытыми партиями (один запрос на вкладку) """
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_inventory_overview(session)
+
+
+@router.get('/get_warehouses', response_model=List[WarehouseDTO])
+async def get_warehouses(request: Request, response: Response):
     """ Получение склада по ID """
-    with SessionLocal() as session:
-        return service.get_warehouses(session)
+    cached_response = not_modified(request, response, cache.WAREHOUSE)
+    if cached_response is not None:
+        return cached_response
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_warehouses(session)
 
 
-@router.get('/get_warehouse_by_id/{id_warehouse}')
+@router.get('/get_warehouse_by_id/{id_warehouse}', response_model=Optional[WarehouseDTO])
 async def get_warehouse_by_id(id_warehouse: int):
     """ Получение склада по ID """
-    with SessionLocal() as session:
-        return service.get_warehouse_by_id(session, id_warehouse)
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_warehouse_by_id(session, id_warehouse)
 
 
-@router.get('/get_category_by_id/{id_category}')
+@router.get('/get_category_by_id/{id_category}', response_model=Optional[CategoryDTO])
 async def get_category_by_id(id_category: int):
     """ Получение категории по ID """
-    with SessionLocal() as session:
-        return service.get_category_by_id(session, id_category)
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_category_by_id(session, id_category)
 
 
-@router.get('/get_user_by_login/{login}')
+@router.get('/get_user_by_login/{login}', response_model=Optional[UserDTO])
 async def get_user_by_login(login: str):
     """ Получение пользователя по логину """
-    with SessionLocal() as session:
-        return service.get_user_by_login(session, login)
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_user_by_login(session, login)
 
-@router.get('/get_all_users')
+@router.get('/get_all_users', response_model=List[UserDTO], dependencies=[Depends(admin_user)])
 async def get_all_users():
     """ Получение пользователя по логину """
-    with SessionLocal() as session:
-        return service.get_all_users(session)
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_all_users(session)
 
 
-@router.get('/get_purchase_by_product/{id_product}')
+@router.get('/get_purchase_by_product/{id_product}', response_model=List[PurchaseDTO])
 async def get_purchase_by_product(id_product: int):
     """ Получение списка закупок по ID товара"""
-    with SessionLocal() as session:
-        return service.get_purchase_by_product(session, id_product)
+    async with AsyncSessionLocal() as session:
+        return ORJSONResponse(row_dicts(await async_service.get_purchase_by_product(session, id_product)))
 
 
-@router.get('/get_purchase_by_id/{id}')
+@router.get('/get_purchase_by_id/{id}', response_model=Optional[PurchaseDTO])
 async def get_purchase_by_product(id: int):
     """ Получение списка закупок по ID товара"""
-    with SessionLocal() as session:
-        return service.get_purchase_by_id(session, id)
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_purchase_by_id(session, id)
 
 
-@router.get('/get_transactions_by_id_product/{id_product}')
-async def get_transaction_by_id_product(id_product: int):
-    """ Получение списка операций по ID товара"""
-    with SessionLocal() as session:
-        return service.get_transactions_by_id_product(session, id_product)
+@router.post('/purchases/batch', response_model=Dict[int, PurchaseDTO])
+async def get_purchases_batch(batch: BatchRequest):
+    """ Получение закупок по списку ID (ответ - словарь {id: закупка}) """
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_purchases_by_ids(session, batch.ids)
+
 
+@router.post('/products/batch', response_model=Dict[int, ProductDTO])
+async def get_products_batch(batch: BatchRequest):
+    """ Получение товаров по списку ID (ответ - словарь {id: товар}) """
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_products_by_ids(session, batch.ids)
 
-@router.get('/get_transactions_by_type/{id_type}')
-async def get_transactions_by_type(id_type: int):
-    """ Получение списка операций по ID типа операции"""
-    with SessionLocal() as session:
-        return service.get_transactions_by_type(session, id_type)
 
+@router.post('/categories/batch', response_model=Dict[int, CategoryDTO])
+async def get_categories_batch(batch: BatchRequest):
+    """ Получение категорий по списку ID (ответ - словарь {id: категория}) """
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_categories_by_ids(session, batch.ids)
 
-@router.get('/get_transactions_all')
+
+@router.get('/get_transactions_by_id_product/{id_product}', response_model=List[TransactionDTO])
+async def get_transaction_by_id_product(id_product: int):
+    """ Получение списка операций по ID товара"""
+    async with AsyncSessionLocal() as session:
+        return ORJSONResponse(row_dicts(await async_service.get_transactions_by_id_product(session, id_product)))
+
+
+@router.get('/get_transactions_by_type/{id_type}', response_model=List[TransactionDTO])
+async def get_transactions_by_type(id_type: int,
+                                   date_from: Optional[datetime.datetime] = None,
+                                   date_to: Optional[datetime.datetime] = None,
+                                   id_warehouse: Optional[int] = None):
+    """ Получение списка операций по ID типа операции (опционально - за период и по складу)"""
+    async with AsyncSessionLocal() as session:
+        transactions = await async_service.get_transactions_by_type(session, id_type, date_from, date_to, id_warehouse)
+        return ORJSONResponse(row_dicts(transactions))
+
+
+@router.get('/transactions', response_model=TransactionPageDTO)
+async def get_transactions_page(id_type: Optional[int] = None,
+                                date_from: Optional[datetime.datetime] = None,
+                                date_to: Optional[datetime.datetime] = None,
+                                id_warehouse: Optional[int] = None,
+                                cursor: Optional[str] = None,
+                                limit: int = Query(service.DEFAULT_PAGE_SIZE, ge=1, le=service.MAX_PAGE_SIZE)):
+    """ Постраничное получение операций с фильтрами (следующая страница - cursor из ответа) """
+    async with AsyncSessionLocal() as session:
+        try:
+            transactions, next_cursor = await async_service.get_transactions_page(session, id_type, date_from,
+                                                                                  date_to, id_warehouse, cursor,
+                                                                                  limit)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Некорректный курсор страницы"
+            )
+        return ORJSONResponse({"items": row_dicts(transactions), "next_cursor": next_cursor})
+
+
+@router.get('/get_transactions_all', response_model=List[TransactionDTO])
 async def get_transactions_all():
     """ Получение списка операций """
-    with SessionLocal() as session:
-        return service.get_transactions_all(session)
+    async with AsyncSessionLocal() as session:
+        return ORJSONResponse(row_dicts(await async_service.get_transactions_all(session)))
 
 
-@router.get('/get_categories')
-async def get_categories():
+@router.get('/get_categories', response_model=List[CategoryDTO])
+async def get_categories(request: Request, response: Response):
     """Получение всех категорий товаров"""
-    with SessionLocal() as session:
-        categories = service.get_all_categories(session)
-        return [{"id": category.id, "name": category.name} for category in categories]
+    cached_response = not_modified(request, response, cache.CATEGORY)
+    if cached_response is not None:
+        return cached_response
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_all_categories(session)
+
+
+@router.get('/analytics', response_model=AnalyticsDTO)
+async def get_analytics(date_from: Optional[datetime.datetime] = None,
+                        date_to: Optional[datetime.datetime] = None,
+                        top_n: int = Query(10, ge=1, le=100)):
+    """ Аналитика продаж за период (KPI, динамика по дням, категории, топ товаров) """
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_analytics(session, date_from, date_to, top_n)
+
+
+@router.get('/forecast', response_model=ForecastDTO)
+async def get_forecast(id_product: List[int] = Query([]),
+                       date_from: Optional[datetime.datetime] = None,
+                       date_to: Optional[datetime.datetime] = None,
+                       days: int = Query(30, ge=1, le=365)):
+    """ Прогноз выручки на days дней: общий и по товарам id_product (история - период date_from..date_to) """
+    if date_from is not None and date_to is not None and date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from позже date_to")
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_forecast(session, id_product, date_from, date_to, days)
+
+
+@router.get('/abc', response_model=AbcDTO)
+async def get_abc(date_from: Optional[datetime.datetime] = None,
+                  date_to: Optional[datetime.datetime] = None,
+                  top_n: int = Query(10, ge=1, le=100)):
+    """ ABC-анализ товаров по прибыли и топ товаров по прибыли, выручке и марже (без периода - за все время) """
+    async with AsyncSessionLocal() as session:
+        return await async_service.get_abc(session, date_from, date_to, top_n)
+
+
+@router.get('/export/{table_name}')
+async def export_table(table_name: str,
+                       format: str = Query('ndjson', pattern='^(ndjson|csv)$'),
+                       date_from: Optional[datetime.datetime] = None,
+                       date_to: Optional[datetime.datetime] = None):
+    """ Потоковая выгрузка таблицы transaction, purchase или expense в формате NDJSON или CSV """
+    if table_name not in export_service.EXPORT_TABLES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Выгрузка доступна для таблиц: {', '.join(export_service.EXPORT_TABLES)}"
+        )
+
+    async def generate():
+        # сессия живет, пока отправляется ответ
+        async with AsyncSessionLocal() as session:
+            async for chunk in export_service.export_table(session, table_name, format, date_from, date_to):
+                yield chunk
+
+    return StreamingResponse(generate(),
+                             media_type=export_service.EXPORT_FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="{table_name}.{format}"'})
 
 
 ''' Все get методы закончены '''
@@ -206,33 +408,33 @@ async def get_categories():
 ''' Все create методы ниже '''
 
 
-@router.post('/create_product', status_code=201)
+@router.post('/create_product', status_code=201, response_model=bool)
 async def create_product(product: ProductBase):
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         """ Создание товара """
-        return service.create_product(session,
-                                      name=product.name,
-                                      id_category=product.id_category)
+        return await async_service.create_product(session,
+                                                  name=product.name,
+                                                  id_category=product.id_category)
 
 
-@router.post('/create_warehouse', status_code=201)
+@router.post('/create_warehouse', status_code=201, response_model=bool)
 async def create_warehouse(warehouse: WarehouseBase):
     """ Создание склада """
-    with SessionLocal() as session:
-        return service.create_warehouse(session, warehouse.address, warehouse.name)
+    async with AsyncSessionLocal() as session:
+        return await async_service.create_warehouse(session, warehouse.address, warehouse.name)
 
 
-@router.post('/create_category', status_code=201)
+@router.post('/create_category', status_code=201, response_model=bool)
 async def create_category(category: CategoryBase):
     """ Создание категории товара """
-    with SessionLocal() as session:
-        return service.create_category(session, name=category.name)
+    async with AsyncSessionLocal() as session:
+        return await async_service.create_category(session, name=category.name)
 
 
-@router.post('/create_user', status_code=201)
+@router.post('/create_user', status_code=201, response_model=bool)
 async def create_user(user: UserBase):
     """ Создание пользователя """
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
             # Проверка на пустое имя пользователя
             if not user.login or not user.login.strip():
@@ -250,7 +452,7 @@ async def create_user(user: UserBase):
 
             # Проверяем, что пользователь с таким логином не существует
             try:
-                existing_user = service.get_user_by_login(session, user.login)
+                existing_user = await async_service.get_user_by_login(session, user.login)
                 # Если пользователь найден, возвращаем ошибку
                 if existing_user:
                     raise HTTPException(
@@ -270,7 +472,7 @@ async def create_user(user: UserBase):
                 user.id_role = 2  # По умолчанию обычный пользователь
 
             # Создаем пользователя
-            result = service.create_user(session, login=user.login, password=user.password, id_role=user.id_role)
+            result = await async_service.create_user(session, login=user.login, password=user.password, id_role=user.id_role)
             return result
 
         except HTTPException as http_exc:
@@ -278,41 +480,79 @@ async def create_user(user: UserBase):
             raise http_exc
         except Exception as e:
             # Если произошла другая ошибка
-            print(f"Error in create_user: {str(e)}")
+            logger.exception("Ошибка при создании пользователя %s", user.login)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Ошибка при создании пользователя: {str(e)}"
             )
 
 
-@router.post('/create_role', status_code=201)
+@router.post('/create_role', status_code=201, response_model=bool)
 async def create_role(role: RoleBase):
     """ Создание роли """
-    with SessionLocal() as session:
-        return service.add_role(session, role_name=role.name)
+    async with AsyncSessionLocal() as session:
+        return await async_service.add_role(session, role_name=role.name)
 
 
-@router.post('/add_transaction', status_code=201)
+@router.post('/add_transaction', status_code=201, response_model=bool)
 async def add_transaction(transaction: TransactionBase):
     """ Создание транзакции """
-    with SessionLocal() as session:
-        return service.create_transaction(session,
-                                          id_type=transaction.id_type,
-                                          id_purchase=transaction.id_purchase,
-                                          amount=transaction.amount,
-                                          id_user=transaction.id_user)
+    async with AsyncSessionLocal() as session:
+        return await async_service.create_transaction(session,
+                                                      id_type=transaction.id_type,
+                                                      id_purchase=transaction.id_purchase,
+                                                      amount=transaction.amount,
+                                                      id_user=transaction.id_user)
+
+
+@router.post('/transactions/bulk', status_code=201, response_model=List[List[BulkAllocationDTO]])
+async def add_bulk_transactions(request: BulkTransactionRequest):
+    """ Пакетная продажа/списание: все строки выполняются одной транзакцией БД или не выполняется ни одна """
+    async with AsyncSessionLocal() as session:
+        try:
+            return await async_service.add_bulk_transactions(session, [line.model_dump() for line in request.lines],
+                                                             request.id_user)
+        except ValueError as ex:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ex))
 
 
-@router.post('/add_purchase', status_code=201)
+@router.post('/add_purchase', status_code=201, response_model=bool)
 async def add_purchase(purchase: PurchaseBase):
     """ Добавление новой партии закупки товара """
-    with SessionLocal() as session:
-        return service.create_purchase(session,
-                                       id_product=purchase.id_product,
-                                       purchase_price=purchase.purchase_price,
-                                       id_warehouse=purchase.id_warehouse,
-                                       count=purchase.count,
-                                       id_user=purchase.id_user)
+    async with AsyncSessionLocal() as session:
+        return await async_service.create_purchase(session,
+                                                   id_product=purchase.id_product,
+                                                   purchase_price=purchase.purchase_price,
+                                                   id_warehouse=purchase.id_warehouse,
+                                                   count=purchase.count,
+                                                   id_user=purchase.id_user)
+
+
+@router.post('/import/purchases', response_model=ImportReportDTO)
+async def import_purchases(request: Request,
+                           id_user: int,
+                           format: str = Query('csv', pattern='^(csv|ndjson)$')):
+    """ Импорт закупок из файла CSV/NDJSON, переданного телом запроса (поля: id_product, purchase_price,
+        id_warehouse, count). Возвращает число загруженных партий и ошибки по номерам строк """
+    # тело принимается потоком во временный файл (в памяти - до 1 МБ) и разбирается построчно
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+
+        def run_import():
+            with SessionLocal() as session:
+                lines = io.TextIOWrapper(body, encoding='utf-8-sig', newline='')
+                try:
+                    return import_service.import_purchases(session, lines, format, id_user)
+                finally:
+                    lines.detach()
+
+        try:
+            # разбор и загрузка - в отдельном потоке, чтобы не блокировать цикл событий
+            return await run_in_threadpool(run_import)
+        except ValueError as ex:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ex))
 
 
 """ Create-методы закончены """
@@ -320,76 +560,84 @@ async def add_purchase(purchase: PurchaseBase):
 """Прочие методы (delete, update)"""
 
 
-@router.delete('/delete_product_by_id', status_code=201)
+@router.delete('/delete_product_by_id', status_code=201, response_model=bool)
 async def delete_product_by_id(id_product: int):
     """ Удаление продукта по ID """
-    with SessionLocal() as session:
-        return service.delete_product_by_id(session, id_product)
+    async with AsyncSessionLocal() as session:
+        return await async_service.delete_product_by_id(session, id_product)
 
 
-@router.delete('/delete_user_by_login', status_code=201)
+@router.delete('/delete_user_by_login', status_code=201, response_model=bool, dependencies=[Depends(admin_user)])
 async def delete_user_by_login(login: str):
     """ Удаление пользователя по логину """
-    with SessionLocal() as session:
-        return service.delete_user(session, login)
+    async with AsyncSessionLocal() as session:
+        deleted = await async_service.delete_user(session, login)
+    if deleted:
+        auth.revoke_user(login)
+    return deleted
 
 
-@router.put('/update_purchase_warehouse', status_code=201)
+@router.put('/update_purchase_warehouse', status_code=201, response_model=bool)
 async def update_purchase_warehouse(id_purchase: int, id_warehouse: int):
     """ Перемещение партии товара на другой склад"""
-    with SessionLocal() as session:
-        return service.update_purchase_warehouse(session, id_purchase, id_warehouse)
+    async with AsyncSessionLocal() as session:
+        return await async_service.update_purchase_warehouse(session, id_purchase, id_warehouse)
 
 
-@router.put('/update_product_name', status_code=201)
+@router.put('/update_product_name', status_code=201, response_model=bool)
 async def update_product_name(id_product: int, new_name: str):
     """ Обновление имени продукта """
-    with SessionLocal() as session:
-        return service.update_product_name(session, id_product, new_name)
+    async with AsyncSessionLocal() as session:
+        return await async_service.update_product_name(session, id_product, new_name)
 
 
-@router.put('/update_warehouse_name', status_code=201)
+@router.put('/update_warehouse_name', status_code=201, response_model=bool)
 async def update_warehouse_name(id_warehouse: int, new_name: str):
     """ Обновление имени склада """
-    with SessionLocal() as session:
-        return service.update_warehouse_name(session, id_warehouse, new_name)
+    async with AsyncSessionLocal() as session:
+        return await async_service.update_warehouse_name(session, id_warehouse, new_name)
 
 
-@router.put('/update_warehouse_address', status_code=201)
+@router.put('/update_warehouse_address', status_code=201, response_model=bool)
 async def update_warehouse_address(id_warehouse: int, new_address: str):
     """ Обновление адреса склада """
-    with SessionLocal() as session:
-        return service.update_warehouse_address(session, id_warehouse, new_address)
+    async with AsyncSessionLocal() as session:
+        return await async_service.update_warehouse_address(session, id_warehouse, new_address)
 
 
-@router.put('/update_category_name', status_code=201)
+@router.put('/update_category_name', status_code=201, response_model=bool)
 async def update_category_name(id_category: int, new_name: str):
     """ Обновление имени категории """
-    with SessionLocal() as session:
-        return service.update_category_name(session, id_category, new_name)
+    async with AsyncSessionLocal() as session:
+        return await async_service.update_category_name(session, id_category, new_name)
 
 
-@router.put('/update_user_password', status_code=201)
+@router.put('/update_user_password', status_code=201, response_model=bool)
 async def update_user_password(user_login: str, new_password: str):
     """ Обновление пароля пользователя """
-    with SessionLocal() as session:
-        return service.update_user_password(session, user_login, new_password)
+    async with AsyncSessionLocal() as session:
+        updated = await async_service.update_user_password(session, user_login, new_password)
+    if updated:
+        auth.revoke_user(user_login)
+    return updated
 
 
-@router.put('/update_user_role', status_code=200)
+@router.put('/update_user_role', status_code=200, response_model=StatusDTO, dependencies=[Depends(admin_user)])
 async def update_user_role(user_data: UserRoleUpdate):
     """Обновление роли пользователя"""
-    with SessionLocal() as session:
-        success = service.update_user_role(session, user_data.user_login, user_data.new_role_id)
+    async with AsyncSessionLocal() as session:
+        success = await async_service.update_user_role(session, user_data.user_login, user_data.new_role_id)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Пользователь не найден"
             )
-        return {"status": "success"}
+    # выпущенные токены содержат прежнюю роль
+    auth.revoke_user(user_data.user_login)
+    return {"status": "success"}
 
-@router.delete('/delete_transaction_by_id_product', status_code=201)
+@router.delete('/delete_transaction_by_id_product', status_code=201, response_model=bool)
 async def delete_transaction_by_id_product(id_product: int):
     """ Удаление транзакций по ID продукта """
-    with SessionLocal() as session:
-        return service.delete_transaction_by_id_product(session, id_product)
+    async with AsyncSessionLocal() as session:
+        return await async_service.delete_transaction_by_id_product(session, id_product)
@@ -0,0 +1,135 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services import service, forecast, ranking
+import functools
+
+"""
+    Асинхронный вариант сервисного слоя для маршрутов API.
+
+    Каждая функция выполняет одноименную функцию модуля service через AsyncSession.run_sync:
+    бизнес-логика остается общей, а все обращения к БД выполняются асинхронным драйвером
+    (aiosqlite/aiomysql) и не блокируют цикл событий uvicorn - пока один запрос ждет БД,
+    обрабатываются другие.
+"""
+
+
+def run_sync(service_func):
+    """ Функция-декоратор: превращает функцию сервиса service(db: Session, ...)
+        в корутину async_func(db: AsyncSession, ...) """
+
+    @functools.wraps(service_func)
+    async def decorated_func(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(service_func, *args, **kwargs)
+
+    return decorated_func
+
+
+# region
+""" _______PARAMS________ """
+
+add_param = run_sync(service.add_param)
+get_param = run_sync(service.get_param)
+get_param_value = run_sync(service.get_param_value)
+update_param_value = run_sync(service.update_param_value)
+calc_period_results = run_sync(service.calc_period_results)
+
+# endregion
+
+# region
+""" _______PRODUCT________ """
+
+create_product = run_sync(service.create_product)
+delete_product_by_id = run_sync(service.delete_product_by_id)
+get_product_by_id = run_sync(service.get_product_by_id)
+get_product_all = run_sync(service.get_product_all)
+get_products_page = run_sync(service.get_products_page)
+get_products_by_ids = run_sync(service.get_products_by_ids)
+get_inventory_overview = run_sync(service.get_inventory_overview)
+update_product_name = run_sync(service.update_product_name)
+
+# endregion
+
+# region
+""" _______PURCHASE______ """
+
+create_purchase = run_sync(service.create_purchase)
+delete_purchase_by_id = run_sync(service.delete_purchase_by_id)
+get_purchase_by_id = run_sync(service.get_purchase_by_id)
+get_purchase_by_product = run_sync(service.get_purchase_by_product)
+get_purchases_by_ids = run_sync(service.get_purchases_by_ids)
+update_purchase_product = run_sync(service.update_purchase_product)
+update_purchase_warehouse = run_sync(service.update_purchase_warehouse)
+
+# endregion
+
+# region
+""" _______WAREHOUSE______ """
+
+create_warehouse = run_sync(service.create_warehouse)
+get_warehouse_by_id = run_sync(service.get_warehouse_by_id)
+get_warehouses = run_sync(service.get_warehouses)
+update_warehouse_name = run_sync(service.update_warehouse_name)
+update_warehouse_address = run_sync(service.update_warehouse_address)
+
+# endregion
+
+# region
+""" _______CATEGORY______ """
+
+create_category = run_sync(service.create_category)
+get_category_by_id = run_sync(service.get_category_by_id)
+get_all_categories = run_sync(service.get_all_categories)
+get_categories_by_ids = run_sync(service.get_categories_by_ids)
+update_category_name = run_sync(service.update_category_name)
+
+# endregion
+
+# region
+""" _______USER______ """
+
+create_user = run_sync(service.create_user)
+get_user_by_login = run_sync(service.get_user_by_login)
+update_user_password = run_sync(service.update_user_password)
+delete_user = run_sync(service.delete_user)
+update_user_role = run_sync(service.update_user_role)
+get_all_users = run_sync(service.get_all_users)
+
+# endregion
+
+# region
+""" _______ROLE______ """
+
+add_role = run_sync(service.add_role)
+
+# endregion
+
+# region
+""" _______TRANSACTION______ """
+
+create_transaction = run_sync(service.create_transaction)
+add_bulk_transactions = run_sync(service.add_bulk_transactions)
+get_transactions_by_id_product = run_sync(service.get_transactions_by_id_product)
+get_transactions_by_type = run_sync(service.get_transactions_by_type)
+get_transactions_all = run_sync(service.get_transactions_all)
+get_transactions_page = run_sync(service.get_transactions_page)
+delete_transaction_by_id_product = run_sync(service.delete_transaction_by_id_product)
+
+# endregion
+
+# region
+""" _______Expense______ """
+
+create_expense = run_sync(service.create_expense)
+get_expense_by_id = run_sync(service.get_expense_by_id)
+get_expense_by_date = run_sync(service.get_expense_by_date)
+delete_expense_by_id = run_sync(service.delete_expense_by_id)
+
+# endregion
+
+# region
+""" _______ANALYTICS______ """
+
+get_analytics = run_sync(service.get_analytics)
+get_forecast = run_sync(forecast.get_forecast)
+get_abc = run_sync(ranking.get_abc)
+
+# endregion
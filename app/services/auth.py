@@ -0,0 +1,159 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import threading
+import time
+from typing import Mapping, Optional, Tuple
+
+"""
+    Подписанные токены доступа (HMAC-SHA256, только стандартная библиотека).
+
+    Токен - "данные.подпись" в base64url: данные - JSON с id пользователя (sub), логином, ролью, временем
+    выпуска и окончания действия (iat, exp, unix-время) и идентификатором токена (jti). Проверка токена -
+    сравнение подписи и exp, без запроса к таблице users: роль и пользователь берутся из токена.
+
+    Список отзыва в памяти процесса хранит отозванные токены (выход из системы) и время отзыва всех токенов
+    пользователя (изменение роли или пароля, удаление - revoke_user): токены, выпущенные раньше, не принимаются.
+    Записи хранятся до окончания действия отозванных токенов.
+
+    Ключ подписи задается в разделе [Auth] файла конфигурации; без него ключ создается при запуске процесса -
+    токены не переживают перезапуск и не принимаются другими процессами uvicorn (--workers > 1).
+    Список отзыва процессами не разделяется; маршруты управления пользователями поэтому дополнительно сверяют
+    роль администратора с кэшем пользователей (регион USERS, общий счетчик версий при backend = sqlite).
+"""
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_TTL = 24 * 3600  # время действия токена, с
+MIN_SECRET_LENGTH = 32
+
+# Роль администратора (таблица role): управление пользователями
+ADMIN_ROLE = 1
+
+
+def b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class RevokedTokens:
+    """ Список отзыва: id токена (jti) -> время окончания действия токена;
+        логин -> (время отзыва токенов пользователя, время окончания действия выпущенных до него токенов) """
+
+    def __init__(self):
+        self.tokens = {}
+        self.users = {}
+        self.lock = threading.Lock()
+
+    def prune(self):
+        # токены с истекшим сроком действия не принимаются и без списка отзыва
+        now = time.time()
+        for key in [key for key, exp in self.tokens.items() if exp <= now]:
+            del self.tokens[key]
+        for login in [login for login, (revoked, expires) in self.users.items() if expires <= now]:
+            del self.users[login]
+
+    def add(self, jti: str, expires: float):
+        with self.lock:
+            self.prune()
+            self.tokens[jti] = expires
+
+    def add_user(self, login: str, revoked: float, expires: float):
+        with self.lock:
+            self.prune()
+            self.users[login] = (revoked, expires)
+
+    def is_revoked(self, claims: dict) -> bool:
+        if claims.get('jti') in self.tokens:
+            return True
+        user = self.users.get(claims.get('login'))
+        return user is not None and claims.get('iat', 0) <= user[0]
+
+    def __len__(self) -> int:
+        return len(self.tokens) + len(self.users)
+
+
+class TokenSigner:
+    """ Выпуск и проверка токенов с ключом подписи secret """
+
+    def __init__(self, secret: bytes, ttl: float = DEFAULT_TOKEN_TTL):
+        self.secret = secret
+        self.ttl = ttl
+        self.revoked = RevokedTokens()
+
+    def sign(self, payload: str) -> str:
+        return b64encode(hmac.new(self.secret, payload.encode('ascii'), hashlib.sha256).digest())
+
+    def create(self, id_user: int, login: str, id_role: int) -> Tuple[str, float]:
+        """ Новый токен и время окончания его действия (unix-время) """
+        issued = time.time()
+        expires = int(issued + self.ttl)
+        claims = {"sub": id_user, "login": login, "role": id_role, "iat": issued, "exp": expires,
+                  "jti": secrets.token_hex(8)}
+        payload = b64encode(json.dumps(claims, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+        return f'{payload}.{self.sign(payload)}', expires
+
+    def verify(self, token: str) -> Optional[dict]:
+        """ Данные токена или None, если токен поврежден, подделан, просрочен или отозван """
+        payload, _, signature = token.partition('.')
+        # токен из заголовка может содержать любые символы; подпись и данные в base64url - только ASCII
+        if not payload or not signature or not token.isascii():
+            return None
+        if not hmac.compare_digest(self.sign(payload), signature):
+            return None
+        try:
+            claims = json.loads(b64decode(payload))
+        except ValueError:
+            return None
+        if claims.get('exp', 0) <= time.time() or self.revoked.is_revoked(claims):
+            return None
+        return claims
+
+    def revoke(self, claims: dict):
+        self.revoked.add(claims['jti'], claims['exp'])
+
+    def revoke_user(self, login: str):
+        now = time.time()
+        self.revoked.add_user(login, now, now + self.ttl)
+
+
+signer = TokenSigner(secrets.token_bytes(MIN_SECRET_LENGTH))
+
+
+def configure_auth(auth_options: Optional[Mapping] = None):
+    """ Настраивает токены по разделу [Auth] файла конфигурации (раздел необязательный) """
+    global signer
+    auth_options = auth_options or {}
+    secret = auth_options.get('secret_key') or ''
+    if not secret:
+        logger.warning("Ключ подписи токенов не задан ([Auth] secret_key): токены действуют до перезапуска процесса")
+        secret_bytes = secrets.token_bytes(MIN_SECRET_LENGTH)
+    else:
+        if len(secret) < MIN_SECRET_LENGTH:
+            logger.warning("Ключ подписи токенов короче %s символов", MIN_SECRET_LENGTH)
+        secret_bytes = secret.encode('utf-8')
+    signer = TokenSigner(secret_bytes, ttl=float(auth_options.get('token_ttl', DEFAULT_TOKEN_TTL)))
+
+
+def create_token(id_user: int, login: str, id_role: int) -> Tuple[str, float]:
+    return signer.create(id_user, login, id_role)
+
+
+def verify_token(token: str) -> Optional[dict]:
+    return signer.verify(token)
+
+
+def revoke_token(claims: dict):
+    """ Отзывает токен (выход из системы): до окончания действия токен не принимается этим процессом """
+    signer.revoke(claims)
+
+
+def revoke_user(login: str):
+    """ Отзывает все выпущенные токены пользователя (изменение роли или пароля, удаление) """
+    signer.revoke_user(login)
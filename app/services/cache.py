@@ -0,0 +1,251 @@
+import functools
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Mapping, Optional
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+"""
+    Кэш справочных данных (категории, склады, пользователи, параметры) в памяти процесса.
+
+    Справочники читаются почти в каждом запросе интерфейса, а меняются редко, поэтому результаты
+    функций чтения сервиса хранятся в кэше с ограничением времени жизни (ttl) и числа записей (LRU).
+    Функции изменения справочников сбрасывают область кэша (регион) после фиксации транзакции.
+
+    В кэше хранятся отсоединенные копии записей; при попадании они присоединяются к сессии
+    вызывающей функции через Session.merge(load=False) - без запросов к БД. Функции изменения справочников
+    читают записи из БД (db.get), а не из кэша.
+
+    Несколько процессов uvicorn согласуются через общий счетчик версий регионов (backend = sqlite, по умолчанию
+    в app.ini): сброс региона увеличивает версию, и каждый процесс при чтении сравнивает ее со своей - снимок
+    параметров расчета цен во всех процессах одинаков. Счетчик в памяти процесса (backend = local) подходит только
+    для одного процесса: изменения, сделанные другим процессом, видны лишь через ttl.
+
+    Версии регионов - также счетчики изменений таблиц для ETag списков API (etag): регион PRODUCT
+    не кэшируется, его версию увеличивают функции, меняющие товары (в том числе остатки). ETag выдаются только
+    с общим счетчиком (backend = sqlite): у ETag нет ttl, и со счетчиком в памяти процесса клиент получал бы
+    ответ 304 с устаревшим списком после изменения, выполненного другим процессом uvicorn или скриптом
+    (populate_db.py, migrate_db.py).
+"""
+
+# Регионы кэша
+CATEGORY = 'category'
+WAREHOUSE = 'warehouse'
+USERS = 'users'
+PARAMS = 'params'
+PRODUCT = 'product'
+
+DEFAULT_TTL = 60.0
+DEFAULT_MAX_SIZE = 1024
+
+# Признак отсутствия записи в кэше (None - допустимое закэшированное значение "не найдено")
+MISS = object()
+
+
+class LocalVersions:
+    """ Версии регионов в памяти процесса (один процесс uvicorn) """
+    shared = False
+
+    def __init__(self):
+        # версии разных процессов не сравнимы между собой - ETag включает идентификатор процесса
+        self.token = uuid.uuid4().hex[:8]
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def get(self, region: str) -> int:
+        return self.versions.get(region, 0)
+
+    def bump(self, region: str):
+        with self.lock:
+            self.versions[region] = self.versions.get(region, 0) + 1
+
+
+class SqliteVersions:
+    """ Версии регионов в файле SQLite, общем для процессов uvicorn одного сервера """
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.local = threading.local()
+        with self.connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS cache_version "
+                               "(region TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            # идентификатор файла версий (строка с пустым регионом): при пересоздании файла версии
+            # начинаются заново, и ETag, выданные до этого, не должны совпасть с новыми
+            connection.execute("INSERT OR IGNORE INTO cache_version (region, version) VALUES ('', ?)",
+                               (uuid.uuid4().int >> 96,))
+        self.token = format(self.get(''), 'x')
+
+    def connection(self) -> sqlite3.Connection:
+        """ Соединение потока (соединение sqlite3 нельзя использовать из разных потоков) """
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def get(self, region: str) -> int:
+        row = self.connection().execute("SELECT version FROM cache_version WHERE region = ?", (region,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def bump(self, region: str):
+        self.connection().execute("INSERT INTO cache_version (region, version) VALUES (?, 1) "
+                                  "ON CONFLICT (region) DO UPDATE SET version = version + 1", (region,))
+
+
+class ReferenceCache:
+    """ LRU-кэш с временем жизни записей: (регион, БД, ключ) -> (время записи, значение) """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_size: int = DEFAULT_MAX_SIZE, enabled: bool = True,
+                 versions=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.enabled = enabled
+        self.versions = versions or LocalVersions()
+        self.seen_versions = {}
+        self.generations = {}  # число сбросов региона в этом процессе
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def sync_region(self, region: str):
+        """ Удаляет записи региона, если его версия изменилась (сброс в этом или другом процессе) """
+        version = self.versions.get(region)
+        if self.seen_versions.get(region) != version:
+            with self.lock:
+                self.drop_region(region)
+                self.seen_versions[region] = version
+
+    def drop_region(self, region: str):
+        self.generations[region] = self.generations.get(region, 0) + 1
+        for key in [key for key in self.entries if key[0] == region]:
+            del self.entries[key]
+
+    def get(self, region: str, key):
+        if not self.enabled:
+            return MISS
+        self.sync_region(region)
+        with self.lock:
+            entry = self.entries.get((region,) + key)
+            if entry is None or time.monotonic() - entry[0] >= self.ttl:
+                self.misses += 1
+                return MISS
+            self.entries.move_to_end((region,) + key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, region: str) -> int:
+        return self.generations.get(region, 0)
+
+    def set(self, region: str, key, value, generation: Optional[int] = None):
+        """ Сохраняет значение; если после чтения значения из БД (generation) регион был сброшен,
+            значение могло устареть и не сохраняется """
+        if not self.enabled:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation(region):
+                return
+            self.entries[(region,) + key] = (time.monotonic(), value)
+            self.entries.move_to_end((region,) + key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, *regions: str):
+        for region in regions:
+            self.versions.bump(region)
+            with self.lock:
+                self.drop_region(region)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+
+reference_cache = ReferenceCache()
+
+
+def configure_cache(cache_options: Optional[Mapping] = None):
+    """ Настраивает кэш по разделу [Cache] файла конфигурации (раздел необязательный) """
+    global reference_cache
+    cache_options = cache_options or {}
+    versions = None
+    if cache_options.get('backend', 'local') == 'sqlite':
+        versions = SqliteVersions(cache_options.get('shared_path') or 'cache_versions.db')
+    reference_cache = ReferenceCache(ttl=float(cache_options.get('ttl', DEFAULT_TTL)),
+                                     max_size=int(cache_options.get('max_size', DEFAULT_MAX_SIZE)),
+                                     enabled=str(cache_options.get('enabled', 'true')).lower() == 'true',
+                                     versions=versions)
+
+
+def invalidate(*regions: str):
+    """ Сбрасывает регионы кэша (после изменения справочников в обход функций сервиса) """
+    reference_cache.invalidate(*regions)
+
+
+def etag(*regions: str) -> Optional[str]:
+    """ ETag списка API, зависящего от регионов: меняется при каждом изменении их данных.
+        None - версии не общие для процессов (backend = local), ETag не выдается """
+    versions = reference_cache.versions
+    if not versions.shared:
+        return None
+    return '"' + '-'.join([versions.token] + [str(versions.get(region)) for region in regions]) + '"'
+
+
+def detached_copy(record):
+    """ Отсоединенная копия записи ORM (значения столбцов, без связи с сессией) """
+    if record is None:
+        return None
+    mapper = inspect(record).mapper
+    copy = mapper.class_(**{attr.key: getattr(record, attr.key) for attr in mapper.column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+
+def cached(region: str):
+    """ Функция-декоратор для функций чтения справочника service(db: Session, ...):
+        результат (запись, список записей или None) кэшируется по БД сессии и аргументам функции """
+
+    def decorator(db_func):
+        @functools.wraps(db_func)
+        def decorated_func(db: Session, *args):
+            key = (str(db.get_bind().url), db_func.__name__) + args
+            cache = reference_cache
+            value = cache.get(region, key)
+            if value is MISS:
+                generation = cache.generation(region)
+                value = db_func(db, *args)
+                copy = [detached_copy(record) for record in value] if isinstance(value, list) else detached_copy(value)
+                cache.set(region, key, copy, generation)
+                return value
+            if isinstance(value, list):
+                return [db.merge(record, load=False) for record in value]
+            return db.merge(value, load=False) if value is not None else None
+
+        return decorated_func
+
+    return decorator
+
+
+def invalidates(*regions: str):
+    """ Функция-декоратор для функций изменения справочника: сбрасывает регионы кэша после выполнения
+        функции (после фиксации транзакции - указывается над @dbexception) """
+
+    def decorator(db_func):
+        @functools.wraps(db_func)
+        def decorated_func(db: Session, *args, **kwargs):
+            try:
+                return db_func(db, *args, **kwargs)
+            finally:
+                invalidate(*regions)
+
+        return decorated_func
+
+    return decorator
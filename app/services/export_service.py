@@ -0,0 +1,82 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, AsyncIterator
+from datetime import datetime
+from decimal import Decimal
+from app.models.dao import Transaction, Purchase, Expense
+import csv
+import io
+import json
+
+"""
+    Модуль потоковой выгрузки таблиц (для бухгалтерии) в форматах NDJSON и CSV.
+
+    Строки читаются через серверный курсор (stream_results + yield_per) пачками по EXPORT_BATCH_SIZE
+    и сразу отдаются клиенту: память не зависит от размера таблицы, а первые байты ответа
+    уходят до завершения запроса.
+"""
+
+# Выгружаемые таблицы: имя в URL -> модель
+EXPORT_TABLES = {
+    'transaction': Transaction,
+    'purchase': Purchase,
+    'expense': Expense,
+}
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def export_value(value):
+    """ Значение поля для выгрузки: денежные суммы - строкой без потери точности, даты - в ISO 8601 """
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def stream_rows(db: AsyncSession, table_name: str, date_from: Optional[datetime] = None,
+                      date_to: Optional[datetime] = None) -> AsyncIterator[list]:
+    """ Асинхронный генератор пачек строк таблицы (в порядке id), прочитанных серверным курсором """
+    model = EXPORT_TABLES[table_name]
+    statement = select(model.__table__)
+    if date_from is not None:
+        statement = statement.where(model.created_on >= date_from)
+    if date_to is not None:
+        statement = statement.where(model.created_on <= date_to)
+    statement = statement.order_by(model.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    result = await db.stream(statement)
+    async for partition in result.mappings().partitions():
+        yield partition
+
+
+async def export_table(db: AsyncSession, table_name: str, export_format: str, date_from: Optional[datetime] = None,
+                       date_to: Optional[datetime] = None) -> AsyncIterator[str]:
+    """ Асинхронный генератор фрагментов файла выгрузки (один фрагмент на пачку строк) """
+    columns = [column.name for column in EXPORT_TABLES[table_name].__table__.columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if export_format == 'csv':
+        writer.writerow(columns)
+
+    async for rows in stream_rows(db, table_name, date_from, date_to):
+        for row in rows:
+            if export_format == 'csv':
+                writer.writerow([export_value(row[column]) for column in columns])
+            else:
+                buffer.write(json.dumps({column: export_value(row[column]) for column in columns},
+                                        ensure_ascii=False))
+                buffer.write('\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
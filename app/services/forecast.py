@@ -0,0 +1,234 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Iterable, List
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.dao import DailySales
+from app.services.service import IN_CHUNK_SIZE
+import numpy as np
+
+"""
+    Прогноз выручки от продаж по дням (серверный вариант generateImprovedForecastData из inventory.js).
+
+    Ряды продаж всех товаров собираются из дневных итогов (DailySales) в матрицу (товары x дни),
+    и все шаги - обрезка выбросов, тренд скользящим средним, недельная сезонность, автокорреляция
+    остатков и сам прогноз - выполняются векторно для всех товаров сразу.
+
+    Прогнозы кэшируются по товарам и параметрам запроса (период, горизонт). Запись хранит отпечаток продаж
+    товара за период (число продаж и выручка из DailySales), поэтому новая продажа товара (в любом процессе
+    приложения) делает недействительным только его прогноз и общий прогноз. Число записей ограничено (LRU);
+    ответ собирается из записей, полученных в этом вызове, поэтому параллельные запросы с другими периодами,
+    вытесняющие записи из кэша, на него не влияют.
+"""
+
+FORECAST_DAYS = 30  # горизонт прогноза по умолчанию, дней
+HISTORY_DAYS = 180  # период истории по умолчанию, дней
+SEASONAL_PERIOD = 7  # недельная сезонность
+MAX_LAG = 14  # максимальный лаг автокорреляции (две недели)
+AUTOCORRELATION_THRESHOLD = 0.2  # учитываются только лаги с |автокорреляцией| выше порога
+AUTOCORRELATION_DECAY = 0.9  # затухание влияния лага
+
+# Кэш прогнозов: (id товара, первый день, число дней истории, горизонт) -> (отпечаток, ряд продаж, прогноз);
+# id товара None - общий прогноз по всем товарам
+FORECAST_CACHE = OrderedDict()
+FORECAST_CACHE_SIZE = 10000
+FORECAST_CACHE_LOCK = threading.Lock()
+
+
+def get_cached_forecast(key: tuple, fingerprint) -> Optional[tuple]:
+    """ Запись кэша, если отпечаток продаж не изменился, иначе None """
+    with FORECAST_CACHE_LOCK:
+        entry = FORECAST_CACHE.get(key)
+        if entry is None or entry[0] != fingerprint:
+            return None
+        FORECAST_CACHE.move_to_end(key)
+        return entry
+
+
+def set_cached_forecast(key: tuple, entry: tuple):
+    with FORECAST_CACHE_LOCK:
+        FORECAST_CACHE[key] = entry
+        FORECAST_CACHE.move_to_end(key)
+        while len(FORECAST_CACHE) > FORECAST_CACHE_SIZE:
+            FORECAST_CACHE.popitem(last=False)
+
+
+def get_sales_fingerprints(db: Session, day_from: date, day_to: date) -> dict:
+    """ Отпечатки продаж товаров за период: id товара -> (число продаж, выручка) """
+    rows = (
+        db.query(DailySales.id_product, func.sum(DailySales.count), func.sum(DailySales.revenue))
+        .filter(DailySales.id_type == 1, DailySales.day >= day_from, DailySales.day <= day_to)
+        .group_by(DailySales.id_product)
+    )
+    return {id_product: (int(count or 0), float(revenue or 0)) for id_product, count, revenue in rows}
+
+
+def load_sales_matrix(db: Session, ids: List[int], day_from: date, n_days: int) -> np.ndarray:
+    """ Матрица дневной выручки (товары из ids x дни периода); дни без продаж - нули """
+    matrix = np.zeros((len(ids), n_days))
+    positions = {id_product: i for i, id_product in enumerate(ids)}
+    day_to = day_from + timedelta(days=n_days - 1)
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        rows = (
+            db.query(DailySales.id_product, DailySales.day, func.sum(DailySales.revenue))
+            .filter(DailySales.id_type == 1, DailySales.day >= day_from, DailySales.day <= day_to,
+                    DailySales.id_product.in_(ids[start:start + IN_CHUNK_SIZE]))
+            .group_by(DailySales.id_product, DailySales.day)
+        )
+        for id_product, day, revenue in rows:
+            matrix[positions[id_product], (day - day_from).days] = float(revenue or 0)
+    return matrix
+
+
+def clip_outliers(values: np.ndarray) -> np.ndarray:
+    """ Обрезка выбросов по межквартильному размаху (IQR) каждого ряда.
+        Ряды с нулевым размахом (редкие продажи) не обрезаются - иначе обнулились бы все продажи """
+    q1, q3 = np.quantile(values, [0.25, 0.75], axis=1, method='lower', keepdims=True)
+    iqr = q3 - q1
+    lower = np.where(iqr > 0, q1 - 1.5 * iqr, -np.inf)
+    upper = np.where(iqr > 0, q3 + 1.5 * iqr, np.inf)
+    return np.clip(values, lower, upper)
+
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """ Центрированное скользящее среднее; края ряда дополняются крайними значениями """
+    n = values.shape[1]
+    half = window // 2
+    padded = np.pad(values, ((0, 0), (half, half)), mode='edge')
+    sums = np.cumsum(np.pad(padded, ((0, 0), (1, 0))), axis=1)
+    return (sums[:, window:window + n] - sums[:, :n]) / window
+
+
+def weekly_seasonality(values: np.ndarray, trend: np.ndarray) -> np.ndarray:
+    """ Средние отклонения от тренда по позициям в неделе (сумма по неделе равна нулю) """
+    deviations = values - trend
+    positions = np.arange(values.shape[1]) % SEASONAL_PERIOD
+    pattern = np.zeros((values.shape[0], SEASONAL_PERIOD))
+    for k in range(SEASONAL_PERIOD):
+        if (positions == k).any():
+            pattern[:, k] = deviations[:, positions == k].mean(axis=1)
+    return pattern - pattern.mean(axis=1, keepdims=True)
+
+
+def autocorrelation(values: np.ndarray, max_lag: int) -> np.ndarray:
+    """ Автокорреляция рядов для лагов 0..max_lag (нулевая дисперсия - нулевая автокорреляция) """
+    n = values.shape[1]
+    centered = values - values.mean(axis=1, keepdims=True)
+    variance = (centered ** 2).mean(axis=1)
+    result = np.zeros((values.shape[0], max_lag + 1))
+    for lag in range(min(max_lag, n - 1) + 1):
+        covariance = (centered[:, :n - lag] * centered[:, lag:]).mean(axis=1)
+        result[:, lag] = np.divide(covariance, variance, out=np.zeros_like(covariance), where=variance > 0)
+    return result
+
+
+def trend_slope(trend: np.ndarray) -> np.ndarray:
+    """ Наклон линейной регрессии по последним двум неделям тренда """
+    recent = trend[:, -MAX_LAG:]
+    if recent.shape[1] < 2:
+        return np.zeros(trend.shape[0])
+    x = np.arange(recent.shape[1]) - (recent.shape[1] - 1) / 2
+    return ((recent - recent.mean(axis=1, keepdims=True)) * x).sum(axis=1) / (x ** 2).sum()
+
+
+def forecast_series(values: np.ndarray, days: int) -> dict:
+    """ Прогноз рядов values (товары x дни) на days дней вперед: тренд + недельная сезонность
+        + авторегрессия остатков. Возвращает словарь матриц/векторов по всем рядам """
+    m, n = values.shape
+    cleaned = clip_outliers(values)
+    trend = moving_average(cleaned, max(1, min(SEASONAL_PERIOD, n // 4)))
+    seasonal = weekly_seasonality(cleaned, trend)
+    positions = np.arange(n + days) % SEASONAL_PERIOD
+    residuals = cleaned - trend - seasonal[:, positions[:n]]
+    acf = autocorrelation(residuals, MAX_LAG)
+    weights = np.where(np.abs(acf) > AUTOCORRELATION_THRESHOLD, acf, 0)
+    weights = weights * AUTOCORRELATION_DECAY ** np.arange(MAX_LAG + 1)
+    slope = trend_slope(trend)
+
+    # остатки истории, продолженные авторегрессией на первые MAX_LAG дней прогноза
+    extended = np.concatenate([residuals, np.zeros((m, days))], axis=1)
+    for h in range(min(days, MAX_LAG)):
+        for lag in range(1, MAX_LAG + 1):
+            if n + h - lag >= 0:
+                extended[:, n + h] += weights[:, lag] * extended[:, n + h - lag]
+
+    horizon = np.arange(1, days + 1)
+    forecast = trend[:, -1:] + slope[:, None] * horizon + seasonal[:, positions[n:]] + extended[:, n:]
+    forecast = np.maximum(forecast, 0)
+    width = 2 * np.abs(residuals).mean(axis=1, keepdims=True) * (1 + (horizon - 1) / 30)
+    return {
+        "forecast": forecast,
+        "lower": np.maximum(forecast - width, 0),
+        "upper": forecast + width,
+        "slope": slope,
+        "seasonal": seasonal,
+    }
+
+
+def forecast_result(values: np.ndarray, series: dict, row: int, day_from: date, days: int) -> dict:
+    """ Прогноз одного ряда в формате forecastData из inventory.js (история + прогноз на одной шкале) """
+    n = values.shape[1]
+    labels = [(day_from + timedelta(days=i)).isoformat() for i in range(n + days)]
+    seasonal = np.round(series["seasonal"][row], 2).tolist()
+    # день недели в нумерации JS (0 - воскресенье) -> позиция в недельном периоде ряда
+    day_of_week = [0.0] * SEASONAL_PERIOD
+    for k in range(SEASONAL_PERIOD):
+        day_of_week[((day_from + timedelta(days=k)).weekday() + 1) % SEASONAL_PERIOD] = seasonal[k]
+    history, future = [None] * n, [None] * days
+    return {
+        "labels": labels,
+        "actualValues": np.round(values[row], 2).tolist() + future,
+        "forecastValues": history + np.round(series["forecast"][row], 2).tolist(),
+        "confidenceLower": history + np.round(series["lower"][row], 2).tolist(),
+        "confidenceUpper": history + np.round(series["upper"][row], 2).tolist(),
+        "trendSlope": float(series["slope"][row]),
+        "seasonalPattern": seasonal,
+        "dayOfWeekPattern": day_of_week,
+    }
+
+
+def get_forecast(db: Session, ids: Optional[Iterable[int]] = None, date_from: Optional[datetime] = None,
+                 date_to: Optional[datetime] = None, days: int = FORECAST_DAYS) -> dict:
+    """ Общий прогноз выручки и прогнозы товаров ids по истории продаж за период
+        (по умолчанию - последние HISTORY_DAYS дней). Пересчитываются только товары,
+        продажи которых изменились с прошлого вызова """
+    day_to = date_to.date() if date_to is not None else date.today()
+    day_from = date_from.date() if date_from is not None else day_to - timedelta(days=HISTORY_DAYS - 1)
+    n_days = (day_to - day_from).days + 1
+    requested = list(dict.fromkeys(ids or []))
+
+    fingerprints = get_sales_fingerprints(db, day_from, day_to)
+    for id_product in requested:
+        fingerprints.setdefault(id_product, (0, 0.0))
+
+    # записи, использованные этим вызовом: id товара -> (отпечаток, ряд продаж, прогноз)
+    entries = {}
+    for id_product, fingerprint in fingerprints.items():
+        entry = get_cached_forecast((id_product, day_from, n_days, days), fingerprint)
+        if entry is not None:
+            entries[id_product] = entry
+
+    changed = [id_product for id_product in fingerprints if id_product not in entries]
+    if changed:
+        values = load_sales_matrix(db, changed, day_from, n_days)
+        series = forecast_series(values, days)
+        for row, id_product in enumerate(changed):
+            entries[id_product] = (fingerprints[id_product], values[row],
+                                   forecast_result(values, series, row, day_from, days))
+            set_cached_forecast((id_product, day_from, n_days, days), entries[id_product])
+
+    total_fingerprint = tuple(sorted(fingerprints.items()))
+    total_entry = get_cached_forecast((None, day_from, n_days, days), total_fingerprint)
+    if total_entry is None:
+        total = np.zeros((1, n_days))
+        for entry in entries.values():
+            total[0] += entry[1]
+        total_entry = (total_fingerprint, total[0],
+                       forecast_result(total, forecast_series(total, days), 0, day_from, days))
+        set_cached_forecast((None, day_from, n_days, days), total_entry)
+
+    return {
+        "total": total_entry[2],
+        "products": {id_product: entries[id_product][2] for id_product in requested},
+    }
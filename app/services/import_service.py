@@ -0,0 +1,189 @@
+from typing import Iterable, Iterator, List
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.models.dao import Product, Purchase, Transaction, Warehouse, Users, DailySales
+from app.services import service
+from app.services.cache import invalidate, PRODUCT
+import csv
+import json
+import logging
+
+"""
+    Модуль пакетного импорта закупок (приходных накладных поставщиков) из файлов CSV и NDJSON.
+
+    Файл читается построчно, строки проверяются и загружаются пачками по IMPORT_CHUNK_SIZE:
+    параметры цены читаются один раз на весь импорт, товары и склады пачки - одним запросом,
+    партии и операции закупки записываются пакетными INSERT, каждая пачка фиксируется одним commit.
+    Строки с ошибками пропускаются и попадают в отчет с номером строки файла.
+"""
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+# Поля строки импорта (заголовок CSV / ключи объекта NDJSON)
+IMPORT_COLUMNS = ('id_product', 'purchase_price', 'id_warehouse', 'count')
+
+IMPORT_CHUNK_SIZE = 5000
+
+# Максимальное число ошибок в отчете (общее число ошибок возвращается всегда)
+MAX_IMPORT_ERRORS = 1000
+
+
+def read_records(lines: Iterable[str], import_format: str) -> Iterator[tuple]:
+    """ Генератор пар (номер строки файла, словарь полей или текст ошибки разбора) """
+    if import_format == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as ex:
+            yield number, f"Некорректный JSON: {ex}"
+            continue
+        yield number, record if isinstance(record, dict) else "Строка должна быть JSON-объектом"
+
+
+def parse_record(record: dict) -> dict:
+    """ Проверка и преобразование полей строки импорта; ошибки - ValueError """
+    missing = [column for column in IMPORT_COLUMNS if record.get(column) in (None, '')]
+    if missing:
+        raise ValueError(f"Не заполнены поля: {', '.join(missing)}")
+    try:
+        row = {
+            "id_product": int(record["id_product"]),
+            "purchase_price": Decimal(str(record["purchase_price"])),
+            "id_warehouse": int(record["id_warehouse"]),
+            "count": int(record["count"]),
+        }
+    except (TypeError, ValueError, InvalidOperation):
+        raise ValueError("Некорректное числовое значение")
+    if row["count"] <= 0:
+        raise ValueError("Количество должно быть больше нуля")
+    if not row["purchase_price"].is_finite() or row["purchase_price"] <= 0:
+        raise ValueError("Цена закупки должна быть больше нуля")
+    return row
+
+
+def add_error(report: dict, number: int, message: str):
+    """ Добавляет ошибку строки number в отчет импорта """
+    report["error_count"] += 1
+    if len(report["errors"]) < MAX_IMPORT_ERRORS:
+        report["errors"].append({"line": number, "error": message})
+
+
+def import_chunk(db: Session, rows: List[tuple], id_user: int, pricing: dict, report: dict):
+    """ Загрузка пачки проверенных строк (номер строки, поля) одной транзакцией БД """
+    numbers = []  # номера строк, дошедших до записи в БД
+    try:
+        products = service.get_by_ids(db, Product, (row["id_product"] for number, row in rows), for_update=True)
+        warehouses = service.get_by_ids(db, Warehouse, (row["id_warehouse"] for number, row in rows))
+        now = datetime.now()
+
+        purchases, prices = [], {}
+        for number, row in rows:
+            product = products.get(row["id_product"])
+            if product is None:
+                add_error(report, number, f"Товар с id {row['id_product']} не найден")
+            elif row["id_warehouse"] not in warehouses:
+                add_error(report, number, f"Склад с id {row['id_warehouse']} не найден")
+            else:
+                # розничная цена зависит только от цены закупки и способа расчета цены товара
+                price_key = (row["purchase_price"], product.price_mod)
+                if price_key not in prices:
+                    prices[price_key] = service.calc_selling_price(row["purchase_price"], product.price_mod, pricing)
+                row["selling_price"] = prices[price_key]
+                row["current_count"] = row["count"]
+                row["id_user"] = id_user
+                row["created_on"] = now
+                numbers.append(number)
+                purchases.append(row)
+        if not purchases:
+            return
+
+        # запросы уровня таблиц (Core) - без создания объектов ORM на каждую строку
+        table = Purchase.__table__
+        if db.get_bind().dialect.insert_executemany_returning:
+            # один INSERT ... RETURNING на всю пачку; порядок возвращенных строк не важен
+            inserted = db.execute(insert(table).returning(table.c.id, table.c.id_product, table.c.id_warehouse,
+                                                          table.c.purchase_price, table.c.count),
+                                  purchases).all()
+        else:
+            inserted = [Purchase(**purchase) for purchase in purchases]
+            db.add_all(inserted)
+            db.flush()
+
+        db.execute(insert(Transaction.__table__), [
+            {"id_type": 2, "id_purchase": purchase.id, "amount": purchase.count, "id_user": id_user, "created_on": now}
+            for purchase in inserted
+        ])
+
+        # итоги пачки по товарам и по (товар, склад) - для остатков и дневных итогов
+        counts, first_purchases, totals = {}, {}, {}
+        for purchase in inserted:
+            counts[purchase.id_product] = counts.get(purchase.id_product, 0) + purchase.count
+            first_purchases[purchase.id_product] = min(purchase.id, first_purchases.get(purchase.id_product,
+                                                                                        purchase.id))
+            total = totals.setdefault((purchase.id_product, purchase.id_warehouse), {
+                "day": now.date(), "id_product": purchase.id_product, "id_warehouse": purchase.id_warehouse,
+                "id_type": 2, "quantity": 0, "revenue": 0, "cost": 0, "count": 0, "margin_sum": 0,
+            })
+            total["quantity"] += purchase.count
+            total["cost"] += purchase.purchase_price * purchase.count
+            total["count"] += 1
+
+        for id_product, count in counts.items():
+            product = products[id_product]
+            # товар без остатка начинает расходоваться с первой из новых партий (как в add_purchase)
+            if product.total_count == 0:
+                product.id_purchase = first_purchases[id_product]
+            product.total_count += count
+
+        service.increase_param(db, "DirectCosts", sum(total["cost"] for total in totals.values()))
+        service.add_totals(db, DailySales, list(totals.values()))
+        db.commit()
+        invalidate(PRODUCT)
+        report["imported"] += len(inserted)
+
+    except Exception:
+        logger.warning("Ошибка импорта пачки закупок", exc_info=True)
+        db.rollback()
+        for number in numbers:
+            add_error(report, number, "Ошибка записи в БД, пачка строк не загружена")
+
+
+def import_purchases(db: Session, lines: Iterable[str], import_format: str, id_user: int,
+                     chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """ Импорт закупок из строк файла CSV/NDJSON. Возвращает отчет:
+        {"imported": число загруженных партий, "error_count": число ошибок, "errors": [{"line", "error"}]} """
+    if db.query(Users.id).filter(Users.id == id_user).first() is None:
+        raise ValueError(f"Пользователь с id {id_user} не найден")
+    pricing = service.get_pricing_params(db)
+    report = {"imported": 0, "error_count": 0, "errors": []}
+
+    chunk = []
+    for number, record in read_records(lines, import_format):
+        if isinstance(record, str):
+            add_error(report, number, record)
+            continue
+        try:
+            chunk.append((number, parse_record(record)))
+        except ValueError as ex:
+            add_error(report, number, str(ex))
+            continue
+        if len(chunk) >= chunk_size:
+            import_chunk(db, chunk, id_user, pricing, report)
+            chunk = []
+    if chunk:
+        import_chunk(db, chunk, id_user, pricing, report)
+
+    # ошибки разбора строки фиксируются сразу, ошибки записи - при загрузке пачки
+    report["errors"].sort(key=lambda error: error["line"])
+    return report
@@ -0,0 +1,167 @@
+from typing import Optional, List
+from datetime import datetime
+from sqlalchemy import insert, or_
+from sqlalchemy.orm import Session
+from app.models.dao import Product, ProductSales, ProductRanking
+from app.services import service
+import numpy as np
+
+"""
+    ABC-анализ и рейтинги товаров по прибыли, выручке и марже
+    (серверный вариант calculateABCAnalysis и сортировок createTopProductsChart из inventory.js).
+
+    Доли прибыли, накопленные доли (cumsum) и места в рейтингах считаются векторно по итогам продаж
+    товаров. Для всего периода результаты хранятся в таблице product_ranking: продажи обновляют
+    только итоги товара (product_sales), а рейтинг пересчитывается при следующем чтении, если итоги
+    изменились. Для произвольного периода расчет выполняется по дневным итогам (DailySales).
+"""
+
+# Накопленная доля прибыли (%), до которой товар попадает в группу A и в группу B
+ABC_THRESHOLDS = (70, 90)
+TOP_N = 10
+
+# Поля товара в ответе (как в productSales из /api/analytics)
+PRODUCT_FIELDS = ("id", "name", "revenue", "profit", "quantity", "margin")
+
+
+def rank_of(values: np.ndarray) -> np.ndarray:
+    """ Места значений по убыванию (1 - наибольшее; при равенстве выше товар, стоящий раньше) """
+    ranks = np.empty(len(values), dtype=int)
+    ranks[np.argsort(-values, kind='stable')] = np.arange(1, len(values) + 1)
+    return ranks
+
+
+def rank_products(revenue: np.ndarray, cost: np.ndarray) -> dict:
+    """ ABC-группы, доли прибыли (%) и места в рейтингах для векторов выручки и себестоимости товаров """
+    profit = revenue - cost
+    margin = np.divide(profit * 100, revenue, out=np.zeros_like(profit), where=revenue > 0)
+    total = profit.sum()
+    percent = profit / total * 100 if total > 0 else np.zeros_like(profit)
+
+    rank_profit = rank_of(profit)
+    cumulative = np.empty_like(percent)
+    cumulative[rank_profit - 1] = percent
+    cumulative = np.cumsum(cumulative)[rank_profit - 1]
+    groups = np.where(cumulative <= ABC_THRESHOLDS[0], 'A', np.where(cumulative <= ABC_THRESHOLDS[1], 'B', 'C'))
+    if total <= 0:
+        groups[:] = 'C'
+
+    return {
+        "profit": profit,
+        "margin": margin,
+        "percent": percent,
+        "group": groups,
+        "rank_profit": rank_profit,
+        "rank_sales": rank_of(revenue),
+        "rank_margin": rank_of(margin),
+    }
+
+
+def ranking_is_stale(db: Session) -> bool:
+    """ Есть ли товары, итоги продаж которых изменились после расчета рейтинга """
+    stale = (
+        db.query(ProductSales.id_product)
+        .outerjoin(ProductRanking, ProductRanking.id_product == ProductSales.id_product)
+        .filter(or_(ProductRanking.sales_count.is_(None), ProductRanking.sales_count != ProductSales.count))
+        .first()
+    )
+    return stale is not None
+
+
+@service.dbexception
+def refresh_product_ranking(db: Session):
+    """ Пересчет таблицы product_ranking по итогам продаж товаров (O(товаров)) """
+    totals = db.query(ProductSales.id_product, ProductSales.count, ProductSales.revenue, ProductSales.cost).all()
+    db.query(ProductRanking).delete(synchronize_session=False)
+    if not totals:
+        return
+
+    ranking = rank_products(np.array([float(row.revenue) for row in totals]),
+                            np.array([float(row.cost) for row in totals]))
+    db.execute(insert(ProductRanking), [
+        {
+            "id_product": row.id_product,
+            "sales_count": row.count,
+            "abc_group": str(ranking["group"][i]),
+            "rank_profit": int(ranking["rank_profit"][i]),
+            "rank_sales": int(ranking["rank_sales"][i]),
+            "rank_margin": int(ranking["rank_margin"][i]),
+        }
+        for i, row in enumerate(totals)
+    ])
+
+
+def abc_result(products: List[dict], top_n: int) -> dict:
+    """ Ответ в формате abcAnalysis/topProducts из inventory.js по товарам с рассчитанными группами и местами """
+    total_profit = sum(product["profit"] for product in products)
+    groups = {group: {"products": [], "profit": 0.0, "count": 0, "profitPercent": 0.0} for group in 'ABC'}
+    for product in sorted(products, key=lambda p: p["rank_profit"]):
+        group = groups[product["group"]]
+        group["products"].append({key: product[key] for key in PRODUCT_FIELDS})
+        group["profit"] += product["profit"]
+    for group in groups.values():
+        group["count"] = len(group["products"])
+        group["profitPercent"] = group["profit"] / total_profit * 100 if total_profit > 0 else 0
+
+    def top(rank_key):
+        ranked = sorted((product for product in products if product[rank_key] <= top_n), key=lambda p: p[rank_key])
+        return [{key: product[key] for key in PRODUCT_FIELDS} for product in ranked]
+
+    return {
+        **groups,
+        "topProducts": {"byProfit": top("rank_profit"), "bySales": top("rank_sales"), "byMargin": top("rank_margin")},
+    }
+
+
+def get_abc(db: Session, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+            top_n: int = TOP_N) -> dict:
+    """ ABC-анализ по прибыли и топ-N товаров по прибыли, выручке и марже.
+        Без периода - из таблицы product_ranking (пересчитывается, только если продажи изменились) """
+    if date_from is not None or date_to is not None:
+        rows = service.get_sales_by_product(db, date_from, date_to)
+        revenue = np.array([float(row.revenue or 0) for row in rows])
+        cost = np.array([float(row.cost or 0) for row in rows])
+        ranking = rank_products(revenue, cost)
+        products = [
+            {
+                "id": row.id,
+                "name": row.name,
+                "revenue": float(revenue[i]),
+                "profit": float(ranking["profit"][i]),
+                "quantity": int(row.quantity or 0),
+                "margin": float(ranking["margin"][i]),
+                "group": str(ranking["group"][i]),
+                "rank_profit": int(ranking["rank_profit"][i]),
+                "rank_sales": int(ranking["rank_sales"][i]),
+                "rank_margin": int(ranking["rank_margin"][i]),
+            }
+            for i, row in enumerate(rows)
+        ]
+        return abc_result(products, top_n)
+
+    if ranking_is_stale(db):
+        refresh_product_ranking(db)
+
+    rows = (
+        db.query(Product.id, Product.name, ProductSales.revenue, ProductSales.cost, ProductSales.quantity,
+                 ProductRanking.abc_group, ProductRanking.rank_profit, ProductRanking.rank_sales,
+                 ProductRanking.rank_margin)
+        .join(ProductSales, ProductSales.id_product == Product.id)
+        .join(ProductRanking, ProductRanking.id_product == Product.id)
+    )
+    products = []
+    for row in rows:
+        revenue, profit = float(row.revenue), float(row.revenue - row.cost)
+        products.append({
+            "id": row.id,
+            "name": row.name,
+            "revenue": revenue,
+            "profit": profit,
+            "quantity": row.quantity,
+            "margin": profit / revenue * 100 if revenue > 0 else 0,
+            "group": row.abc_group,
+            "rank_profit": row.rank_profit,
+            "rank_sales": row.rank_sales,
+            "rank_margin": row.rank_margin,
+        })
+    return abc_result(products, top_n)
@@ -1,16 +1,28 @@
 from typing import Optional, Iterable, List
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager
 from sqlalchemy.testing.pickleable import User
-from sqlalchemy import desc, asc
+from sqlalchemy import desc, asc, func, or_, and_, case, insert
+from sqlalchemy.dialects import sqlite, mysql, postgresql
 from werkzeug.security import generate_password_hash, check_password_hash
 from decimal import Decimal
+from types import MappingProxyType
 
 from app.models.dao import *
+from app.services.cache import cached, invalidates, CATEGORY, WAREHOUSE, USERS, PARAMS, PRODUCT, MISS
+from app.services import cache
 import functools
-import traceback
 import logging
 import math
 
+logger = logging.getLogger(__name__)
+
+# Размер страницы для постраничной выдачи списков (по умолчанию и максимальный)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Число значений в одном условии IN (SQLite ограничивает число параметров запроса)
+IN_CHUNK_SIZE = 500
+
 
 def dbexception(db_func):
     """ Функция-декоратор для перехвата исключений БД.
@@ -26,17 +38,43 @@ def dbexception(db_func):
             return True
         except Exception as ex:
             # выводим исключение и "откатываем" изменения
-            print(f'Exception in {db_func.__name__}: {traceback.format_exc()}')
+            logger.exception("Ошибка в %s", db_func.__name__, extra={"function": db_func.__name__})
             db.rollback()
             return False
 
     return decorated_func
 
 
+def get_by_ids(db: Session, model, ids: Iterable[int], for_update: bool = False) -> dict:
+    """ Загружает записи модели по списку id запросами IN (пачками по IN_CHUNK_SIZE).
+        Возвращает словарь {id: запись}; отсутствующие id в словарь не попадают.
+        for_update - заблокировать записи до конца транзакции (SELECT ... FOR UPDATE) и перечитать их значения """
+    unique_ids = sorted(set(ids))
+    records = {}
+    if for_update:
+        # изменения текущей транзакции сбрасываются в БД, чтобы перечитывание их не затерло (autoflush выключен)
+        db.flush()
+    for start in range(0, len(unique_ids), IN_CHUNK_SIZE):
+        chunk = unique_ids[start:start + IN_CHUNK_SIZE]
+        query = db.query(model).filter(model.id.in_(chunk))
+        if for_update:
+            query = query.with_for_update().populate_existing()
+        for record in query:
+            records[record.id] = record
+    return records
+
+
+def table_columns(model):
+    """ Столбцы таблицы модели: db.query(*table_columns(Model)) возвращает строки Row (доступ к полям
+        по имени, как у объектов модели) без создания объектов ORM - для списков, которые только читаются """
+    return model.__table__.columns
+
+
 # region
 """ _______PARAMS________ """
 
 
+@invalidates(PARAMS)
 def add_param(db: Session, param_key: str, val: Optional[float] = None, description: Optional[str] = None) -> bool:
     param_data = {"key": param_key}
     if val is not None:
@@ -50,7 +88,7 @@ def add_param(db: Session, param_key: str, val: Optional[float] = None, descript
         db.add(param)
         db.commit()
     except Exception as ex:
-        logging.warning(traceback.format_exc())
+        logger.warning("Ошибка добавления параметра %s", param_key, exc_info=True)
         db.rollback()
         return False
     return True
@@ -66,6 +104,20 @@ def get_param(db: Session, param_key: str):
     return param  # Возвращаем объект Param
 
 
+def get_param_snapshot(db: Session):
+    """ Значения всех параметров {ключ: значение} одним запросом; снимок хранится в кэше (регион PARAMS)
+        до изменения параметров (add_param, update_param_value, rollup_param_ledger).
+        Для накопительных параметров в снимке - свернутое значение, без приращений журнала (см. get_param_value) """
+    key = (str(db.get_bind().url),)
+    params = cache.reference_cache.get(PARAMS, key)
+    if params is MISS:
+        generation = cache.reference_cache.generation(PARAMS)
+        params = MappingProxyType({param_key: value for param_key, value in db.query(Param.key, Param.value)})
+        cache.reference_cache.set(PARAMS, key, params, generation)
+    return params
+
+
+@invalidates(PARAMS)
 @dbexception
 def update_param_value(db: Session, param_key: str, new_value: float):
     param = get_param(db, param_key)
@@ -77,24 +129,65 @@ def update_param_value(db: Session, param_key: str, new_value: float):
     return True  # Возвращаем успех
 
 
-@dbexception
 def increase_param(db: Session, param_key: str, delta: float):
-    param = get_param(db, param_key)
-
-    if param is None:
-        raise ValueError(f"Параметр с ключом '{param_key}' не найден.")
-    if param.value is None:
-        param.value = delta
-    else:
-        param.value += delta
+    """ Увеличивает значение параметра на delta.
+        Приращение добавляется в журнал param_ledger (без обновления строки params),
+        поэтому параллельные операции не блокируют друг друга на одной строке.
+        Изменения не фиксируются - функция выполняется в рамках транзакции вызывающей операции. """
+    db.add(ParamDelta(key=param_key, delta=delta))
     return True  # Возвращаем успех
 
 
+def get_param_value(db: Session, param_key: str):
+    """ Текущее значение накопительного параметра: свернутое значение + еще не свернутые приращения """
+    pending = (
+        db.query(func.coalesce(func.sum(ParamDelta.delta), 0))
+        .filter(ParamDelta.key == Param.key)
+        .scalar_subquery()
+    )
+    row = db.query(Param.value, pending).filter(Param.key == param_key).first()
+
+    if row is None:
+        return None  # Параметр не найден
+
+    value, delta = row
+    return Decimal(value or 0) + Decimal(delta)
+
+
+@invalidates(PARAMS)
+@dbexception
+def rollup_param_ledger(db: Session):
+    """ Сворачивает журнал приращений в значения params и удаляет свернутые записи журнала.
+        Удаляются ровно те записи, которые были просуммированы (по списку id): приращение, зафиксированное
+        параллельной транзакцией после чтения журнала (в том числе с меньшим id), остается до следующей свертки. """
+    rows = db.query(ParamDelta.id, ParamDelta.key, ParamDelta.delta).with_for_update().all()
+    if not rows:
+        return
+
+    totals = {}
+    for id_delta, param_key, delta in rows:
+        totals[param_key] = totals.get(param_key, 0) + Decimal(delta)
+    for param_key, delta in totals.items():
+        param = get_param(db, param_key)
+        if param is None:
+            raise ValueError(f"Параметр с ключом '{param_key}' не найден.")
+        param.value = (param.value or 0) + delta
+
+    ids = [row.id for row in rows]
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        chunk = ids[start:start + IN_CHUNK_SIZE]
+        db.query(ParamDelta).filter(ParamDelta.id.in_(chunk)).delete(synchronize_session=False)
+
+
 def calc_period_results(db: Session):
-    rev = get_param(db, "Rev").value
-    vat = get_param(db, "VAT").value / 100
-    direct_sold_costs = get_param(db, "DirectSoldCosts").value
-    indirect_costs = get_param(db, "IndirectCosts").value
+    # переносим накопленные приращения в итоги периода
+    rollup_param_ledger(db)
+
+    params = get_param_snapshot(db)
+    rev = params["Rev"]
+    vat = params["VAT"] / 100
+    direct_sold_costs = params["DirectSoldCosts"]
+    indirect_costs = params["IndirectCosts"]
 
     vat_cost = rev * vat / (1 + vat)
     te = indirect_costs + direct_sold_costs + vat_cost
@@ -120,63 +213,137 @@ def create_product(db: Session, name: str, id_category: int):
     return add_product(db, product)
 
 
+@invalidates(PRODUCT)
 def add_product(db: Session, product: Product):
     try:
         db.add(product)
         db.commit()
     except Exception as ex:
-        print(traceback.format_exc())
+        logger.warning("Ошибка добавления товара %s", product.name, exc_info=True)
         db.rollback()
         return False
     return True
 
 
+@invalidates(PRODUCT)
 @dbexception
 def delete_product_by_id(db: Session, id_product: int):
     product = db.query(Product).filter(Product.id == id_product).first()
     db.delete(product)
 
 
-def get_product_by_id(db: Session, id_product: int):
-    product = db.query(Product).filter(Product.id == id_product).first()
-    print(product)
+def get_product_by_id(db: Session, id_product: int, for_update: bool = False):
+    query = db.query(Product).filter(Product.id == id_product)
+    if for_update:
+        # блокировка строки товара до конца транзакции (SELECT ... FOR UPDATE); запись, уже загруженная
+        # в сессию без блокировки, перечитывается - иначе остаток считался бы по устаревшим значениям.
+        # Изменения текущей транзакции предварительно сбрасываются в БД (autoflush выключен)
+        db.flush()
+        query = query.with_for_update().populate_existing()
+    product = query.first()
+    logger.debug("Товар %s: %s", id_product, "найден" if product else "не найден", extra={"id_product": id_product})
     return product
 
 
 def get_product_all(db: Session):
-    product = db.query(Product).all()
-    print(product)
+    product = db.query(*table_columns(Product)).all()
+    logger.debug("Товаров: %s", len(product))
     return product
 
 
+def get_products_by_ids(db: Session, ids: Iterable[int]) -> dict:
+    """ Товары по списку id: {id: товар} """
+    return get_by_ids(db, Product, ids)
+
+
+def get_products_page(db: Session, id_warehouse: Optional[int] = None, after_id: Optional[int] = None,
+                      limit: int = DEFAULT_PAGE_SIZE):
+    """ Постраничная выдача товаров (keyset по id): страница товаров с id > after_id.
+        Если указан склад - только товары, закупленные на этот склад.
+        Возвращает (товары, id последнего товара страницы или None, если страница последняя) """
+    limit = min(limit, MAX_PAGE_SIZE)
+    query = db.query(*table_columns(Product))
+    if id_warehouse is not None:
+        query = query.filter(
+            db.query(Purchase.id)
+            .filter(Purchase.id_product == Product.id, Purchase.id_warehouse == id_warehouse)
+            .exists()
+        )
+    if after_id is not None:
+        query = query.filter(Product.id > after_id)
+
+    # запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница
+    products = query.order_by(Product.id).limit(limit + 1).all()
+    if len(products) > limit:
+        return products[:limit], products[limit - 1].id
+    return products, None
+
+
+def get_inventory_overview(db: Session) -> List[dict]:
+    """ Обзор склада: товары с названием категории, общим остатком и открытыми партиями (FIFO).
+        Товары, категории, партии и склады партий загружаются одним запросом с JOIN """
+    products = (
+        db.query(Product)
+        .outerjoin(Product.category)
+        .outerjoin(Product.open_batches)
+        .outerjoin(Purchase.warehouse)
+        .options(contains_eager(Product.category),
+                 contains_eager(Product.open_batches).contains_eager(Purchase.warehouse))
+        .order_by(Product.id, Purchase.created_on)
+        .all()
+    )
+
+    return [{
+        "id": product.id,
+        "name": product.name,
+        "id_category": product.id_category,
+        "category": product.category.name if product.category else None,
+        "total_count": product.total_count,
+        "id_purchase": product.id_purchase,
+        "price_mod": product.price_mod,
+        "batches": [{
+            "id": batch.id,
+            "purchase_price": batch.purchase_price,
+            "selling_price": batch.selling_price,
+            "count": batch.count,
+            "current_count": batch.current_count,
+            "id_warehouse": batch.id_warehouse,
+            "warehouse": batch.warehouse.name if batch.warehouse else None,
+            "created_on": batch.created_on,
+        } for batch in product.open_batches],
+    } for product in products]
+
+
+@invalidates(PRODUCT)
 @dbexception
 def update_product_name(db: Session, id_product: int, new_name: str):
     product = get_product_by_id(db, id_product)
     product.name = new_name
 
 
-@dbexception
 def update_product_count(db: Session, product: Product, new_count: int):
+    """ Изменения не фиксируются - функция выполняется в рамках транзакции вызывающей операции """
     product.total_count = new_count
-    db.commit()
 
 
-@dbexception
 def set_current_purchase(db: Session, product: Product, new_id_purchase: int):
+    """ Изменения не фиксируются - функция выполняется в рамках транзакции вызывающей операции """
     product.id_purchase = new_id_purchase
-    db.commit()
 
 
 def find_next_purchase(db: Session, id_product: int, id_current_purchase: int):
+    # сбрасываем в БД остатки партий, уже измененные в текущей транзакции, иначе запрос их не увидит
+    db.flush()
     next_purchase = (
         db.query(Purchase)
         .filter(Purchase.id_product == id_product)  # Фильтр по id_product
-        .filter(Purchase.current_count != 0)
+        .filter(Purchase.is_open)
         .filter(Purchase.id != id_current_purchase)  # Только записи, где current_count > 0
         .order_by(asc(Purchase.created_on))  # Сортируем по дате (от старых к новым)
         .first()  # Берём самую раннюю запись
     )
-    print("Эта партия товаров кончилась, теперь списываем с партии номер: ", next_purchase)
+    logger.debug("Следующая партия товара %s: %s", id_product, next_purchase.id if next_purchase else None,
+                 extra={"id_product": id_product, "id_purchase": id_current_purchase})
 
     if next_purchase:
         return next_purchase.id
@@ -201,21 +368,33 @@ def update_current_purchase(db: Session, id_product: int):
 """ _______PURCHASE______ """
 
 
-def create_purchase(db: Session, id_product: int, purchase_price: float, id_warehouse: int, count: int, id_user: int):
-    product = get_product_by_id(db, id_product)
-    direct_indirect_ratio = get_param(db, "DirectIndirectRatio").value
-    vat = get_param(db, "VAT").value / Decimal(100)
-    gm = get_param(db, "GM").value / Decimal(100)
+def get_pricing_params(db: Session) -> dict:
+    """ Параметры расчета розничной цены (доли, а не проценты) из снимка параметров - без запросов к БД """
+    params = get_param_snapshot(db)
+    return {
+        "direct_indirect_ratio": params["DirectIndirectRatio"],
+        "vat": params["VAT"] / Decimal(100),
+        "gm": params["GM"] / Decimal(100),
+    }
 
-    purchase_price = Decimal(purchase_price)
+
+def calc_selling_price(purchase_price: Decimal, price_mod: int, pricing: dict):
+    """ Розничная цена партии по цене закупки и параметрам get_pricing_params """
     # расчет полной себестоимости
-    total_cost = purchase_price + purchase_price * direct_indirect_ratio
+    total_cost = purchase_price + purchase_price * pricing["direct_indirect_ratio"]
     selling_price = 0
 
     # если используется метод FIFO
-    if product.price_mod == 0:
+    if price_mod == 0:
         # расчет розничной цены
-        selling_price = math.ceil(total_cost * (1 + gm) / (1 - vat))
+        selling_price = math.ceil(total_cost * (1 + pricing["gm"]) / (1 - pricing["vat"]))
+    return selling_price
+
+
+def create_purchase(db: Session, id_product: int, purchase_price: float, id_warehouse: int, count: int, id_user: int):
+    product = get_product_by_id(db, id_product)
+    purchase_price = Decimal(purchase_price)
+    selling_price = calc_selling_price(purchase_price, product.price_mod, get_pricing_params(db))
 
     purchase = Purchase(id_product=id_product,
                         purchase_price=purchase_price,
@@ -227,55 +406,72 @@ def create_purchase(db: Session, id_product: int, purchase_price: float, id_ware
     return add_purchase(db, purchase, id_user)
 
 
+@invalidates(PRODUCT)
 def add_purchase(db: Session, purchase: Purchase, id_user: int):
-    product = get_product_by_id(db, purchase.id_product)
+    """ Добавление партии, обновление остатка товара и операция закупки выполняются одной транзакцией БД """
+    product = get_product_by_id(db, purchase.id_product, for_update=True)
     if product:
         # увеличиваем количество товара
         new_count = product.total_count + purchase.count
         try:
             db.add(purchase)
-            db.commit()
+            db.flush()  # получаем id партии без фиксации транзакции
 
             if product.total_count == 0:
                 set_current_purchase(db, product, purchase.id)
             # обновляем количество товара
             update_product_count(db, product, new_count)
             # создаем транзакцию с закупкой
-            create_transaction(db, 2, purchase.id, purchase.count, id_user)
+            apply_transaction(db, Transaction(id_type=2, id_purchase=purchase.id, amount=purchase.count,
+                                              id_user=id_user))
+            db.commit()
 
         except Exception as ex:
-            logging.warning(f"Ошибка добавления закупки: product {purchase.id_product}, "
-                            f"count {purchase.count}, "
-                            f"purchase_price{purchase.purchase_price}.")
-            logging.warning(traceback.format_exc())
+            logger.warning("Ошибка добавления закупки: product %s, count %s, purchase_price %s",
+                           purchase.id_product, purchase.count, purchase.purchase_price,
+                           extra={"id_product": purchase.id_product}, exc_info=True)
             db.rollback()
             return False
         return True
     else:
-        logging.warning(f"Закупка не существующего товар {purchase.id_product}.")
+        logger.warning("Закупка не существующего товара %s", purchase.id_product,
+                       extra={"id_product": purchase.id_product})
         return False
 
 
+@invalidates(PRODUCT)
 @dbexception
 def delete_purchase_by_id(db: Session, id_purchase: int):
     purchase = db.query(Purchase).filter(Purchase.id == id_purchase).first()
     db.delete(purchase)
 
 
-def get_purchase_by_id(db: Session, id_purchase: int):
-    purchase = db.query(Purchase).filter(Purchase.id == id_purchase).first()
+def get_purchase_by_id(db: Session, id_purchase: int, for_update: bool = False):
+    query = db.query(Purchase).filter(Purchase.id == id_purchase)
+    if for_update:
+        # блокировка строки партии до конца транзакции (SELECT ... FOR UPDATE); запись, уже загруженная
+        # в сессию без блокировки, перечитывается - иначе остаток считался бы по устаревшим значениям.
+        # Изменения текущей транзакции предварительно сбрасываются в БД (autoflush выключен)
+        db.flush()
+        query = query.with_for_update().populate_existing()
+    purchase = query.first()
     if not purchase:
-        logging.warning(f"Не найдена закупка с id {id_purchase}")
-    print(purchase)
+        logger.warning("Не найдена закупка с id %s", id_purchase, extra={"id_purchase": id_purchase})
     return purchase
 
 
+def get_purchases_by_ids(db: Session, ids: Iterable[int]) -> dict:
+    """ Закупки по списку id: {id: закупка} """
+    return get_by_ids(db, Purchase, ids)
+
+
 def get_purchase_by_product(db: Session, id_product: int):
-    purchases = db.query(Purchase).filter(Purchase.id_product == id_product).all()
-    print(purchases)
+    purchases = db.query(*table_columns(Purchase)).filter(Purchase.id_product == id_product).all()
+    logger.debug("Партий товара %s: %s", id_product, len(purchases), extra={"id_product": id_product})
     return purchases
 
 
+@invalidates(PRODUCT)
 @dbexception
 def update_purchase_product(db: Session, id_purchase: int, new_id_product: int):
     purchase = get_purchase_by_id(db, id_purchase)
@@ -289,7 +485,10 @@ def update_purchase_warehouse(db: Session, id_purchase: int, new_id_warehouse: i
 
 
 def decrease_purchase_count(db: Session, id_purchase: int, delta: int, transaction_type: int):
-    purchase = get_purchase_by_id(db, id_purchase)
+    """ Уменьшает остаток партии и товара.
+        Изменения не фиксируются - функция выполняется в рамках транзакции вызывающей операции. """
+    # порядок блокировок во всех операциях одинаковый: сначала партия, затем товар
+    purchase = get_purchase_by_id(db, id_purchase, for_update=True)
     new_count = purchase.current_count - delta
     rest = abs(new_count) if new_count < 0 else 0
     next_purchase = 0
@@ -306,12 +505,10 @@ def decrease_purchase_count(db: Session, id_purchase: int, delta: int, transacti
         decrease_total_count(db, purchase.id_product, purchase.current_count)
         purchase.current_count = 0
         update_current_purchase(db, purchase.id_product)
-        db.commit()
         return rest, next_purchase  # возвращаем остаток, для которого необходима дополнительная транзакция
 
     purchase.current_count = new_count
     decrease_total_count(db, purchase.id_product, delta)
-    db.commit()
 
     if new_count == 0:
         update_current_purchase(db, purchase.id_product)
@@ -319,9 +516,9 @@ def decrease_purchase_count(db: Session, id_purchase: int, delta: int, transacti
     return 0, 0
 
 
-@dbexception
 def decrease_total_count(db: Session, id_product: int, delta: int):
-    product = get_product_by_id(db, id_product)
+    """ Изменения не фиксируются - функция выполняется в рамках транзакции вызывающей операции """
+    product = get_product_by_id(db, id_product, for_update=True)
     new_count = product.total_count - delta
     if new_count < 0:
         raise RuntimeError("Отрицательное общеее количество товара!")
@@ -339,38 +536,43 @@ def create_warehouse(db: Session, address: str, name: str):
     return add_warehouse(db, warehouse)
 
 
+@invalidates(WAREHOUSE)
 @dbexception
 def add_warehouse(db: Session, warehouse: Warehouse):
     try:
         db.add(warehouse)
         db.commit()
-        print("Saccess", warehouse.name)
+        logger.debug("Добавлен склад %s", warehouse.name)
     except Exception as ex:
-        print(traceback.format_exc())
+        logger.warning("Ошибка добавления склада %s", warehouse.name, exc_info=True)
         db.rollback()
         return False
     return True
 
 
+@cached(WAREHOUSE)
 def get_warehouse_by_id(db: Session, id_warehouse: int):
     warehouse = db.query(Warehouse).filter(Warehouse.id == id_warehouse).first()
     return warehouse
 
 
+@cached(WAREHOUSE)
 def get_warehouses(db: Session):
     warehouse = db.query(Warehouse).all()
     return warehouse
 
 
+@invalidates(WAREHOUSE)
 @dbexception
 def update_warehouse_name(db: Session, id_warehouse: int, new_name: str):
-    warehouse = get_warehouse_by_id(db, id_warehouse)
+    warehouse = db.get(Warehouse, id_warehouse)
     warehouse.name = new_name
 
 
+@invalidates(WAREHOUSE)
 @dbexception
 def update_warehouse_address(db: Session, id_warehouse: int, new_address: str):
-    warehouse = get_warehouse_by_id(db, id_warehouse)
+    warehouse = db.get(Warehouse, id_warehouse)
     warehouse.address = new_address
 
 
@@ -386,26 +588,35 @@ def create_category(db: Session, name: str):
     return add_category(db, category)
 
 
+@invalidates(CATEGORY)
 @dbexception
 def add_category(db: Session, category: Category):
     category = category
     db.add(category)
 
 
+@cached(CATEGORY)
 def get_category_by_id(db: Session, id_category: int):
     category = db.query(Category).filter(Category.id == id_category).first()
     return category
 
 
+def get_categories_by_ids(db: Session, ids: Iterable[int]) -> dict:
+    """ Категории по списку id: {id: категория} """
+    return get_by_ids(db, Category, ids)
+
+
+@cached(CATEGORY)
 def get_all_categories(db: Session):
     """Получение списка всех категорий товаров"""
     categories = db.query(Category).all()
     return categories
 
 
+@invalidates(CATEGORY)
 @dbexception
 def update_category_name(db: Session, id_category: int, new_name: str):
-    category = get_category_by_id(db, id_category)
+    category = db.get(Category, id_category)
     category.name = new_name
 
 
@@ -422,6 +633,7 @@ def create_user(db: Session, login: str, password: str, id_role: int):
     return add_user(db, user)
 
 
+@invalidates(USERS)
 @dbexception
 def add_user(db: Session, user: User):
     db.add(user)
@@ -432,6 +644,7 @@ def get_user_by_login(db: Session, login: str):
     return user
 
 
+@invalidates(USERS)
 @dbexception
 def update_user_password(db: Session, login_user: str, new_password: str) -> bool:
     """ Обновление пароля пользователя """
@@ -444,13 +657,14 @@ def update_user_password(db: Session, login_user: str, new_password: str) -> boo
         user.password = hashed_password
         db.commit()  # Сохраняем изменения в БД
 
-        logging.info(f"Пароль для пользователя {login_user} успешно обновлен.")
+        logger.info("Пароль для пользователя %s успешно обновлен", login_user)
         return True
     else:
-        logging.warning(f"Пользователь с логином {login_user} не найден.")
+        logger.warning("Пользователь с логином %s не найден", login_user)
         return False
 
 
+@invalidates(USERS)
 @dbexception
 def delete_user(db: Session, login_user: str) -> bool:
     """ Удаление пользователя по логину """
@@ -459,13 +673,14 @@ def delete_user(db: Session, login_user: str) -> bool:
     if user:
         db.delete(user)
         db.commit()  # Важно: фиксируем изменения в БД
-        logging.info(f"Пользователь с логином {login_user} успешно удален.")
+        logger.info("Пользователь с логином %s успешно удален", login_user)
         return True
     else:
-        logging.warning(f"Пользователь с логином {login_user} не найден.")
+        logger.warning("Пользователь с логином %s не найден", login_user)
         return False
 
 
+@invalidates(USERS)
 @dbexception
 def update_user_role(db: Session, login_user: str, role: int):
     user = get_user_by_login(db, login_user)
@@ -473,6 +688,7 @@ def update_user_role(db: Session, login_user: str, role: int):
     return True
 
 
+@cached(USERS)
 def get_all_users(db: Session):
     """Получение списка всех пользователей"""
     users = db.query(Users).all()
@@ -491,11 +707,10 @@ def add_role(db: Session, role_name: str) -> bool:
         role = Role(name=role_name)
         db.add(role)
         db.commit()
-        print("Success", role_name)
+        logger.debug("Добавлена роль %s", role_name)
     except Exception as ex:
-        print(traceback.format_exc())
+        logger.warning("Ошибка добавления роли %s", role_name, exc_info=True)
         db.rollback()
-        print("Failed")
         return False
     return True
 
@@ -512,12 +727,11 @@ def add_transaction_type(db: Session, type_name: str) -> bool:
         type = TypesTransaction(name=type_name)
         db.add(type)
         db.commit()
-        print("Success", type_name)
+        logger.debug("Добавлен тип операции %s", type_name)
 
     except Exception as ex:
-        print(traceback.format_exc())
+        logger.warning("Ошибка добавления типа операции %s", type_name, exc_info=True)
         db.rollback()
-        print("Failed")
         return False
 
     return True
@@ -536,94 +750,253 @@ def create_transaction(db: Session, id_type: int, id_purchase: int, amount: int,
     return add_transaction(db, transaction)
 
 
-def add_transaction(db: Session, transaction: Transaction) -> bool:
-    try:
-        db.add(transaction)
-        db.commit()
+def apply_transaction(db: Session, transaction: Transaction):
+    """ Применяет операцию к остаткам партий, товара и к параметрам периода.
+        Если продажа превышает остаток партии, остаток списывается со следующих партий (FIFO)
+        отдельными операциями. Изменения не фиксируются - фиксацию выполняет вызывающая функция. """
+    db.add(transaction)
+    if transaction.created_on is None:
+        transaction.created_on = datetime.now()
+
+    purchase = get_purchase_by_id(db, transaction.id_purchase)
+    if purchase is None:
+        raise ValueError(f"Партия с id {transaction.id_purchase} не найдена")
 
-        purchase = get_purchase_by_id(db, transaction.id_purchase)
+    rest = 0
+    next_purchase = 0
 
-        rest = 0
-        next_purchase = 0
+    if transaction.id_type == 1:
+        rest, next_purchase = decrease_purchase_count(db, transaction.id_purchase, transaction.amount,
+                                                      transaction.id_type)
+        if rest > 0:
+            transaction.amount = transaction.amount - rest
 
-        if transaction.id_type == 1:
-            rest, next_purchase = decrease_purchase_count(db, transaction.id_purchase, transaction.amount,
-                                                          transaction.id_type)
-            if rest > 0:
-                transaction.amount = transaction.amount - rest
+        increase_param(db, "Rev", purchase.selling_price * transaction.amount)
+        increase_param(db, "DirectSoldCosts", purchase.purchase_price * transaction.amount)
+    if transaction.id_type == 2:
+        increase_param(db, "DirectCosts", purchase.purchase_price * transaction.amount)
+    if transaction.id_type == 3:
+        decrease_purchase_count(db, transaction.id_purchase, transaction.amount, transaction.id_type)
+        increase_param(db, "IndirectCosts", purchase.purchase_price * transaction.amount)
 
-            increase_param(db, "Rev", purchase.selling_price * transaction.amount)
-            increase_param(db, "DirectSoldCosts", purchase.purchase_price * transaction.amount)
-        if transaction.id_type == 2:
-            increase_param(db, "DirectCosts", purchase.purchase_price * transaction.amount)
-        if transaction.id_type == 3:
-            decrease_purchase_count(db, transaction.id_purchase, transaction.amount, transaction.id_type)
-            increase_param(db, "IndirectCosts", purchase.purchase_price * transaction.amount)
+    add_totals(db, DailySales, [daily_sales_row(transaction, purchase)])
+    if transaction.id_type == 1:
+        add_totals(db, ProductSales, [product_sales_row(transaction, purchase)])
 
-        if rest > 0:
-            create_transaction(db, transaction.id_type, next_purchase, rest, transaction.id_user)
+    if rest > 0:
+        apply_transaction(db, Transaction(id_type=transaction.id_type, id_purchase=next_purchase, amount=rest,
+                                          id_user=transaction.id_user))
 
-        print("Success", transaction.id_type, transaction.created_on)
+
+@invalidates(PRODUCT)
+def add_transaction(db: Session, transaction: Transaction) -> bool:
+    """ Вся операция (включая списание с нескольких партий) фиксируется одним commit """
+    try:
+        apply_transaction(db, transaction)
+        db.commit()
+
+        logger.debug("Операция %s добавлена", transaction.id, extra={
+            "id_transaction": transaction.id, "id_type": transaction.id_type, "id_purchase": transaction.id_purchase})
 
     except Exception as ex:
-        print(traceback.format_exc())
+        logger.warning("Ошибка добавления операции типа %s по партии %s", transaction.id_type,
+                       transaction.id_purchase, extra={"id_purchase": transaction.id_purchase}, exc_info=True)
         db.rollback()
-        print("Failed")
         return False
 
     return True
 
 
-def get_transactions_by_id_product(db: Session, id_product: int) -> List[Transaction]:
+@invalidates(PRODUCT)
+def add_bulk_transactions(db: Session, lines: List[dict], id_user: int) -> List[dict]:
+    """ Пакетная продажа/списание (например, весь чек): lines - список {id_type, id_product, amount, id_purchase}.
+        Открытые партии всех товаров загружаются (с блокировкой) одним запросом, количество распределяется
+        по партиям в памяти по FIFO (начиная с текущей партии товара), операции и новые остатки записываются
+        пакетно, все фиксируется одним commit. Списание с указанной партией (id_purchase) выполняется только
+        с нее. Если хотя бы одну строку выполнить нельзя, не выполняется ни одна - ValueError.
+        Возвращает для каждой строки список операций {id_purchase, amount} """
     try:
-        # Шаг 1: Найдем все закупки, связанные с данным товаром
-        purchases = db.query(Purchase).filter(Purchase.id_product == id_product).all()
+        ids = sorted({line["id_product"] for line in lines})
+        # порядок блокировок как в одиночных операциях: сначала партии, затем товары
+        batches = {id_product: [] for id_product in ids}
+        db.flush()  # партии, уже загруженные в сессию, перечитываются под блокировкой (populate_existing)
+        for start in range(0, len(ids), IN_CHUNK_SIZE):
+            query = (
+                db.query(Purchase)
+                .filter(Purchase.id_product.in_(ids[start:start + IN_CHUNK_SIZE]), Purchase.is_open)
+                .order_by(Purchase.id_product, Purchase.created_on, Purchase.id)
+                .with_for_update()
+                .populate_existing()
+            )
+            for purchase in query:
+                batches[purchase.id_product].append(purchase)
+        products = get_by_ids(db, Product, ids, for_update=True)
+
+        for id_product in ids:
+            if id_product not in products:
+                raise ValueError(f"Товар с id {id_product} не найден")
+            # текущая партия товара расходуется первой, как в одиночной продаже
+            current = [purchase for purchase in batches[id_product] if purchase.id == products[id_product].id_purchase]
+            batches[id_product] = current + [purchase for purchase in batches[id_product] if purchase not in current]
+
+        now = datetime.now()
+        transactions, results = [], []
+        for number, line in enumerate(lines, start=1):
+            product = products[line["id_product"]]
+            open_batches = batches[product.id]
+            if line["id_type"] == 3 and line.get("id_purchase") is not None:
+                open_batches = [purchase for purchase in open_batches if purchase.id == line["id_purchase"]]
+                if not open_batches:
+                    raise ValueError(f"Строка {number}: партия {line['id_purchase']} товара {product.id} "
+                                     f"не найдена или пуста")
+            if sum(purchase.current_count for purchase in open_batches) < line["amount"]:
+                raise ValueError(f"Строка {number}: количество {line['amount']} превышает остаток товара {product.id}")
+
+            allocations, rest = [], line["amount"]
+            for purchase in open_batches:
+                amount = min(rest, purchase.current_count)
+                if amount == 0:
+                    continue
+                purchase.current_count -= amount
+                rest -= amount
+                transaction = Transaction(id_type=line["id_type"], id_purchase=purchase.id, amount=amount,
+                                          id_user=id_user, created_on=now)
+                transactions.append((transaction, purchase))
+                allocations.append({"id_purchase": purchase.id, "amount": amount})
+                if rest == 0:
+                    break
+            product.total_count -= line["amount"]
+            results.append(allocations)
+
+        for product in products.values():
+            next_purchase = next((purchase for purchase in batches[product.id] if purchase.current_count > 0), None)
+            product.id_purchase = next_purchase.id if next_purchase else None
+
+        # операции - одним INSERT с набором параметров (executemany), остатки - UPDATE при commit
+        db.execute(insert(Transaction), [
+            {"id_type": transaction.id_type, "id_purchase": transaction.id_purchase, "amount": transaction.amount,
+             "id_user": transaction.id_user, "created_on": transaction.created_on}
+            for transaction, purchase in transactions
+        ])
+
+        sales = [(transaction, purchase) for transaction, purchase in transactions if transaction.id_type == 1]
+        writeoffs = [(transaction, purchase) for transaction, purchase in transactions if transaction.id_type == 3]
+        if sales:
+            increase_param(db, "Rev",
+                           sum(purchase.selling_price * transaction.amount for transaction, purchase in sales))
+            increase_param(db, "DirectSoldCosts",
+                           sum(purchase.purchase_price * transaction.amount for transaction, purchase in sales))
+        if writeoffs:
+            increase_param(db, "IndirectCosts",
+                           sum(purchase.purchase_price * transaction.amount for transaction, purchase in writeoffs))
+        add_totals(db, DailySales, [daily_sales_row(transaction, purchase) for transaction, purchase in transactions])
+        add_totals(db, ProductSales, [product_sales_row(transaction, purchase) for transaction, purchase in sales])
 
-        if not purchases:
-            print(f"Не найдено закупок для товара с id {id_product}")
-            return []
+        db.commit()
+        return results
 
-        # Шаг 2: Получаем список ids закупок для данного товара
-        id_purchases = [purchase.id for purchase in purchases]
+    except Exception:
+        db.rollback()
+        raise
 
-        # Шаг 3: Находим все транзакции, связанные с найденными закупками
-        transactions = db.query(Transaction).filter(Transaction.id_purchase.in_(id_purchases)).all()
+
+def get_transactions_by_id_product(db: Session, id_product: int) -> list:
+    try:
+        # операции всех закупок товара - одним запросом с JOIN
+        transactions = (
+            db.query(*table_columns(Transaction))
+            .join(Purchase, Purchase.id == Transaction.id_purchase)
+            .filter(Purchase.id_product == id_product)
+            .order_by(Transaction.id)
+            .all()
+        )
 
         if not transactions:
-            print(f"Не найдено транзакций для товара с id {id_product}")
+            logger.debug("Не найдено транзакций для товара с id %s", id_product, extra={"id_product": id_product})
             return []
 
         # Возвращаем все найденные транзакции
         return transactions
 
     except Exception as ex:
-        print("Ошибка при получении транзакций:", ex)
+        logger.exception("Ошибка при получении транзакций товара %s", id_product, extra={"id_product": id_product})
         return []
 
 
-def get_transactions_by_type(db: Session, id_type: int):
+def filter_transactions(db: Session, query, id_type: Optional[int] = None, date_from: Optional[datetime] = None,
+                        date_to: Optional[datetime] = None, id_warehouse: Optional[int] = None):
+    """ Добавляет к запросу операций фильтры по типу, периоду (включительно) и складу партии """
+    if id_type is not None:
+        query = query.filter(Transaction.id_type == id_type)
+    if date_from is not None:
+        query = query.filter(Transaction.created_on >= date_from)
+    if date_to is not None:
+        query = query.filter(Transaction.created_on <= date_to)
+    if id_warehouse is not None:
+        query = query.filter(
+            db.query(Purchase.id)
+            .filter(Purchase.id == Transaction.id_purchase, Purchase.id_warehouse == id_warehouse)
+            .exists()
+        )
+    return query
+
+
+def encode_cursor(transaction: Transaction) -> str:
+    """ Курсор страницы операций: дата и id последней операции страницы """
+    return f"{transaction.created_on.isoformat()},{transaction.id}"
+
+
+def decode_cursor(cursor: str):
+    created_on, id_transaction = cursor.rsplit(',', 1)
+    return datetime.fromisoformat(created_on), int(id_transaction)
+
+
+def get_transactions_page(db: Session, id_type: Optional[int] = None, date_from: Optional[datetime] = None,
+                          date_to: Optional[datetime] = None, id_warehouse: Optional[int] = None,
+                          cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    """ Постраничная выдача операций (keyset по (created_on, id)) с фильтрами, выполняемыми в SQL.
+        Стоимость запроса не зависит от номера страницы - вместо OFFSET используется условие
+        "после последней записи предыдущей страницы".
+        Возвращает (операции, курсор следующей страницы или None, если страница последняя) """
+    limit = min(limit, MAX_PAGE_SIZE)
+    query = filter_transactions(db, db.query(*table_columns(Transaction)), id_type, date_from, date_to,
+                                id_warehouse)
+    if cursor:
+        created_on, id_transaction = decode_cursor(cursor)
+        query = query.filter(or_(Transaction.created_on > created_on,
+                                 and_(Transaction.created_on == created_on, Transaction.id > id_transaction)))
+
+    # запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница
+    transactions = query.order_by(Transaction.created_on, Transaction.id).limit(limit + 1).all()
+    if len(transactions) > limit:
+        return transactions[:limit], encode_cursor(transactions[limit - 1])
+    return transactions, None
+
+
+def get_transactions_by_type(db: Session, id_type: int, date_from: Optional[datetime] = None,
+                             date_to: Optional[datetime] = None, id_warehouse: Optional[int] = None):
     try:
 
         # Шаг 3: Находим все транзакции, связанные с найденными закупками
-        transactions = db.query(Transaction).filter(Transaction.id_type == id_type).all()
+        transactions = filter_transactions(db, db.query(*table_columns(Transaction)), id_type, date_from, date_to,
+                                           id_warehouse).all()
 
         if not transactions:
-            print(f"Не найдено транзакций типа {id_type}")
+            logger.debug("Не найдено транзакций типа %s", id_type)
             return []
 
-        print(transactions)
-        print(len(transactions))
+        logger.debug("Транзакций типа %s: %s", id_type, len(transactions))
         # Возвращаем все найденные транзакции
         return transactions
 
     except Exception as ex:
-        print("Ошибка при получении транзакций:", ex)
+        logger.exception("Ошибка при получении транзакций типа %s", id_type)
         return []
 
 
 def get_transactions_all(db: Session):
-    transactions = db.query(Transaction).all()
-    print(transactions)
+    transactions = db.query(*table_columns(Transaction)).all()
+    logger.debug("Транзакций: %s", len(transactions))
     return transactions
 
 
@@ -633,20 +1006,22 @@ def delete_transaction_by_id_product(db: Session, id_product: int) -> bool:
     transactions = get_transactions_by_id_product(db, id_product)
 
     if not transactions:
-        logging.warning(f"Транзакции для товара с ID {id_product} не найдены.")
+        logger.warning("Транзакции для товара с ID %s не найдены", id_product, extra={"id_product": id_product})
         return False
 
-    logging.info(f"Удаление транзакций для товара с ID {id_product}: {transactions}")
+    logger.info("Удаление транзакций для товара с ID %s: %s", id_product, len(transactions),
+                extra={"id_product": id_product})
 
     try:
         # Используем один запрос для удаления всех транзакций
         db.query(Transaction).filter(Transaction.id_product == id_product).delete(synchronize_session=False)
         db.commit()  # Зафиксировать изменения в базе данных
-        logging.info(f"Транзакции для товара с ID {id_product} успешно удалены.")
+        logger.info("Транзакции для товара с ID %s успешно удалены", id_product, extra={"id_product": id_product})
         return True
     except Exception as ex:
         db.rollback()
-        logging.error(f"Ошибка при удалении транзакций для товара с ID {id_product}: {traceback.format_exc()}")
+        logger.exception("Ошибка при удалении транзакций для товара с ID %s", id_product,
+                         extra={"id_product": id_product})
         return False
 
 
@@ -664,15 +1039,16 @@ def create_expense(db: Session, name: str, cost: float, id_user: int, descriptio
 def add_expense(db: Session, expense: Expense) -> bool:
     try:
         db.add(expense)
-        db.commit()
-
+        if expense.created_on is None:
+            expense.created_on = datetime.now()
         increase_param(db, "IndirectCosts", expense.cost)
-        print("Success", expense.name, expense.created_on)
+        add_totals(db, DailyExpenses, [{"day": expense.created_on.date(), "cost": expense.cost, "count": 1}])
+        db.commit()
+        logger.debug("Добавлен расход %s", expense.name)
 
     except Exception as ex:
-        print(traceback.format_exc())
+        logger.warning("Ошибка добавления расхода %s", expense.name, exc_info=True)
         db.rollback()
-        print("Failed")
         return False
 
     return True
@@ -688,7 +1064,7 @@ def get_expense_by_date(db: Session, start_date: datetime, end_date: datetime) -
     """Выборка всех записей о затратах по заданному временному промежутку."""
     expenses = db.query(Expense).filter(Expense.created_on.between(start_date, end_date)).all()
 
-    logging.info(f"Найдено {len(expenses)} записей о расходах с {start_date} по {end_date}")
+    logger.debug("Найдено %s записей о расходах с %s по %s", len(expenses), start_date, end_date)
 
     return expenses if expenses else []
 
@@ -703,10 +1079,242 @@ def delete_expense_by_id(db: Session, id_expense: int) -> bool:
         date = expense.created_on
         db.delete(expense)
         db.commit()
-        logging.info(f"Запись о расходах {expense_name} от {date} успешно удалена.")
+        logger.info("Запись о расходах %s от %s успешно удалена", expense_name, date)
         return True
     else:
-        logging.warning(f"Запись о расходах {int} не найдена.")
+        logger.warning("Запись о расходах %s не найдена", id_expense)
         return False
 
 # endregion
+
+
+# region
+""" _______DAILY_TOTALS______ """
+
+
+def add_totals(db: Session, model, rows: List[dict]):
+    """ Прибавляет значения rows к итогам model (DailySales/DailyExpenses/ProductSales), создавая недостающие строки.
+        Для SQLite/PostgreSQL/MySQL - один запрос INSERT ... ON CONFLICT (ON DUPLICATE KEY) UPDATE без чтения
+        строки, поэтому одновременные операции по одному товару за день не конфликтуют на вставке.
+        Строки с одинаковым ключом предварительно суммируются.
+        Изменения не фиксируются - фиксацию выполняет вызывающая функция. """
+    if not rows:
+        return
+    table = model.__table__
+    keys = [column.name for column in table.primary_key.columns]
+    values = [column.name for column in table.columns if column.name not in keys]
+
+    merged = {}
+    for row in rows:
+        key = tuple(row[name] for name in keys)
+        if key in merged:
+            for name in values:
+                merged[key][name] += row[name]
+        else:
+            merged[key] = dict(row)
+    rows = list(merged.values())
+
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        statement = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=keys, set_={name: table.c[name] + statement.excluded[name] for name in values})
+        db.execute(statement, rows)
+    elif dialect in ('mysql', 'mariadb'):
+        statement = mysql.insert(table)
+        statement = statement.on_duplicate_key_update(
+            {name: table.c[name] + statement.inserted[name] for name in values})
+        db.execute(statement, rows)
+    else:
+        db.flush()
+        for row in rows:
+            total = db.get(model, tuple(row[name] for name in keys), with_for_update=True)
+            if total is None:
+                db.add(model(**row))
+                db.flush()
+            else:
+                for name in values:
+                    setattr(total, name, getattr(total, name) + row[name])
+
+
+def daily_sales_row(transaction: Transaction, purchase: Purchase) -> dict:
+    """ Вклад операции в дневные итоги DailySales """
+    is_sale = transaction.id_type == 1
+    margin = 0
+    if is_sale and purchase.selling_price:
+        margin = (purchase.selling_price - purchase.purchase_price) * 100 / purchase.selling_price
+    return {
+        "day": transaction.created_on.date(),
+        "id_product": purchase.id_product,
+        "id_warehouse": purchase.id_warehouse or 0,
+        "id_type": transaction.id_type,
+        "quantity": transaction.amount,
+        "revenue": purchase.selling_price * transaction.amount if is_sale else 0,
+        "cost": purchase.purchase_price * transaction.amount,
+        "count": 1,
+        "margin_sum": margin,
+    }
+
+
+def product_sales_row(transaction: Transaction, purchase: Purchase) -> dict:
+    """ Вклад продажи в итоги продаж товара ProductSales """
+    return {
+        "id_product": purchase.id_product,
+        "quantity": transaction.amount,
+        "revenue": purchase.selling_price * transaction.amount,
+        "cost": purchase.purchase_price * transaction.amount,
+        "count": 1,
+    }
+
+
+@dbexception
+def rebuild_totals(db: Session):
+    """ Пересчитывает итоги (дневные и по товарам) по таблицам transaction и expense целиком
+        (после загрузки данных в обход сервисного слоя или ручного исправления операций) """
+    db.query(DailySales).delete(synchronize_session=False)
+    db.query(DailyExpenses).delete(synchronize_session=False)
+    db.query(ProductSales).delete(synchronize_session=False)
+    db.query(ProductRanking).delete(synchronize_session=False)
+
+    is_sale = Transaction.id_type == 1
+    day = func.date(Transaction.created_on)
+    id_warehouse = func.coalesce(Purchase.id_warehouse, 0)
+    sales = (
+        db.query(day, Purchase.id_product, id_warehouse, Transaction.id_type,
+                 func.sum(Transaction.amount),
+                 func.sum(case((is_sale, Purchase.selling_price * Transaction.amount), else_=0)),
+                 func.sum(Purchase.purchase_price * Transaction.amount),
+                 func.count(Transaction.id),
+                 func.coalesce(func.sum(case((and_(is_sale, Purchase.selling_price != 0),
+                                              (Purchase.selling_price - Purchase.purchase_price) * 100
+                                              / Purchase.selling_price), else_=0)), 0))
+        .join(Purchase, Purchase.id == Transaction.id_purchase)
+        .group_by(day, Purchase.id_product, id_warehouse, Transaction.id_type)
+    )
+    db.execute(insert(DailySales).from_select(
+        ['day', 'id_product', 'id_warehouse', 'id_type', 'quantity', 'revenue', 'cost', 'count', 'margin_sum'],
+        sales.statement))
+
+    product_sales = (
+        db.query(Purchase.id_product, func.sum(Transaction.amount),
+                 func.sum(Purchase.selling_price * Transaction.amount),
+                 func.sum(Purchase.purchase_price * Transaction.amount), func.count(Transaction.id))
+        .join(Purchase, Purchase.id == Transaction.id_purchase)
+        .filter(is_sale)
+        .group_by(Purchase.id_product)
+    )
+    db.execute(insert(ProductSales).from_select(['id_product', 'quantity', 'revenue', 'cost', 'count'],
+                                                product_sales.statement))
+
+    expense_day = func.date(Expense.created_on)
+    expenses = db.query(expense_day, func.sum(Expense.cost), func.count(Expense.id)).group_by(expense_day)
+    db.execute(insert(DailyExpenses).from_select(['day', 'cost', 'count'], expenses.statement))
+
+# endregion
+
+
+# region
+""" _______ANALYTICS______ """
+
+
+def filter_days(query, model, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+    """ Фильтр дневных итогов по периоду (с точностью до дня) """
+    if date_from is not None:
+        query = query.filter(model.day >= date_from.date())
+    if date_to is not None:
+        query = query.filter(model.day <= date_to.date())
+    return query
+
+
+def get_sales_by_day(db: Session, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+    """ Выручка, себестоимость, число продаж и сумма маржи (%) продаж по дням (из дневных итогов) """
+    query = (
+        db.query(DailySales.day,
+                 func.sum(DailySales.revenue).label('revenue'),
+                 func.sum(DailySales.cost).label('cost'),
+                 func.sum(DailySales.count).label('count'),
+                 func.sum(DailySales.margin_sum).label('margin_sum'))
+        .filter(DailySales.id_type == 1)
+    )
+    return filter_days(query, DailySales, date_from, date_to).group_by(DailySales.day).order_by(DailySales.day).all()
+
+
+def get_sales_by_product(db: Session, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+    """ Выручка, себестоимость и количество проданного по товарам с категорией товара (из дневных итогов) """
+    query = (
+        db.query(Product.id, Product.name, Category.name.label('category'),
+                 func.sum(DailySales.revenue).label('revenue'),
+                 func.sum(DailySales.cost).label('cost'),
+                 func.sum(DailySales.quantity).label('quantity'))
+        .select_from(DailySales)
+        .join(Product, Product.id == DailySales.id_product)
+        .outerjoin(Category, Category.id == Product.id_category)
+        .filter(DailySales.id_type == 1)
+    )
+    return filter_days(query, DailySales, date_from, date_to).group_by(Product.id, Product.name, Category.name).all()
+
+
+def get_analytics(db: Session, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                  top_n: int = 10) -> dict:
+    """ Аналитика продаж за период: KPI, выручка/расходы/прибыль по дням, продажи по категориям и товарам,
+        топ товаров по прибыли, выручке и марже. Читаются дневные итоги (DailySales), поэтому
+        время и размер ответа O(дней x товаров) и не зависят от числа операций """
+    revenue_by_day, expenses_by_day, profit_by_day = {}, {}, {}
+    total_revenue, total_cost, margin_sum, transaction_count = 0.0, 0.0, 0.0, 0
+    for row in get_sales_by_day(db, date_from, date_to):
+        day = str(row.day)
+        revenue_by_day[day] = float(row.revenue or 0)
+        expenses_by_day[day] = float(row.cost or 0)
+        profit_by_day[day] = revenue_by_day[day] - expenses_by_day[day]
+        total_revenue += revenue_by_day[day]
+        total_cost += expenses_by_day[day]
+        margin_sum += float(row.margin_sum or 0)
+        transaction_count += row.count
+
+    sales_by_category, product_sales = {}, {}
+    for row in get_sales_by_product(db, date_from, date_to):
+        revenue, cost = float(row.revenue or 0), float(row.cost or 0)
+        product_sales[row.id] = {
+            "id": row.id,
+            "name": row.name,
+            "revenue": revenue,
+            "profit": revenue - cost,
+            "quantity": int(row.quantity or 0),
+            "margin": (revenue - cost) / revenue * 100 if revenue > 0 else 0,
+        }
+        category = sales_by_category.setdefault(row.category or 'Без категории',
+                                                {"revenue": 0.0, "profit": 0.0, "count": 0})
+        category["revenue"] += revenue
+        category["profit"] += revenue - cost
+        category["count"] += int(row.quantity or 0)
+
+    for category in sales_by_category.values():
+        category["margin"] = category["profit"] / category["revenue"] * 100 if category["revenue"] > 0 else 0
+
+    products = list(product_sales.values())
+    return {
+        "kpi": {
+            "totalRevenue": total_revenue,
+            "totalCost": total_cost,
+            "totalProfit": total_revenue - total_cost,
+            "averageMargin": margin_sum / transaction_count if transaction_count else 0,
+            "activeProductsCount": len(product_sales),
+            "averageCheck": total_revenue / transaction_count if transaction_count else 0,
+            "stockTurnover": total_revenue / total_cost if total_cost else 0,
+            "transactionCount": transaction_count,
+        },
+        "revenueByDay": revenue_by_day,
+        "expensesByDay": expenses_by_day,
+        "profitByDay": profit_by_day,
+        "salesByCategory": sales_by_category,
+        "productSales": product_sales,
+        "topProducts": {
+            "byProfit": sorted(products, key=lambda p: p["profit"], reverse=True)[:top_n],
+            "bySales": sorted(products, key=lambda p: p["revenue"], reverse=True)[:top_n],
+            "byMargin": sorted([p for p in products if p["quantity"] > 0],
+                               key=lambda p: p["margin"], reverse=True)[:top_n],
+        },
+    }
+
+# endregion
@@ -0,0 +1,146 @@
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.metrics import route_template
+
+"""
+    Трассировка SQL-запросов HTTP-запроса для режима разработки (раздел [Debug] файла конфигурации).
+
+    Запросы группируются по форме (нормализованному тексту SQL: значения и списки IN заменены заполнителями).
+    Форма, выполненная за один HTTP-запрос threshold и более раз, - признак N+1 (чтение в цикле
+    или повторное чтение уже загруженных строк). Итог возвращается в заголовке X-SQL-Trace,
+    подробности - в строке лога (предупреждение, если есть повторяющиеся формы).
+"""
+
+logger = logging.getLogger(__name__)
+
+SQL_TRACE_THRESHOLD = 3
+SQL_TRACE_HEADER = b'x-sql-trace'
+MAX_SHAPE_LENGTH = 200  # длина текста формы в строке лога
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%\(\w+\)s|%s|:\w+|\$\d+')
+PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*')
+WHITESPACE = re.compile(r'\s+')
+SELECT_COLUMNS = re.compile(r'^SELECT .+? FROM ')
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(statement: str) -> str:
+    """ Форма запроса: значения -> ?, списки (?, ?, ...) и VALUES (...), (...) -> (...), пробелы схлопнуты """
+    shape = STRING_LITERAL.sub('?', statement)
+    shape = PLACEHOLDER.sub('?', shape)
+    shape = NUMBER_LITERAL.sub('?', shape)
+    shape = PLACEHOLDER_LIST.sub('(...)', shape)
+    return WHITESPACE.sub(' ', shape).strip()
+
+
+def short_shape(shape: str) -> str:
+    """ Форма для строки лога: список столбцов SELECT сокращается, чтобы были видны таблица и условия """
+    return SELECT_COLUMNS.sub('SELECT ... FROM ', shape)[:MAX_SHAPE_LENGTH]
+
+
+class SqlTrace:
+    """ Запросы одного HTTP-запроса (или блока trace()): форма -> [число выполнений, время, с] """
+
+    def __init__(self):
+        self.shapes = {}
+        self.started = 0.0
+
+    @property
+    def statements(self) -> int:
+        return sum(count for count, elapsed in self.shapes.values())
+
+    @property
+    def db_time(self) -> float:
+        return sum(elapsed for count, elapsed in self.shapes.values())
+
+    def repeated(self, threshold: int = SQL_TRACE_THRESHOLD) -> list:
+        """ Повторяющиеся формы [(форма, число выполнений, время)] по убыванию числа выполнений """
+        rows = [(shape, count, elapsed) for shape, (count, elapsed) in self.shapes.items() if count >= threshold]
+        return sorted(rows, key=lambda row: -row[1])
+
+    def summary(self, threshold: int = SQL_TRACE_THRESHOLD) -> str:
+        return (f"statements={self.statements}; shapes={len(self.shapes)}; "
+                f"repeated={len(self.repeated(threshold))}; db_ms={self.db_time * 1000:.1f}")
+
+
+SQL_TRACE: ContextVar[Optional[SqlTrace]] = ContextVar('sql_trace', default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = SQL_TRACE.get()
+    if trace is not None:
+        trace.started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = SQL_TRACE.get()
+    if trace is not None:
+        elapsed = time.perf_counter() - trace.started
+        shape = trace.shapes.setdefault(normalize_statement(statement), [0, 0.0])
+        shape[0] += 1
+        shape[1] += elapsed
+
+
+def instrument_engine(engine: Engine):
+    """ Подключает трассировку к движку (для асинхронного движка передается async_engine.sync_engine) """
+    if not event.contains(engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+@contextmanager
+def trace():
+    """ Трассировка запросов блока кода (скрипты, тесты): with trace() as sql: ...; sql.repeated() """
+    sql = SqlTrace()
+    token = SQL_TRACE.set(sql)
+    try:
+        yield sql
+    finally:
+        SQL_TRACE.reset(token)
+
+
+def log_trace(name: str, sql: SqlTrace, threshold: int = SQL_TRACE_THRESHOLD):
+    """ Строка лога с итогом трассировки; повторяющиеся формы - предупреждение """
+    repeated = sql.repeated(threshold)
+    if not repeated:
+        logger.info("SQL %s: %s", name, sql.summary(threshold))
+        return
+    details = '; '.join(f"{count}x {elapsed * 1000:.1f} ms {short_shape(shape)}"
+                        for shape, count, elapsed in repeated)
+    logger.warning("SQL %s: %s; повторяющиеся запросы: %s", name, sql.summary(threshold), details)
+
+
+class SqlTraceMiddleware:
+    """ ASGI middleware трассировки SQL: заголовок X-SQL-Trace и строка лога на каждый HTTP-запрос.
+        В заголовок попадают запросы, выполненные до начала отправки ответа """
+
+    def __init__(self, app, threshold: int = SQL_TRACE_THRESHOLD):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        with trace() as sql:
+            async def send_wrapper(message):
+                if message['type'] == 'http.response.start':
+                    headers = list(message.get('headers', []))
+                    headers.append((SQL_TRACE_HEADER, sql.summary(self.threshold).encode('latin-1')))
+                    message = {**message, 'headers': headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                log_trace(f"{scope['method']} {scope['path']} ({route_template(scope)})", sql, self.threshold)
@@ -1,6 +1,12 @@
 // API URL base
 const API_BASE_URL = '/api';
 
+// Authorization header with the signed token from /api/authenticate
+function authHeaders(headers = {}) {
+    const token = sessionStorage.getItem('warehouseAuthToken') || localStorage.getItem('warehouseAuthToken');
+    return token ? { ...headers, 'Authorization': `Bearer ${token}` } : headers;
+}
+
 // Transaction types
 const TRANSACTION_TYPES = {
     SALE: 1,
@@ -431,7 +437,14 @@ function setupButtons() {
     // Logout button
     const logoutButton = document.getElementById('logoutButton');
     if (logoutButton) {
-        logoutButton.addEventListener('click', function () {
+        logoutButton.addEventListener('click', async function () {
+            // Revoke the token on the server (errors are ignored: the token expires anyway)
+            try {
+                await fetch(`${API_BASE_URL}/logout`, { method: 'POST', headers: authHeaders() });
+            } catch (error) {
+                console.error('Logout error:', error);
+            }
+
             // Clear session storage
             sessionStorage.removeItem('warehouseAuthToken');
             sessionStorage.removeItem('warehouseUserLogin');
@@ -476,7 +489,7 @@ async function loadUsersData() {
 
     try {
         // Загружаем список пользователей через API
-        const response = await fetch(`${API_BASE_URL}/get_all_users`);
+        const response = await fetch(`${API_BASE_URL}/get_all_users`, { headers: authHeaders() });
 
         if (!response.ok) {
             throw new Error('Не удалось загрузить пользователей');
@@ -561,9 +574,9 @@ async function saveUserRole() {
         // Отправляем запрос на обновление роли
         const response = await fetch(`${API_BASE_URL}/update_user_role/`, {
             method: 'PUT',
-            headers: {
+            headers: authHeaders({
                 'Content-Type': 'application/json'
-            },
+            }),
             body: JSON.stringify({
                 new_role_id: parseInt(newRoleId),
                 user_login: userLogin
@@ -610,8 +623,8 @@ async function loadProductsData() {
     tableBody.innerHTML = '<tr><td colspan="5" class="text-center">Загрузка данных...</td></tr>';
 
     try {
-        // Fetch products
-        const response = await fetch(`${API_BASE_URL}/get_product_all`);
+        // Fetch products with categories and open batches in one request
+        const response = await fetch(`${API_BASE_URL}/inventory_overview`);
         if (!response.ok) throw new Error('Не удалось загрузить товары');
 
         const products = await response.json();
@@ -626,34 +639,8 @@ async function loadProductsData() {
 
         // Add each product to the table
         for (const product of products) {
-            // Get category name
-            let categoryName = 'Не указано';
-            try {
-                const categoryResponse = await fetch(`${API_BASE_URL}/get_category_by_id/${product.id_category}`);
-                if (categoryResponse.ok) {
-                    const category = await categoryResponse.json();
-                    categoryName = category.name;
-                }
-            } catch (error) {
-                console.error('Ошибка при загрузке категории:', error);
-            }
-
-            // Get total count
-            let totalCount = product.total_count || 0;
-
-            try {
-                const purchasesResponse = await fetch(`${API_BASE_URL}/get_purchase_by_product/${product.id}`);
-                if (purchasesResponse.ok) {
-                    const purchases = await purchasesResponse.json();
-
-                    if (purchases && purchases.length > 0) {
-                        // Calculate total count
-                        totalCount = purchases.reduce((sum, purchase) => sum + (purchase.current_count || 0), 0);
-                    }
-                }
-            } catch (error) {
-                console.error('Ошибка при загрузке закупок:', error);
-            }
+            const categoryName = product.category || 'Не указано';
+            const totalCount = product.batches.reduce((sum, purchase) => sum + purchase.current_count, 0);
 
             // Create row
             const row = document.createElement('tr');
@@ -1267,8 +1254,8 @@ async function loadProductsForSale() {
     }
 
     try {
-        // Fetch products
-        const response = await fetch(`${API_BASE_URL}/get_product_all`);
+        // Fetch products with open batches (already sorted from old to new) in one request
+        const response = await fetch(`${API_BASE_URL}/inventory_overview`);
         if (!response.ok) throw new Error('Не удалось загрузить товары');
 
         const products = await response.json();
@@ -1285,42 +1272,24 @@ async function loadProductsForSale() {
         let hasProductsWithStock = false;
 
         for (const product of products) {
-            try {
-                const purchasesResponse = await fetch(`${API_BASE_URL}/get_purchase_by_product/${product.id}`);
-                if (purchasesResponse.ok) {
-                    const purchases = await purchasesResponse.json();
+            // Calculate total available quantity
+            const totalAvailable = product.batches.reduce((sum, purchase) => sum + purchase.current_count, 0);
 
-                    // Calculate total available quantity
-                    const totalAvailable = purchases.reduce((sum, purchase) => sum + (purchase.current_count || 0), 0);
-
-                    // Only add products with available stock
-                    if (totalAvailable > 0) {
-                        hasProductsWithStock = true;
-
-                        const option = document.createElement('option');
-                        option.value = product.id;
-                        option.textContent = product.name;
-                        option.dataset.availableQuantity = totalAvailable;
-
-                        // Store the latest purchase ID and price for this product
-                        if (purchases.length > 0) {
-                            // Сортируем закупки от старых к новым
-                            const sortedPurchases = purchases
-                                .filter(purchase => purchase.current_count > 0)  // Только с ненулевым остатком
-                                .sort((a, b) => new Date(a.created_on) - new Date(b.created_on));
-
-                            if (sortedPurchases.length > 0) {
-                                const oldestPurchase = sortedPurchases[0];  // Берем самую старую
-                                option.dataset.purchaseId = oldestPurchase.id;
-                                option.dataset.sellingPrice = oldestPurchase.selling_price;
-                            }
-                        }
+            // Only add products with available stock
+            if (totalAvailable > 0) {
+                hasProductsWithStock = true;
 
-                        productSelect.appendChild(option);
-                    }
-                }
-            } catch (error) {
-                console.error(`Ошибка при загрузке закупок для товара ${product.id}:`, error);
+                const option = document.createElement('option');
+                option.value = product.id;
+                option.textContent = product.name;
+                option.dataset.availableQuantity = totalAvailable;
+
+                // Store the oldest open purchase ID and price for this product (FIFO)
+                const oldestPurchase = product.batches[0];
+                option.dataset.purchaseId = oldestPurchase.id;
+                option.dataset.sellingPrice = oldestPurchase.selling_price;
+
+                productSelect.appendChild(option);
             }
         }
 
@@ -1559,8 +1528,8 @@ async function loadProductsForWriteoff() {
     }
 
     try {
-        // Fetch products
-        const response = await fetch(`${API_BASE_URL}/get_product_all`);
+        // Получаем товары вместе с открытыми партиями одним запросом
+        const response = await fetch(`${API_BASE_URL}/inventory_overview`);
         if (!response.ok) throw new Error('Не удалось загрузить товары');
 
         const products = await response.json();
@@ -1577,33 +1546,20 @@ async function loadProductsForWriteoff() {
         let hasProductsWithStock = false;
 
         for (const product of products) {
-            try {
-                const purchasesResponse = await fetch(`${API_BASE_URL}/get_purchase_by_product/${product.id}`);
-                if (purchasesResponse.ok) {
-                    const purchases = await purchasesResponse.json();
-
-                    // Проверяем, есть ли партии с ненулевым остатком
-                    const purchasesWithStock = purchases.filter(purchase =>
-                        purchase.current_count && purchase.current_count > 0);
+            // Только добавляем товар, если есть хотя бы одна партия с остатком
+            if (product.batches.length > 0) {
+                hasProductsWithStock = true;
 
-                    // Только добавляем товар, если есть хотя бы одна партия с остатком
-                    if (purchasesWithStock.length > 0) {
-                        hasProductsWithStock = true;
-
-                        const option = document.createElement('option');
-                        option.value = product.id;
-                        option.textContent = product.name;
+                const option = document.createElement('option');
+                option.value = product.id;
+                option.textContent = product.name;
 
-                        // Сохраняем общее доступное количество
-                        const totalAvailable = purchasesWithStock.reduce(
-                            (sum, purchase) => sum + purchase.current_count, 0);
-                        option.dataset.availableQuantity = totalAvailable;
+                // Сохраняем общее доступное количество
+                const totalAvailable = product.batches.reduce(
+                    (sum, purchase) => sum + purchase.current_count, 0);
+                option.dataset.availableQuantity = totalAvailable;
 
-                        productSelect.appendChild(option);
-                    }
-                }
-            } catch (error) {
-                console.error(`Ошибка при загрузке закупок для товара ${product.id}:`, error);
+                productSelect.appendChild(option);
             }
         }
 
@@ -2116,11 +2072,27 @@ function loadExpensesData() {
 }
 
 // Функция для запроса данных о доходах
+// Пакетное получение закупок по списку ID: {id: закупка}
+async function fetchPurchasesByIds(ids) {
+    const response = await fetch(`${API_BASE_URL}/purchases/batch`, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({ids: [...new Set(ids)]})
+    });
+    if (!response.ok) throw new Error('Не удалось загрузить закупки');
+    return await response.json();
+}
+
+// Параметры запроса для фильтрации операций по периоду на сервере
+function periodQuery(startDate, endDate) {
+    return new URLSearchParams({date_from: startDate, date_to: endDate + 'T23:59:59'}).toString();
+}
+
 async function fetchRevenueData(startDate, endDate) {
     try {
         // В реальном приложении здесь был бы запрос к API
         // Для демонстрации возвращаем тестовые данные
-        const response = await fetch(`${API_BASE_URL}/get_transactions_by_type/1`);
+        const response = await fetch(`${API_BASE_URL}/get_transactions_by_type/1?${periodQuery(startDate, endDate)}`);
         if (!response.ok) throw new Error('Не удалось загрузить данные о реализациях');
 
         const transactions = await response.json();
@@ -2135,12 +2107,12 @@ async function fetchRevenueData(startDate, endDate) {
         // Группировка по дням и подсчет сумм
         const revenueByDay = {};
 
-        for (const transaction of filteredTransactions) {
-            // Для получения закупки, чтобы узнать цену
-            const purchaseResponse = await fetch(`${API_BASE_URL}/get_purchase_by_id/${transaction.id_purchase}`);
-            if (!purchaseResponse.ok) continue;
+        // Закупки всех операций (чтобы узнать цены) - одним запросом
+        const purchases = await fetchPurchasesByIds(filteredTransactions.map(transaction => transaction.id_purchase));
 
-            const purchase = await purchaseResponse.json();
+        for (const transaction of filteredTransactions) {
+            const purchase = purchases[transaction.id_purchase];
+            if (!purchase) continue;
 
             // Расчет выручки
             const revenue = purchase.selling_price * transaction.amount;
@@ -2180,7 +2152,7 @@ async function fetchExpensesData(startDate, endDate) {
     try {
         // В реальном приложении здесь был бы запрос к API
         // Для демонстрации возвращаем тестовые данные
-        const response = await fetch(`${API_BASE_URL}/get_transactions_by_type/2`);
+        const response = await fetch(`${API_BASE_URL}/get_transactions_by_type/2?${periodQuery(startDate, endDate)}`);
         if (!response.ok) throw new Error('Не удалось загрузить данные о закупках');
 
         const transactions = await response.json();
@@ -2195,12 +2167,12 @@ async function fetchExpensesData(startDate, endDate) {
         // Группировка по дням и подсчет сумм
         const expensesByDay = {};
 
-        for (const transaction of filteredTransactions) {
-            // Для получения закупки, чтобы узнать цену
-            const purchaseResponse = await fetch(`${API_BASE_URL}/get_purchase_by_id/${transaction.id_purchase}`);
-            if (!purchaseResponse.ok) continue;
+        // Закупки всех операций (чтобы узнать цены) - одним запросом
+        const purchases = await fetchPurchasesByIds(filteredTransactions.map(transaction => transaction.id_purchase));
 
-            const purchase = await purchaseResponse.json();
+        for (const transaction of filteredTransactions) {
+            const purchase = purchases[transaction.id_purchase];
+            if (!purchase) continue;
 
             // Расчет расходов
             const expense = purchase.purchase_price * transaction.amount;
@@ -4550,214 +4522,27 @@ function generateEnhancedRecommendations(forecastData) {
  */
 async function fetchAnalyticsData(startDate, endDate) {
     try {
-        // Получаем транзакции продаж (доходы)
-        const salesResponse = await fetch(`${API_BASE_URL}/get_transactions_by_type/1`);
-        let salesTransactions = [];
-        if (salesResponse.ok) {
-            salesTransactions = await salesResponse.json();
-        }
-
-        // Получаем транзакции закупок (расходы)
-        const purchasesResponse = await fetch(`${API_BASE_URL}/get_transactions_by_type/2`);
-        let purchaseTransactions = [];
-        if (purchasesResponse.ok) {
-            purchaseTransactions = await purchasesResponse.json();
-        }
-
-        // Получаем транзакции списаний
-        const writeoffsResponse = await fetch(`${API_BASE_URL}/get_transactions_by_type/3`);
-        let writeoffTransactions = [];
-        if (writeoffsResponse.ok) {
-            writeoffTransactions = await writeoffsResponse.json();
-        }
-
-        // Получение всех товаров
-        const productsResponse = await fetch(`${API_BASE_URL}/get_product_all`);
-        let products = [];
-        if (productsResponse.ok) {
-            products = await productsResponse.json();
-        }
-
-        // Получение всех категорий
-        const categoriesResponse = await fetch(`${API_BASE_URL}/get_categories`);
-        let categories = [];
-        if (categoriesResponse.ok) {
-            categories = await categoriesResponse.json();
-        }
-
-        // Функция для получения детальной информации о закупке
-        const getPurchaseDetails = async (purchaseId) => {
-            try {
-                const response = await fetch(`${API_BASE_URL}/get_purchase_by_id/${purchaseId}`);
-                if (response.ok) {
-                    return await response.json();
-                }
-            } catch (e) {
-                console.warn(`Не удалось получить детали закупки ${purchaseId}`);
-            }
-            return null;
-        };
-
-        // Фильтрация по датам
-        const filterByDateRange = (transactions) => {
-            return transactions.filter(transaction => {
-                const transactionDate = new Date(transaction.created_on);
-                return transactionDate >= new Date(startDate) &&
-                    transactionDate <= new Date(endDate + 'T23:59:59');
-            });
-        };
-
-        // Фильтруем транзакции по выбранному диапазону дат
-        const filteredSales = filterByDateRange(salesTransactions);
-        const filteredPurchases = filterByDateRange(purchaseTransactions);
-        const filteredWriteoffs = filterByDateRange(writeoffTransactions);
-
-        // Инициализируем массив для обогащенных данных о продажах
-        const enrichedSales = [];
-
-        // Обогащаем данные о транзакциях информацией о товарах и закупках
-        for (const sale of filteredSales) {
-            const purchase = await getPurchaseDetails(sale.id_purchase);
-            if (purchase) {
-                const product = products.find(p => p.id === purchase.id_product);
-                const category = product ? categories.find(c => c.id === product.id_category) : null;
-
-                enrichedSales.push({
-                    ...sale,
-                    purchase,
-                    product,
-                    category,
-                    revenue: purchase.selling_price * sale.amount,
-                    cost: purchase.purchase_price * sale.amount,
-                    profit: (purchase.selling_price - purchase.purchase_price) * sale.amount,
-                    margin: ((purchase.selling_price - purchase.purchase_price) / purchase.selling_price * 100).toFixed(2)
-                });
-            }
-        }
-
-        // Расчет KPI
-        const totalRevenue = enrichedSales.reduce((sum, sale) => sum + sale.revenue, 0);
-        const totalCost = enrichedSales.reduce((sum, sale) => sum + sale.cost, 0);
-        const totalProfit = enrichedSales.reduce((sum, sale) => sum + sale.profit, 0);
-        const averageMargin = enrichedSales.length > 0 ?
-            enrichedSales.reduce((sum, sale) => sum + parseFloat(sale.margin), 0) / enrichedSales.length : 0;
-
-        // Формирование данных по доходам/расходам по дням
-        const revenueByDay = {};
-        const expensesByDay = {};
-        const profitByDay = {};
-
-        // Группировка данных о продажах по дням
-        enrichedSales.forEach(sale => {
-            const date = sale.created_on.split('T')[0];
-
-            if (!revenueByDay[date]) revenueByDay[date] = 0;
-            if (!expensesByDay[date]) expensesByDay[date] = 0;
-            if (!profitByDay[date]) profitByDay[date] = 0;
-
-            revenueByDay[date] += sale.revenue;
-            expensesByDay[date] += sale.cost;
-            profitByDay[date] += sale.profit;
-        });
-
-        // Данные по продажам в разрезе категорий
-        const salesByCategory = {};
-        enrichedSales.forEach(sale => {
-            const categoryName = sale.category ? sale.category.name : 'Без категории';
-
-            if (!salesByCategory[categoryName]) {
-                salesByCategory[categoryName] = {
-                    revenue: 0,
-                    profit: 0,
-                    count: 0
-                };
-            }
-
-            salesByCategory[categoryName].revenue += sale.revenue;
-            salesByCategory[categoryName].profit += sale.profit;
-            salesByCategory[categoryName].count += sale.amount;
-        });
-
-        // Данные о продуктах для ABC-анализа и топ товаров
-        const productSales = {};
-        enrichedSales.forEach(sale => {
-            const productId = sale.product ? sale.product.id : null;
-            if (!productId) return;
-
-            if (!productSales[productId]) {
-                productSales[productId] = {
-                    id: productId,
-                    name: sale.product.name,
-                    revenue: 0,
-                    profit: 0,
-                    quantity: 0,
-                    margin: 0
-                };
-            }
-
-            productSales[productId].revenue += sale.revenue;
-            productSales[productId].profit += sale.profit;
-            productSales[productId].quantity += sale.amount;
-        });
-
-        // Рассчитываем маржу для каждого продукта
-        Object.values(productSales).forEach(product => {
-            product.margin = product.revenue > 0 ? (product.profit / product.revenue * 100) : 0;
-        });
+        // Все агрегаты (KPI, динамика по дням, категории, топ товаров) и прогноз считаются на сервере
+        const [response, forecastResponse, abcResponse] = await Promise.all([
+            fetch(`${API_BASE_URL}/analytics?${periodQuery(startDate, endDate)}`),
+            fetch(`${API_BASE_URL}/forecast?${periodQuery(startDate, endDate)}&days=30`), // Прогноз на 30 дней
+            fetch(`${API_BASE_URL}/abc?${periodQuery(startDate, endDate)}`)
+        ]);
+        if (!response.ok) throw new Error('Не удалось загрузить аналитические данные');
+        if (!forecastResponse.ok) throw new Error('Не удалось загрузить прогноз продаж');
+        if (!abcResponse.ok) throw new Error('Не удалось загрузить ABC-анализ');
+
+        const analytics = await response.json();
 
         // ABC-анализ
-        const abcAnalysis = calculateABCAnalysis(Object.values(productSales));
-
-        // Сортированный массив товаров для топ-10
-        const topProductsByProfit = Object.values(productSales)
-            .sort((a, b) => b.profit - a.profit)
-            .slice(0, 10);
-
-        const topProductsBySales = Object.values(productSales)
-            .sort((a, b) => b.revenue - a.revenue)
-            .slice(0, 10);
+        const abcAnalysis = await abcResponse.json();
 
-        const topProductsByMargin = Object.values(productSales)
-            .sort((a, b) => b.margin - a.margin)
-            .filter(p => p.quantity > 0) // Отфильтровываем товары без продаж
-            .slice(0, 10);
+        // Данные для прогноза (общий прогноз выручки по всем товарам)
+        const forecastData = (await forecastResponse.json()).total;
 
-        // Данные для прогноза
-        const forecastData = generateImprovedForecastData(revenueByDay, 30); // Прогноз на 30 дней
-
-        // Активные товары (с продажами в выбранном периоде)
-        const activeProductsCount = Object.keys(productSales).length;
-
-        // Средний чек
-        const transactionCount = enrichedSales.length;
-        const averageCheck = transactionCount > 0 ? totalRevenue / transactionCount : 0;
-
-        // Оборачиваемость запасов (упрощенно)
-        const stockTurnover = totalCost > 0 ? totalRevenue / totalCost : 0;
-
-        // Формируем итоговый объект аналитических данных
         return {
-            kpi: {
-                totalRevenue,
-                totalCost,
-                totalProfit,
-                averageMargin,
-                activeProductsCount,
-                averageCheck,
-                stockTurnover,
-                transactionCount
-            },
-            revenueByDay,
-            expensesByDay,
-            profitByDay,
-            salesByCategory,
-            productSales,
+            ...analytics,
             abcAnalysis,
-            topProducts: {
-                byProfit: topProductsByProfit,
-                bySales: topProductsBySales,
-                byMargin: topProductsByMargin
-            },
             forecastData
         };
     } catch (error) {
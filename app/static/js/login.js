@@ -45,21 +45,7 @@ document.addEventListener('DOMContentLoaded', function() {
         loginButtonText.textContent = 'Выполняется вход...';
 
         try {
-            // Authenticate user
-            // First, get user by login
-            const userResponse = await fetch(`${API_BASE_URL}/get_user_by_login/${login}`);
-
-            if (!userResponse.ok) {
-                // User not found
-                showLoginError('Пользователь не найден');
-                return;
-            }
-
-            const userData = await userResponse.json();
-
-            // In a real application, we would verify the password on the server
-            // For demo, we'll validate user existence and use a separate authentication endpoint
-
+            // Authenticate user: the response contains a signed token with user id and role
             // Create auth data
             const authData = {
                 login: login,
@@ -82,13 +68,13 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Store auth info in session storage
                 sessionStorage.setItem('warehouseAuthToken', authResult.token);
                 sessionStorage.setItem('warehouseUserLogin', login);
-                sessionStorage.setItem('warehouseUserRole', userData.id_role);
+                sessionStorage.setItem('warehouseUserRole', authResult.id_role);
 
                 // If "remember me" is checked, store in local storage too
                 if (document.getElementById('rememberMe').checked) {
                     localStorage.setItem('warehouseAuthToken', authResult.token);
                     localStorage.setItem('warehouseUserLogin', login);
-                    localStorage.setItem('warehouseUserRole', userData.id_role);
+                    localStorage.setItem('warehouseUserRole', authResult.id_role);
                 }
 
                 // Redirect to inventory page
@@ -100,36 +86,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         } catch (error) {
             console.error('Login error:', error);
-            // Fallback simplified auth for testing without auth endpoint
-            // DO NOT USE IN PRODUCTION - this is just for demo
-            try {
-                const userResponse = await fetch(`${API_BASE_URL}/get_user_by_login/${login}`);
-                if (userResponse.ok) {
-                    const userData = await userResponse.json();
-
-                    // Generate a simple demo token
-                    const demoToken = btoa(`${login}:${Date.now()}`);
-
-                    // Store auth info in session storage
-                    sessionStorage.setItem('warehouseAuthToken', demoToken);
-                    sessionStorage.setItem('warehouseUserLogin', login);
-                    sessionStorage.setItem('warehouseUserRole', userData.id_role);
-
-                    // If "remember me" is checked, store in local storage too
-                    if (document.getElementById('rememberMe').checked) {
-                        localStorage.setItem('warehouseAuthToken', demoToken);
-                        localStorage.setItem('warehouseUserLogin', login);
-                        localStorage.setItem('warehouseUserRole', userData.id_role);
-                    }
-
-                    // Redirect to inventory page
-                    window.location.href = '/inventory';
-                } else {
-                    showLoginError('Пользователь не найден');
-                }
-            } catch (fallbackError) {
-                showLoginError('Ошибка при входе в систему');
-            }
+            showLoginError('Ошибка при входе в систему');
         } finally {
             // Reset button state
             loginButton.disabled = false;
@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+from app.repository import get_engine, get_session_fabric
+from app.services.service import *
+
+"""
+   Общая основа тестов на временной БД SQLite: справочники, без которых не выполняются операции
+   (параметры, роль, типы операций, категория, склад, пользователь). Тесты добавляют свои товары и закупки.
+"""
+
+PARAMS = [("VAT", 20), ("prevIndirectCosts", 2000), ("prevDirectSoldCosts", 5000), ("IndirectCosts", 0),
+          ("DirectCosts", 0), ("DirectSoldCosts", 0), ("DirectIndirectRatio", 0.4), ("GM", 40), ("Rev", 0),
+          ("NP", 0), ("TE", 0)]
+
+
+class TempDbTestCase(unittest.TestCase):
+    """ Тест на временной БД: self.engine, self.session_fabric, self.session """
+
+    def setUp(self):
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.engine = get_engine(db_url=f"sqlite:///{os.path.join(self.db_dir.name, 'test.db')}", db_sync='true')
+        self.session_fabric = get_session_fabric(self.engine)
+        self.session = self.session_fabric()
+        self.make_db()
+
+    def make_db(self):
+        """ Справочники: параметры, роль admin (id 1), типы операций (1 - продажа, 2 - закупка, 3 - списание),
+            категория 1, склад 1, пользователь admin (id 1) """
+        for key, value in PARAMS:
+            add_param(self.session, key, value)
+        add_role(self.session, 'admin')
+        for type_name in ['sale', 'purchase', 'expense']:
+            add_transaction_type(self.session, type_name)
+        create_category(self.session, 'Концтовары')
+        create_warehouse(self.session, 'Ленина, 45', 'Склад 1')
+        create_user(self.session, 'admin', 'qwerty', 1)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.db_dir.cleanup()
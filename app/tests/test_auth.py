@@ -0,0 +1,76 @@
+import time
+import unittest
+from app.services import auth
+from app.services.auth import TokenSigner, b64decode, b64encode
+
+"""
+   Тесты подписанных токенов доступа: проверка подписи и срока действия, список отзыва.
+"""
+
+SECRET = b'0123456789abcdef0123456789abcdef'
+
+
+class TestAuth(unittest.TestCase):
+
+    def setUp(self):
+        self.signer = TokenSigner(SECRET, ttl=60)
+
+    def test_create_verify(self):
+        """ Токен содержит id пользователя, логин и роль; проверяется без обращения к БД """
+        token, expires = self.signer.create(7, 'Пользователь', 2)
+        claims = self.signer.verify(token)
+        self.assertEqual((claims['sub'], claims['login'], claims['role'], claims['exp']),
+                         (7, 'Пользователь', 2, expires))
+        self.assertAlmostEqual(expires, time.time() + 60, delta=2)
+
+    def test_rejected_tokens(self):
+        """ Поврежденный, подделанный токен и токен с другим ключом подписи не принимаются """
+        token, _ = self.signer.create(1, 'admin', 1)
+        payload, _, signature = token.partition('.')
+        forged = b64encode(b64decode(payload).replace(b'"role":1', b'"role":2'))
+        self.assertIsNone(self.signer.verify(f'{forged}.{signature}'))
+        self.assertIsNone(self.signer.verify(payload))
+        self.assertIsNone(self.signer.verify('not a token'))
+        self.assertIsNone(self.signer.verify('\xe9.x'))
+        self.assertIsNone(self.signer.verify(f'{payload}.\xe9'))
+        self.assertIsNone(self.signer.verify(f'{payload}.{signature}\u0436'))
+        self.assertIsNone(TokenSigner(b'another secret' * 3).verify(token))
+
+    def test_expired(self):
+        signer = TokenSigner(SECRET, ttl=-1)
+        token, _ = signer.create(1, 'admin', 1)
+        self.assertIsNone(signer.verify(token))
+
+    def test_revoke(self):
+        """ Отозванный токен не принимается, другие токены пользователя действуют; истекшие записи удаляются """
+        token, _ = self.signer.create(1, 'admin', 1)
+        other, _ = self.signer.create(1, 'admin', 1)
+        self.signer.revoked.add('expired', time.time() - 1)
+        self.signer.revoke(self.signer.verify(token))
+        self.assertIsNone(self.signer.verify(token))
+        self.assertIsNotNone(self.signer.verify(other))
+        self.assertEqual(len(self.signer.revoked), 1)
+
+    def test_revoke_user(self):
+        """ После изменения роли или удаления пользователя его выпущенные токены не принимаются,
+            новые - принимаются """
+        token, _ = self.signer.create(1, 'admin', 1)
+        other, _ = self.signer.create(2, 'user', 2)
+        self.signer.revoke_user('admin')
+        self.assertIsNone(self.signer.verify(token))
+        self.assertIsNotNone(self.signer.verify(other))
+        token, _ = self.signer.create(1, 'admin', 2)
+        self.assertEqual(self.signer.verify(token)['role'], 2)
+
+    def test_configure(self):
+        """ Токены, выданные с ключом из конфигурации, действуют после повторной настройки с тем же ключом """
+        auth.configure_auth({'secret_key': SECRET.decode(), 'token_ttl': '120'})
+        token, _ = auth.create_token(3, 'user', 2)
+        auth.configure_auth({'secret_key': SECRET.decode()})
+        self.assertEqual(auth.verify_token(token)['sub'], 3)
+        auth.configure_auth()
+        self.assertIsNone(auth.verify_token(token))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import os
+import tempfile
+import unittest
+import benchmark
+
+"""
+   Тесты бенчмарков сервисного слоя: все бенчмарки выполняются на сгенерированной БД,
+   регрессии относительно эталона определяются по ops/s и числу запросов.
+"""
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_benchmarks_run_on_generated_dataset(self):
+        with tempfile.TemporaryDirectory() as db_dir:
+            engine, session_fabric = benchmark.create_dataset(os.path.join(db_dir, 'test.db'), 'small', seed=1)
+            try:
+                for name in benchmark.BENCHMARKS:
+                    metrics = benchmark.run_benchmark(engine, session_fabric, name, iterations=3, seed=1, warmup=0)
+                    self.assertGreater(metrics["ops_per_sec"], 0, name)
+                    self.assertGreaterEqual(metrics["queries"], 1, name)
+            finally:
+                engine.dispose()
+
+    def test_compare_with_baseline(self):
+        baseline = {"small": {"add_transaction": {"ops_per_sec": 100, "queries": 11}}}
+        results = {"small": {"add_transaction": {"ops_per_sec": 90, "queries": 11}}}
+        self.assertEqual(benchmark.compare(results, baseline, tolerance=0.2), [])
+
+        results["small"]["add_transaction"] = {"ops_per_sec": 70, "queries": 12}
+        self.assertEqual(len(benchmark.compare(results, baseline, tolerance=0.2)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import unittest
+from sqlalchemy import event
+from app.services import cache
+from app.services.service import *
+from app.tests.db_test_case import TempDbTestCase
+
+"""
+   Тесты кэша справочников и снимка параметров: чтение без запросов к БД, сброс при изменении,
+   ограничения ttl и размера.
+"""
+
+
+class TestReferenceCache(TempDbTestCase):
+
+    def setUp(self):
+        cache.configure_cache()
+        super().setUp()
+        self.queries = 0
+        event.listen(self.engine, 'before_cursor_execute', self.count_query)
+
+    def tearDown(self):
+        super().tearDown()
+        cache.configure_cache()
+
+    def count_query(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries += 1
+
+    def test_repeated_reads_hit_cache(self):
+        """ Повторное чтение справочника (в том числе в другой сессии) выполняется без запросов к БД """
+        self.assertEqual([c.name for c in get_all_categories(self.session)], ['Концтовары'])
+        self.assertEqual(self.queries, 1)
+        with self.session_fabric() as session:
+            categories = get_all_categories(session)
+            warehouse = get_warehouse_by_id(session, 1)
+            self.assertEqual(self.queries, 2)
+            self.assertEqual(get_warehouse_by_id(session, 1), warehouse)
+            self.assertEqual([c.name for c in categories], ['Концтовары'])
+            self.assertEqual((warehouse.name, warehouse.address), ('Склад 1', 'Ленина, 45'))
+            self.assertIn(warehouse, session)
+        self.assertIsNone(get_category_by_id(self.session, 2))
+        self.assertIsNone(get_category_by_id(self.session, 2))
+        self.assertEqual(self.queries, 3)
+
+    def test_writes_invalidate(self):
+        """ Создание и изменение справочника сбрасывают кэш после фиксации """
+        get_all_categories(self.session)
+        get_warehouses(self.session)
+        create_category(self.session, 'Канцелярия')
+        self.assertEqual([c.name for c in get_all_categories(self.session)], ['Концтовары', 'Канцелярия'])
+        self.assertTrue(update_category_name(self.session, 1, 'Бумага'))
+        with self.session_fabric() as session:
+            self.assertEqual(get_category_by_id(session, 1).name, 'Бумага')
+        self.assertTrue(update_warehouse_address(self.session, 1, 'Мира, 1'))
+        with self.session_fabric() as session:
+            self.assertEqual([w.address for w in get_warehouses(session)], ['Мира, 1'])
+
+        create_user(self.session, 'admin', 'qwerty', None)
+        self.assertEqual([u.login for u in get_all_users(self.session)], ['admin'])
+        self.assertTrue(delete_user(self.session, 'admin'))
+        self.assertEqual(get_all_users(self.session), [])
+
+    def test_ttl_and_size_limits(self):
+        cache.configure_cache({"ttl": 0})
+        get_warehouse_by_id(self.session, 1)
+        get_warehouse_by_id(self.session, 1)
+        self.assertEqual(self.queries, 2)
+
+        cache.configure_cache({"max_size": 2})
+        for id_category in [1, 2, 3, 1]:
+            get_category_by_id(self.session, id_category)
+        self.assertEqual(len(cache.reference_cache.entries), 2)
+        self.assertEqual(self.queries, 2 + 4)  # запись категории 1 вытеснена записями 2 и 3
+
+    def test_param_snapshot(self):
+        """ Параметры цены читаются из снимка без запросов; изменение параметра обновляет снимок """
+        create_product(self.session, 'Тетрадь', 1)
+        add_role(self.session, 'admin')
+        add_transaction_type(self.session, 'purchase')
+        create_user(self.session, 'admin', 'qwerty', 1)
+        self.assertEqual(get_pricing_params(self.session)["gm"], Decimal('0.4'))
+
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        self.assertTrue(create_purchase(self.session, 1, 10, 1, 5, 1))
+        self.assertFalse([statement for statement in statements if 'FROM params' in statement])
+
+        self.assertTrue(update_param_value(self.session, "GM", 50))
+        self.assertEqual(get_pricing_params(self.session)["gm"], Decimal('0.5'))
+        add_param(self.session, "NewParam", 1)
+        self.assertEqual(get_param_snapshot(self.session)["NewParam"], 1)
+
+    def test_etag_changes_on_writes(self):
+        """ ETag списка меняется при изменении таблицы (в том числе остатков товаров) и только тогда;
+            без общего счетчика версий ETag не выдается """
+        self.assertIsNone(cache.etag(cache.PRODUCT))
+        cache.configure_cache({"backend": "sqlite", "shared_path": os.path.join(self.db_dir.name, 'versions.db')})
+        create_product(self.session, 'Тетрадь', 1)
+
+        products, warehouses = cache.etag(cache.PRODUCT), cache.etag(cache.WAREHOUSE)
+        get_product_all(self.session)
+        self.assertEqual(cache.etag(cache.PRODUCT), products)
+        self.assertTrue(create_purchase(self.session, 1, 10, 1, 5, 1))
+        self.assertNotEqual(cache.etag(cache.PRODUCT), products)
+        products = cache.etag(cache.PRODUCT)
+        self.assertTrue(create_transaction(self.session, 1, 1, 2, 1))
+        self.assertNotEqual(cache.etag(cache.PRODUCT), products)
+        self.assertEqual(cache.etag(cache.WAREHOUSE), warehouses)
+
+    def test_shared_versions(self):
+        """ Сброс в одном процессе (здесь - второй экземпляр кэша) виден другому через общий счетчик версий """
+        options = {"backend": "sqlite", "shared_path": os.path.join(self.db_dir.name, 'versions.db')}
+        cache.configure_cache(options)
+        worker = cache.reference_cache
+        cache.configure_cache(options)
+        other_worker = cache.reference_cache
+
+        key = ('db', 'get_all_categories')
+        self.assertIs(worker.get(cache.CATEGORY, key), cache.MISS)
+        worker.set(cache.CATEGORY, key, ['Концтовары'])
+        self.assertEqual(worker.get(cache.CATEGORY, key), ['Концтовары'])
+        other_worker.invalidate(cache.CATEGORY)
+        self.assertIs(worker.get(cache.CATEGORY, key), cache.MISS)
+
+
+    def test_param_snapshot_shared_between_workers(self):
+        """ Изменение параметра в одном процессе uvicorn обновляет снимок параметров в другом
+            (два экземпляра кэша с общим счетчиком версий) """
+        versions = cache.SqliteVersions(os.path.join(self.db_dir.name, 'versions.db'))
+        worker, other_worker = cache.ReferenceCache(versions=versions), cache.ReferenceCache(versions=versions)
+        try:
+            cache.reference_cache = worker
+            self.assertEqual(get_param_snapshot(self.session)["VAT"], 20)
+            cache.reference_cache = other_worker
+            self.assertTrue(update_param_value(self.session, "VAT", 10))
+            cache.reference_cache = worker
+            self.assertEqual(get_param_snapshot(self.session)["VAT"], 10)
+        finally:
+            cache.configure_cache()
+
+if __name__ == '__main__':
+    unittest.main()
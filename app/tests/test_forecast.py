@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+from datetime import datetime, timedelta
+from app.services.service import *
+from app.services import forecast
+from app.tests.db_test_case import TempDbTestCase
+
+"""
+   Тесты прогноза продаж: векторные шаги прогноза и кэш прогнозов по товарам.
+"""
+
+
+class TestForecast(TempDbTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name in ['Тетрадь', 'Ручка']:
+            create_product(self.session, name, 1)
+        create_purchase(self.session, id_product=1, purchase_price=10, id_warehouse=1, count=100, id_user=1)
+        create_purchase(self.session, id_product=2, purchase_price=5, id_warehouse=1, count=100, id_user=1)
+        forecast.FORECAST_CACHE.clear()
+
+    def test_constant_series_forecast(self):
+        """ Постоянный ряд прогнозируется тем же значением с нулевым наклоном и сезонностью """
+        series = forecast.forecast_series(np.full((2, 28), 10.0), 7)
+        np.testing.assert_allclose(series["forecast"], 10.0)
+        np.testing.assert_allclose(series["slope"], 0, atol=1e-9)
+        np.testing.assert_allclose(series["seasonal"], 0, atol=1e-9)
+
+    def test_outliers_are_clipped(self):
+        values = np.array([[10.0] * 10 + [1000.0] + [12.0] * 10])
+        self.assertLess(forecast.clip_outliers(values).max(), 20)
+        # ряд редких продаж (нулевой межквартильный размах) не обрезается
+        sparse = np.array([[0.0] * 20 + [50.0]])
+        self.assertEqual(forecast.clip_outliers(sparse).max(), 50)
+
+    def test_sale_invalidates_only_its_product(self):
+        create_transaction(self.session, 1, 1, 3, 1)
+        create_transaction(self.session, 1, 2, 4, 1)
+        date_from = datetime.now() - timedelta(days=27)
+        first = forecast.get_forecast(self.session, [1, 2], date_from, days=7)
+        self.assertEqual(len(first["total"]["labels"]), 28 + 7)
+        selling_price = float(get_purchase_by_id(self.session, 1).selling_price)
+        self.assertEqual(first["products"][1]["actualValues"][27], round(3 * selling_price, 2))
+
+        create_transaction(self.session, 1, 1, 2, 1)
+        second = forecast.get_forecast(self.session, [1, 2], date_from, days=7)
+        self.assertIs(second["products"][2], first["products"][2])
+        self.assertIsNot(second["products"][1], first["products"][1])
+        self.assertIsNot(second["total"], first["total"])
+
+    def test_ranges_are_cached_separately(self):
+        """ Прогнозы разных периодов и горизонтов хранятся отдельно и не вытесняют друг друга """
+        create_transaction(self.session, 1, 1, 3, 1)
+        month, week = datetime.now() - timedelta(days=27), datetime.now() - timedelta(days=6)
+        first = forecast.get_forecast(self.session, [1, 2], month, days=7)
+        other = forecast.get_forecast(self.session, [1, 2], week, days=14)
+        self.assertEqual(len(other["total"]["labels"]), 7 + 14)
+        second = forecast.get_forecast(self.session, [1, 2], month, days=7)
+        self.assertIs(second["products"][1], first["products"][1])
+        self.assertIs(second["total"], first["total"])
+
+    def test_cache_size_is_bounded(self):
+        """ Число записей кэша ограничено; вытесненные записи не нужны для ответа текущего вызова """
+        create_transaction(self.session, 1, 1, 3, 1)
+        size = forecast.FORECAST_CACHE_SIZE
+        forecast.FORECAST_CACHE_SIZE = 2
+        try:
+            result = forecast.get_forecast(self.session, [1, 2], datetime.now() - timedelta(days=27), days=7)
+        finally:
+            forecast.FORECAST_CACHE_SIZE = size
+        self.assertEqual(len(forecast.FORECAST_CACHE), 2)
+        self.assertEqual(set(result["products"]), {1, 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
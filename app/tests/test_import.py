@@ -0,0 +1,57 @@
+import unittest
+from sqlalchemy import func
+from app.services.service import *
+from app.services import import_service
+from app.tests.db_test_case import TempDbTestCase
+
+"""
+   Тесты пакетного импорта закупок из CSV/NDJSON.
+"""
+
+
+class TestImport(TempDbTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name in ['Тетрадь', 'Ручка']:
+            create_product(self.session, name, 1)
+
+    def test_csv_import_matches_single_purchases(self):
+        lines = [
+            "id_product,purchase_price,id_warehouse,count\n",
+            "1,10,1,5\n",
+            "2,7.5,1,3\n",
+            "3,10,1,5\n",  # товара нет
+            "1,abc,1,5\n",  # некорректная цена
+            "1,12,1,2\n",
+            "2,5,2,1\n",  # склада нет
+        ]
+        report = import_service.import_purchases(self.session, lines, 'csv', 1, chunk_size=2)
+        self.assertEqual(report["imported"], 3)
+        self.assertEqual([error["line"] for error in report["errors"]], [4, 5, 7])
+
+        self.assertEqual(get_product_by_id(self.session, 1).total_count, 7)
+        self.assertEqual(get_product_by_id(self.session, 1).id_purchase, 1)
+        self.assertEqual(get_product_by_id(self.session, 2).total_count, 3)
+        pricing = get_pricing_params(self.session)
+        self.assertEqual(get_purchase_by_id(self.session, 2).selling_price,
+                         calc_selling_price(Decimal('7.5'), 0, pricing))
+        self.assertEqual(self.session.query(func.count(Transaction.id)).filter(Transaction.id_type == 2).scalar(), 3)
+        self.assertEqual(get_param_value(self.session, "DirectCosts"), Decimal('96.5'))
+        self.assertEqual(self.session.query(func.sum(DailySales.quantity)).scalar(), 10)
+
+    def test_ndjson_errors_reported_by_line(self):
+        lines = ['{"id_product": 1, "purchase_price": 10, "id_warehouse": 1, "count": 4}\n',
+                 '\n',
+                 '{"id_product": 1, "purchase_price": 10\n',
+                 '[1, 10, 1, 4]\n',
+                 '{"id_product": 2, "purchase_price": 10, "id_warehouse": 1, "count": 0}\n']
+        report = import_service.import_purchases(self.session, lines, 'ndjson', 1)
+        self.assertEqual(report["imported"], 1)
+        self.assertEqual([error["line"] for error in report["errors"]], [3, 4, 5])
+        with self.assertRaises(ValueError):
+            import_service.import_purchases(self.session, lines, 'ndjson', 42)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+import sqlalchemy
+from app.repository import get_engine, get_session_fabric, sync_indexes
+from app.models.dao import *
+from migrate_db import hot_query_plans, full_scans
+
+"""
+   Тесты индексов БД: "горячие" запросы сервисного слоя не должны выполнять полный просмотр таблиц,
+   а недостающие индексы должны досоздаваться в уже существующей БД.
+"""
+
+
+class TestIndexes(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.engine = get_engine(db_url=f"sqlite:///{os.path.join(self.db_dir.name, 'test.db')}", db_sync='true')
+        self.session_fabric = get_session_fabric(self.engine)
+        with self.session_fabric() as session:
+            session.add(Product(id=1, name='Тетрадь', total_count=10))
+            session.add(Purchase(id=1, id_product=1, purchase_price=10, selling_price=20, count=10, current_count=10))
+            session.add(Transaction(id_type=2, id_purchase=1, amount=10))
+            session.commit()
+
+    def test_hot_queries_use_indexes(self):
+        """ Ни один из "горячих" запросов не просматривает таблицу целиком """
+        for name, statements in hot_query_plans(self.engine, self.session_fabric).items():
+            self.assertTrue(statements, name)
+            for statement, plan in statements:
+                self.assertEqual(full_scans(plan), [], f'{name}: {statement}')
+
+    def test_find_next_purchase_uses_partial_index(self):
+        plans = hot_query_plans(self.engine, self.session_fabric)['find_next_purchase']
+        self.assertIn('ix_purchase_open_batches', ' '.join(plans[0][1]))
+
+    def test_sync_indexes_on_existing_db(self):
+        """ Удаленный индекс восстанавливается без пересоздания таблиц """
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql('DROP INDEX ix_transaction_type_created')
+        self.assertEqual(sync_indexes(self.engine), ['ix_transaction_type_created'])
+        self.assertEqual(sync_indexes(self.engine), [])
+        names = {index['name'] for index in sqlalchemy.inspect(self.engine).get_indexes('transaction')}
+        self.assertIn('ix_transaction_type_created', names)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.db_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import unittest
+from app import logging_config
+
+"""
+   Тесты логирования: запись через очередь в отдельном потоке, уровни логгеров и структурированные поля.
+"""
+
+
+class TestLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.log_dir.name, 'app.log')
+
+    def read_log(self) -> list:
+        logging_config.stop_logging()
+        with open(self.log_file, encoding='utf-8') as file:
+            return file.read().splitlines()
+
+    def test_levels_and_structured_fields(self):
+        logging_config.setup_logging({'file': self.log_file, 'level': 'INFO', 'format': 'json',
+                                      'levels': 'test.quiet:WARNING'})
+        logging.getLogger('test.quiet').info("не выводится")
+        logging.getLogger('test.debug').debug("не выводится")
+        logging.getLogger('test.app').info("Товар %s", 5, extra={"id_product": 5})
+
+        records = [json.loads(line) for line in self.read_log() if '"test.' in line]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["message"], "Товар 5")
+        self.assertEqual(records[0]["id_product"], 5)
+
+    def test_formatting_off_request_thread(self):
+        threads = []
+
+        class Value:
+            def __str__(self):
+                threads.append(threading.current_thread())
+                return 'value'
+
+        # очередь принимает запись без подстановки аргументов и форматирования
+        record = logging.LogRecord('test.app', logging.INFO, '', 0, "Значение %s", (Value(),), None)
+        logging_config.BackgroundQueueHandler(None).prepare(record)
+        self.assertEqual(threads, [])
+
+        logging_config.setup_logging({'file': self.log_file, 'level': 'INFO'})
+        logging.getLogger('test.app').warning("Значение %s", Value(), extra={"route": "/api/products"})
+        lines = self.read_log()
+        self.assertTrue(any(line.endswith('test.app: Значение value route=/api/products') for line in lines))
+        self.assertTrue(any(thread is not threading.current_thread() for thread in threads))
+
+    def tearDown(self):
+        logging_config.stop_logging()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, logging_config.BackgroundQueueHandler):
+                root.removeHandler(handler)
+        root.setLevel(logging.WARNING)
+        self.log_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
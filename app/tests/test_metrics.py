@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from app import metrics
+from app.repository import get_engine, get_session_fabric
+
+"""
+   Тесты метрик: гистограммы по шаблону маршрута, ошибки и число SQL-запросов на HTTP-запрос.
+"""
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.engine = get_engine(db_url=f"sqlite:///{os.path.join(self.db_dir.name, 'test.db')}", db_sync='true')
+        metrics.instrument_engine(self.engine)
+        session_fabric = get_session_fabric(self.engine)
+        for metric in metrics.METRICS:
+            metric.values.clear()
+
+        app = FastAPI()
+        app.add_middleware(metrics.MetricsMiddleware)
+        app.add_api_route('/metrics', metrics.metrics_endpoint)
+
+        @app.get('/items/{id_item}')
+        def get_item(id_item: int):
+            if id_item == 0:
+                raise HTTPException(status_code=500)
+            with session_fabric() as session:
+                for _ in range(id_item):
+                    session.execute(text('SELECT 1'))
+            return {"id": id_item}
+
+        self.client = TestClient(app)
+
+    def test_request_metrics_by_route_template(self):
+        self.client.get('/items/2')
+        self.client.get('/items/3')
+        self.client.get('/items/0')
+        text_metrics = self.client.get('/metrics').text
+
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/items/{id_item}"} 3', text_metrics)
+        self.assertIn('http_requests_total{method="GET",route="/items/{id_item}",status="200"} 2', text_metrics)
+        self.assertIn('http_request_errors_total{method="GET",route="/items/{id_item}"} 1', text_metrics)
+        self.assertIn('db_statements_total{route="/items/{id_item}"} 5', text_metrics)
+        self.assertIn('http_request_db_statements_bucket{route="/items/{id_item}",le="2"} 2', text_metrics)
+        self.assertIn('http_request_db_statements_bucket{route="/items/{id_item}",le="+Inf"} 3', text_metrics)
+
+    def test_statements_outside_requests_not_counted(self):
+        with self.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        self.assertEqual(metrics.DB_STATEMENTS.values, {})
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.db_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
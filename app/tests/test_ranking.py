@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+from app.services.service import *
+from app.services import ranking
+from app.tests.db_test_case import TempDbTestCase
+
+"""
+   Тесты ABC-анализа и рейтингов товаров.
+"""
+
+
+class TestRanking(TempDbTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for id_product, name in enumerate(['Тетрадь', 'Ручка', 'Карандаш'], start=1):
+            create_product(self.session, name, 1)
+            create_purchase(self.session, id_product=id_product, purchase_price=10, id_warehouse=1, count=100,
+                            id_user=1)
+
+    def test_rank_products(self):
+        """ Группы по накопленной доле прибыли: A - до 70%, B - до 90%, C - остальные """
+        result = ranking.rank_products(np.array([80.0, 700.0, 30.0, 200.0]), np.zeros(4))
+        self.assertEqual(result["group"].tolist(), ['C', 'A', 'C', 'B'])
+        self.assertEqual(result["rank_profit"].tolist(), [3, 1, 4, 2])
+
+    def test_ranking_refreshed_after_sales(self):
+        create_transaction(self.session, 1, 1, 10, 1)
+        create_transaction(self.session, 1, 2, 2, 1)
+        abc = ranking.get_abc(self.session)
+        self.assertEqual([product["id"] for product in abc["topProducts"]["bySales"]], [1, 2])
+        self.assertFalse(ranking.ranking_is_stale(self.session))
+
+        create_transaction(self.session, 1, 2, 20, 1)
+        self.assertTrue(ranking.ranking_is_stale(self.session))
+        abc = ranking.get_abc(self.session, top_n=1)
+        self.assertEqual([product["id"] for product in abc["topProducts"]["byProfit"]], [2])
+        self.assertEqual(abc["A"]["products"][0]["quantity"], 22)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from datetime import datetime
+from decimal import Decimal
+import orjson
+from app.models.dto.product_dto import ProductDTO
+from app.responses import ORJSONResponse, row_dicts
+from app.services.service import *
+from app.tests.db_test_case import TempDbTestCase
+
+"""
+   Тесты сериализации ответов API: orjson и строки Row сервиса.
+"""
+
+
+class TestResponses(TempDbTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name in ['Тетрадь', 'Ручка']:
+            create_product(self.session, name, 1)
+
+    def test_render_like_jsonable_encoder(self):
+        """ Decimal - целым числом или float (как jsonable_encoder), даты - ISO 8601, ключи-числа - строки """
+        body = ORJSONResponse({1: [Decimal('10'), Decimal('10.50'), datetime(2025, 3, 1, 12, 30)]}).body
+        self.assertEqual(orjson.loads(body), {"1": [10, 10.5, "2025-03-01T12:30:00"]})
+
+    def test_rows(self):
+        """ Списки товаров - строки Row с полями модели: сериализуются напрямую и проходят валидацию DTO """
+        products = get_product_all(self.session)
+        self.assertEqual(row_dicts(products)[1],
+                         {"id": 2, "name": "Ручка", "id_category": 1, "total_count": 0, "id_purchase": None,
+                          "price_mod": 0})
+        self.assertEqual(ProductDTO.model_validate(products[0]).name, 'Тетрадь')
+        self.assertEqual(row_dicts([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
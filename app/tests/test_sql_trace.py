@@ -0,0 +1,55 @@
+import unittest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import sql_trace
+from app.services.service import *
+from app.tests.db_test_case import TempDbTestCase
+
+"""
+   Тесты трассировки SQL: нормализация запросов и поиск повторяющихся запросов (N+1).
+"""
+
+
+class TestSqlTrace(TempDbTestCase):
+
+    def setUp(self):
+        super().setUp()
+        sql_trace.instrument_engine(self.engine)
+        for name in ['Тетрадь', 'Ручка', 'Карандаш']:
+            create_product(self.session, name, 1)
+
+    def test_normalize_statement(self):
+        self.assertEqual(sql_trace.normalize_statement("SELECT * FROM t WHERE id IN (?, ?, ?) AND name = 'x'\n"
+                                                       "LIMIT 10"),
+                         "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?")
+        self.assertEqual(sql_trace.normalize_statement("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)"),
+                         "INSERT INTO t (a, b) VALUES (...)")
+
+    def test_repeated_shapes_detected(self):
+        with sql_trace.trace() as sql:
+            for id_product in [1, 2, 3]:
+                get_product_by_id(self.session, id_product)
+            get_products_by_ids(self.session, [1, 2, 3])
+        self.assertEqual(sql.statements, 4)
+        repeated = sql.repeated(threshold=3)
+        self.assertEqual(len(repeated), 1)
+        self.assertIn('FROM product WHERE product.id = ?', repeated[0][0])
+        self.assertEqual(repeated[0][1], 3)
+
+    def test_middleware_header(self):
+        app = FastAPI()
+        app.add_middleware(sql_trace.SqlTraceMiddleware, threshold=2)
+
+        @app.get('/products')
+        def get_products():
+            with self.session_fabric() as session:
+                return [get_product_by_id(session, id_product).name for id_product in [1, 2]]
+
+        with self.assertLogs(level='WARNING') as logs:
+            response = TestClient(app).get('/products')
+        self.assertTrue(response.headers['x-sql-trace'].startswith('statements=2; shapes=1; repeated=1'))
+        self.assertIn('2x', logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
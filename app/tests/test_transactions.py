@@ -0,0 +1,168 @@
+import unittest
+from sqlalchemy import event, text
+from app.services.service import *
+from app.tests.db_test_case import TempDbTestCase
+
+"""
+   Тесты операций закупки/продажи/списания на временной БД SQLite.
+"""
+
+
+class TestTransactions(TempDbTestCase):
+
+    def setUp(self):
+        super().setUp()
+        create_product(self.session, 'Тетрадь', 1)
+        for price in [10, 12, 15]:
+            create_purchase(self.session, id_product=1, purchase_price=price, id_warehouse=1, count=5, id_user=1)
+
+        self.commits = 0
+        event.listen(self.engine, 'commit', self.count_commit)
+
+    def count_commit(self, conn):
+        self.commits += 1
+
+    def test_sale_over_several_batches_is_one_commit(self):
+        """ Продажа с переходом на следующие партии фиксируется одним commit """
+        self.assertTrue(create_transaction(self.session, 1, 1, 12, 1))
+        self.assertEqual(self.commits, 1)
+        self.assertEqual([p.current_count for p in self.session.query(Purchase).order_by(Purchase.id)], [0, 0, 3])
+        product = get_product_by_id(self.session, 1)
+        self.assertEqual(product.total_count, 3)
+        self.assertEqual(product.id_purchase, 3)
+        sales = self.session.query(Transaction).filter(Transaction.id_type == 1).all()
+        self.assertEqual([(t.id_purchase, t.amount) for t in sales], [(1, 5), (2, 5), (3, 2)])
+
+    def test_failed_sale_changes_nothing(self):
+        """ Продажа больше общего остатка откатывается целиком """
+        self.assertFalse(create_transaction(self.session, 1, 1, 100, 1))
+        self.assertEqual([p.current_count for p in self.session.query(Purchase)], [5, 5, 5])
+        self.assertEqual(get_product_by_id(self.session, 1).total_count, 15)
+        self.assertEqual(self.session.query(Transaction).filter(Transaction.id_type == 1).count(), 0)
+        self.assertEqual(get_param_value(self.session, "Rev"), 0)
+
+    def test_purchase_is_one_commit(self):
+        self.assertTrue(create_purchase(self.session, id_product=1, purchase_price=20, id_warehouse=1, count=5,
+                                        id_user=1))
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(get_product_by_id(self.session, 1).total_count, 20)
+
+    def test_lock_reloads_stale_record(self):
+        """ Чтение с блокировкой возвращает значения из БД, а не устаревшую запись сессии """
+        # ссылки удерживают записи в сессии (identity map хранит слабые ссылки)
+        purchase, product = get_purchase_by_id(self.session, 1), get_product_by_id(self.session, 1)
+        self.assertEqual((purchase.current_count, product.total_count), (5, 15))
+        with self.engine.begin() as connection:
+            connection.execute(text("UPDATE purchase SET current_count = 2 WHERE id = 1"))
+            connection.execute(text("UPDATE product SET total_count = 12 WHERE id = 1"))
+        self.assertEqual(get_purchase_by_id(self.session, 1, for_update=True).current_count, 2)
+        self.assertEqual(get_product_by_id(self.session, 1, for_update=True).total_count, 12)
+        with self.engine.begin() as connection:
+            connection.execute(text("UPDATE purchase SET current_count = 1 WHERE id = 1"))
+        self.assertEqual(get_by_ids(self.session, Purchase, [1], for_update=True)[1].current_count, 1)
+
+    def test_param_ledger_rollup(self):
+        """ Приращения пишутся в журнал и сворачиваются в итоги периода """
+        create_transaction(self.session, 1, 1, 2, 1)
+        selling_price = get_purchase_by_id(self.session, 1).selling_price
+        create_expense(self.session, 'Аренда', 100, 1, 'Аренда помещения')
+        self.assertEqual(get_param(self.session, "Rev").value, 0)
+        self.assertEqual(get_param_value(self.session, "Rev"), 2 * selling_price)
+        self.assertEqual(get_param_value(self.session, "IndirectCosts"), 100)
+
+        calc_period_results(self.session)
+        self.assertEqual(self.session.query(ParamDelta).count(), 0)
+        self.assertEqual(get_param(self.session, "Rev").value, 2 * selling_price)
+        self.assertEqual(get_param(self.session, "prevIndirectCosts").value, 100)
+        self.assertEqual(get_param_value(self.session, "DirectSoldCosts"), 2 * 10)
+
+    def test_rollup_keeps_delta_committed_during_rollup(self):
+        """ Приращение, зафиксированное другой транзакцией после чтения журнала (с меньшим id),
+            не удаляется сверткой и попадает в следующую """
+        increase_param(self.session, "Rev", 10)
+        increase_param(self.session, "Rev", 5)
+        self.session.commit()
+        ledger_read = []
+
+        def insert_late_delta(conn, cursor, statement, parameters, context, executemany):
+            # следующий запрос после чтения журнала: строки журнала уже прочитаны и просуммированы
+            if len(ledger_read) == 1:
+                ledger_read.append(True)
+                with self.engine.begin() as connection:
+                    connection.execute(text("INSERT INTO param_ledger (id, key, delta) VALUES (0, 'Rev', 7)"))
+            if 'param_ledger.delta' in statement and not ledger_read:
+                ledger_read.append(True)
+
+        event.listen(self.engine, 'before_cursor_execute', insert_late_delta)
+        rollup_param_ledger(self.session)
+        event.remove(self.engine, 'before_cursor_execute', insert_late_delta)
+        self.assertEqual(get_param(self.session, "Rev").value, 15)
+        self.assertEqual(get_param_value(self.session, "Rev"), 22)
+
+    def test_daily_totals_match_rebuild(self):
+        """ Дневные итоги, обновляемые операциями, совпадают с пересчитанными по таблицам операций """
+        create_transaction(self.session, 1, 1, 7, 1)
+        create_transaction(self.session, 3, 2, 1, 1)
+        create_expense(self.session, 'Аренда', 100, 1)
+        create_expense(self.session, 'Связь', 50, 1)
+
+        def totals():
+            self.session.expire_all()
+            sales = sorted((row.id_type, row.quantity, float(row.revenue), float(row.cost), row.count,
+                            round(float(row.margin_sum), 6)) for row in self.session.query(DailySales))
+            expenses = [(float(row.cost), row.count) for row in self.session.query(DailyExpenses)]
+            return sales, expenses
+
+        incremental = totals()
+        self.assertEqual(incremental[1], [(150, 2)])
+        self.assertEqual([row[:2] for row in incremental[0]], [(1, 7), (2, 15), (3, 1)])
+        self.assertTrue(rebuild_totals(self.session))
+        self.assertEqual(totals(), incremental)
+
+        analytics = get_analytics(self.session)
+        self.assertEqual(analytics["kpi"]["transactionCount"], 2)
+        self.assertEqual(analytics["productSales"][1]["quantity"], 7)
+
+    def state(self):
+        self.session.expire_all()
+        return ([(p.id, p.current_count) for p in self.session.query(Purchase).order_by(Purchase.id)],
+                [(p.total_count, p.id_purchase) for p in self.session.query(Product)],
+                [(t.id_type, t.id_purchase, t.amount) for t in self.session.query(Transaction).order_by(Transaction.id)
+                 if t.id_type != 2],
+                [(d.id_type, d.quantity, float(d.revenue), float(d.cost), d.count)
+                 for d in self.session.query(DailySales).order_by(DailySales.id_type)],
+                [float(get_param_value(self.session, key)) for key in ("Rev", "DirectSoldCosts", "IndirectCosts")])
+
+    def test_bulk_matches_single_operations(self):
+        """ Пакетная операция дает тот же результат, что и те же операции по одной """
+        create_transaction(self.session, 1, 1, 7, 1)
+        create_transaction(self.session, 3, 2, 3, 1)
+        create_transaction(self.session, 1, 3, 4, 1)
+        expected = self.state()
+        self.tearDown()
+        self.setUp()
+
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        result = add_bulk_transactions(self.session, [
+            {"id_type": 1, "id_product": 1, "amount": 7},
+            {"id_type": 3, "id_product": 1, "amount": 3, "id_purchase": 2},
+            {"id_type": 1, "id_product": 1, "amount": 4},
+        ], 1)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual([[(t["id_purchase"], t["amount"]) for t in line] for line in result],
+                         [[(1, 5), (2, 2)], [(2, 3)], [(3, 4)]])
+        # число запросов не зависит от числа строк и затронутых партий
+        self.assertEqual(len(statements), 10)
+        self.assertEqual(self.state(), expected)
+
+    def test_bulk_is_all_or_nothing(self):
+        with self.assertRaises(ValueError):
+            add_bulk_transactions(self.session, [{"id_type": 1, "id_product": 1, "amount": 5},
+                                                 {"id_type": 1, "id_product": 1, "amount": 11}], 1)
+        self.assertEqual([p.current_count for p in self.session.query(Purchase)], [5, 5, 5])
+        self.assertEqual(self.session.query(Transaction).filter(Transaction.id_type == 1).count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from configparser import RawConfigParser
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app.models.dao import Product, Purchase, Warehouse
+from app.repository import get_engine, get_session_fabric
+from app.services import service
+import populate_db
+
+""" Микро-бенчмарки "горячих" функций сервисного слоя на сгенерированных БД SQLite разного размера.
+    Для каждой функции выводятся операций в секунду, задержка p50/p99 и число SQL-запросов на операцию.
+    Результаты сравниваются с сохраненным эталоном: регрессия - падение ops/s больше допуска
+    или рост числа запросов; при регрессиях скрипт завершается с кодом 1 """
+
+# Наборы данных: (товаров, складов, дней истории, продаж в день)
+DATASETS = {
+    'small': (100, 4, 30, 100),
+    'medium': (1000, 20, 90, 1000),
+    'large': (5000, 50, 180, 5000),
+}
+
+ITERATIONS = 200
+WARMUP = 10
+SEED = 42
+TOLERANCE = 0.2  # допустимое падение ops/s относительно эталона (доля)
+BASELINE_FILE = 'benchmark_baseline.json'
+
+
+def pick_product(db, rng: random.Random, context: dict, min_current: int = 1) -> Product:
+    """ Случайный товар, в текущей партии которого не меньше min_current единиц """
+    for _ in range(1000):
+        product = db.get(Product, rng.choice(context["products"]))
+        if product.id_purchase is not None and db.get(Purchase, product.id_purchase).current_count >= min_current:
+            return product
+    raise RuntimeError("В наборе данных нет товаров с остатком")
+
+
+def setup_create_purchase(db, rng: random.Random, context: dict) -> tuple:
+    return (rng.choice(context["products"]), round(rng.uniform(10, 500), 2), rng.choice(context["warehouses"]),
+            rng.randint(10, 100), 1)
+
+
+def setup_sale(db, rng: random.Random, context: dict) -> tuple:
+    """ Продажа одной единицы из текущей партии (без перехода на следующую партию) """
+    product = pick_product(db, rng, context, min_current=2)
+    return 1, product.id_purchase, 1, 1
+
+
+def setup_sale_spill(db, rng: random.Random, context: dict) -> tuple:
+    """ Продажа остатка текущей партии и одной единицы следующей (новой) партии - переход по FIFO """
+    product = pick_product(db, rng, context)
+    service.create_purchase(db, product.id, 10, rng.choice(context["warehouses"]), 5, 1)
+    return 1, product.id_purchase, db.get(Purchase, product.id_purchase).current_count + 1, 1
+
+
+def setup_find_next_purchase(db, rng: random.Random, context: dict) -> tuple:
+    product = pick_product(db, rng, context)
+    return product.id, product.id_purchase
+
+
+def setup_transactions_by_type(db, rng: random.Random, context: dict) -> tuple:
+    """ Операции одного типа за последнюю неделю (как при выборе периода в интерфейсе) """
+    return rng.choice([1, 2, 3]), context["now"] - timedelta(days=7), context["now"]
+
+
+# Бенчмарки: имя -> (подготовка аргументов (не измеряется), измеряемая функция сервиса)
+BENCHMARKS = {
+    'create_purchase': (setup_create_purchase, service.create_purchase),
+    'add_transaction': (setup_sale, service.create_transaction),
+    'add_transaction_fifo_spill': (setup_sale_spill, service.create_transaction),
+    'find_next_purchase': (setup_find_next_purchase, service.find_next_purchase),
+    'get_transactions_by_id_product': (lambda db, rng, context: (rng.choice(context["products"]),),
+                                       service.get_transactions_by_id_product),
+    'get_transactions_by_type': (setup_transactions_by_type, service.get_transactions_by_type),
+    'calc_period_results': (lambda db, rng, context: (), service.calc_period_results),
+}
+
+
+def create_dataset(db_path: str, size: str, seed: int, db_options=None):
+    """ Создает БД SQLite набора данных size (populate_db --fast) и возвращает (engine, фабрика сессий) """
+    n_products, n_warehouses, days, sales_per_day = DATASETS[size]
+    engine = get_engine(db_url=f"sqlite:///{db_path}", db_sync='true', db_options=db_options)
+    session_fabric = get_session_fabric(engine)
+    with session_fabric() as session:
+        populate_db.populate_params(session)
+        populate_db.populate_role(session)
+        populate_db.populate_transaction_type(session)
+        populate_db.populate_categories(session)
+        service.create_user(session, 'admin', 'qwerty', 1)
+        service.create_user(session, 'user1', 'qwerty', 2)
+        populate_db.populate_fast(session, n_products, n_warehouses, days, sales_per_day, seed)
+        service.rebuild_totals(session)
+        service.calc_period_results(session)
+    return engine, session_fabric
+
+
+def percentile(values: list, q: float) -> float:
+    """ Перцентиль q (0..1) отсортированного списка (ближайший ранг) """
+    return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))]
+
+
+def run_benchmark(engine, session_fabric, name: str, iterations: int, seed: int, warmup: int = WARMUP) -> dict:
+    """ Выполняет бенчмарк name: каждая операция - в новой сессии (как запрос к API),
+        подготовка аргументов - в отдельной сессии и не входит в измерения """
+    setup, func = BENCHMARKS[name]
+    rng = random.Random(seed)
+    with session_fabric() as session:
+        context = {
+            "products": [row.id for row in session.query(Product.id).filter(Product.total_count > 0)],
+            "warehouses": [row.id for row in session.query(Warehouse.id)],
+            "now": datetime.now(),
+        }
+
+    queries = [0]
+
+    def count_query(conn, cursor, statement, parameters, execution_context, executemany):
+        queries[0] += 1
+
+    latencies, query_counts = [], []
+    for i in range(warmup + iterations):
+        with session_fabric() as session:
+            args = setup(session, rng, context)
+        with session_fabric() as session:
+            queries[0] = 0
+            event.listen(engine, 'before_cursor_execute', count_query)
+            started = time.perf_counter()
+            try:
+                func(session, *args)
+            finally:
+                elapsed = time.perf_counter() - started
+                event.remove(engine, 'before_cursor_execute', count_query)
+        if i >= warmup:
+            latencies.append(elapsed)
+            query_counts.append(queries[0])
+
+    latencies.sort()
+    return {
+        "ops_per_sec": round(len(latencies) / sum(latencies), 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "queries": round(sum(query_counts) / len(query_counts), 2),
+    }
+
+
+def run_benchmarks(sizes: list, names: list, iterations: int = ITERATIONS, seed: int = SEED, db_options=None,
+                   warmup: int = WARMUP) -> dict:
+    """ Результаты {набор данных: {бенчмарк: метрики}}; каждый набор данных - во временном файле SQLite """
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as db_dir:
+            started = time.perf_counter()
+            engine, session_fabric = create_dataset(os.path.join(db_dir, 'benchmark.db'), size, seed, db_options)
+            print(f"Набор данных {size}: {DATASETS[size]} создан за {time.perf_counter() - started:.1f} с")
+            try:
+                results[size] = {name: run_benchmark(engine, session_fabric, name, iterations, seed, warmup)
+                                 for name in names}
+            finally:
+                engine.dispose()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float = TOLERANCE) -> list:
+    """ Регрессии относительно эталона: падение ops/s больше tolerance или рост числа запросов на операцию """
+    regressions = []
+    for size, benchmarks in results.items():
+        for name, metrics in benchmarks.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            if metrics["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+                regressions.append(f"{size}/{name}: {metrics['ops_per_sec']} ops/s "
+                                   f"(эталон {base['ops_per_sec']})")
+            if metrics["queries"] > base["queries"]:
+                regressions.append(f"{size}/{name}: {metrics['queries']} запросов на операцию "
+                                   f"(эталон {base['queries']})")
+    return regressions
+
+
+def print_results(results: dict, baseline: dict):
+    for size, benchmarks in results.items():
+        print(f"\n{size}")
+        print(f"{'бенчмарк':<32}{'ops/s':>12}{'эталон':>12}{'p50, мс':>10}{'p99, мс':>10}{'запросов':>10}")
+        for name, metrics in benchmarks.items():
+            base = baseline.get(size, {}).get(name, {}).get("ops_per_sec", '-')
+            print(f"{name:<32}{metrics['ops_per_sec']:>12}{base:>12}{metrics['p50_ms']:>10}"
+                  f"{metrics['p99_ms']:>10}{metrics['queries']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Бенчмарки "горячих" функций сервисного слоя')
+    parser.add_argument('--sizes', nargs='+', choices=DATASETS, default=['small', 'medium'],
+                        help='наборы данных')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS), help='бенчмарки')
+    parser.add_argument('--iterations', type=int, default=ITERATIONS, help='число измеряемых операций')
+    parser.add_argument('--seed', type=int, default=SEED, help='зерно генерации данных и аргументов операций')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='файл эталонных результатов')
+    parser.add_argument('--save-baseline', action='store_true', help='сохранить результаты как эталон')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='допустимое падение ops/s (доля)')
+    parser.add_argument('--config', default='app.ini',
+                        help='файл конфигурации, из раздела [Database] которого берутся PRAGMA SQLite')
+    args = parser.parse_args()
+
+    config = RawConfigParser()
+    config.read(args.config)
+    db_options = config['Database'] if config.has_section('Database') else None
+
+    results = run_benchmarks(args.sizes, args.only, args.iterations, args.seed, db_options)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        # результаты других наборов данных и бенчмарков в эталоне сохраняются
+        for size, benchmarks in results.items():
+            baseline[size] = {**baseline.get(size, {}), **benchmarks}
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file, indent=2)
+        print(f"\nЭталон сохранен в {args.baseline}")
+    else:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"РЕГРЕССИЯ {regression}")
+        if regressions:
+            raise SystemExit(1)
@@ -0,0 +1,32 @@
+import argparse
+import time
+from app.services import import_service
+
+""" Скрипт импорта закупок (приходных накладных поставщиков) из файла CSV или NDJSON """
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Импорт закупок из файла CSV/NDJSON '
+                                                 '(поля: id_product, purchase_price, id_warehouse, count)')
+    parser.add_argument('file', help='путь к файлу')
+    parser.add_argument('--user', type=int, required=True, help='id пользователя, оформляющего закупки')
+    parser.add_argument('--format', choices=import_service.IMPORT_FORMATS,
+                        help='формат файла (по умолчанию - по расширению: .csv или .ndjson/.jsonl)')
+    parser.add_argument('--chunk-size', type=int, default=import_service.IMPORT_CHUNK_SIZE,
+                        help='число строк в одной транзакции БД')
+    args = parser.parse_args()
+
+    import_format = args.format or ('csv' if args.file.lower().endswith('.csv') else 'ndjson')
+
+    from app.config import SessionLocal
+
+    started = time.perf_counter()
+    with SessionLocal() as session, open(args.file, encoding='utf-8-sig', newline='') as file:
+        report = import_service.import_purchases(session, file, import_format, args.user, args.chunk_size)
+    elapsed = time.perf_counter() - started
+
+    for error in report["errors"]:
+        print(f"Строка {error['line']}: {error['error']}")
+    if report["error_count"] > len(report["errors"]):
+        print(f"... и еще {report['error_count'] - len(report['errors'])} ошибок")
+    print(f"Загружено партий: {report['imported']}, ошибок: {report['error_count']}, "
+          f"время: {elapsed:.2f} с ({report['imported'] / elapsed:.0f} строк/с)")
@@ -1,11 +1,40 @@
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from app.routes import router, web_router
+from app.config import engine, async_engine, debug_config, log_config
+from app.logging_config import RequestLogMiddleware, SLOW_REQUEST_MS
+from app.metrics import MetricsMiddleware, instrument_engine, metrics_endpoint
+from app import sql_trace
 from pathlib import Path
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # закрываем соединения пула при остановке сервера
+    await async_engine.dispose()
+
+
 # Инициализация FastAPI приложения
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Поля HTTP-запроса (method, route) в записях лога и запись о медленных запросах
+app.add_middleware(RequestLogMiddleware, slow_request_ms=float(log_config.get('slow_request_ms') or SLOW_REQUEST_MS))
+
+# Метрики запросов и SQL-запросов в формате Prometheus (/metrics)
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+app.add_api_route('/metrics', metrics_endpoint, include_in_schema=False)
+
+# Режим разработки: трассировка SQL-запросов и поиск повторяющихся запросов (N+1)
+if debug_config.get('sql_trace', 'false').lower() == 'true':
+    app.add_middleware(sql_trace.SqlTraceMiddleware,
+                       threshold=int(debug_config.get('sql_trace_threshold', sql_trace.SQL_TRACE_THRESHOLD)))
+    sql_trace.instrument_engine(engine)
+    sql_trace.instrument_engine(async_engine.sync_engine)
 
 # Подключаем API маршруты
 app.include_router(router)
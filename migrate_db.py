@@ -0,0 +1,86 @@
+import argparse
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.repository import sync_indexes, explain_query_plan
+from app.services import service
+from app.services.cache import invalidate, PRODUCT
+from app.models.dao import Base
+
+""" Скрипт обновления схемы существующей БД (без пересоздания) и проверки планов "горячих" запросов """
+
+# "Горячие" запросы сервисного слоя: имя -> вызов функции сервиса
+HOT_QUERIES = {
+    'find_next_purchase': lambda db: service.find_next_purchase(db, 1, 0),
+    'get_purchase_by_product': lambda db: service.get_purchase_by_product(db, 1),
+    'get_transactions_by_type': lambda db: service.get_transactions_by_type(db, 1),
+    'get_transactions_by_id_product': lambda db: service.get_transactions_by_id_product(db, 1),
+    'get_sales_by_day': lambda db: service.get_sales_by_day(db, datetime(2025, 1, 1), datetime(2025, 1, 31)),
+}
+
+
+def capture_statements(engine: Engine, session_fabric, func) -> list:
+    """ Выполняет функцию сервиса и возвращает список выполненных ею SQL-запросов с параметрами """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        with session_fabric() as session:
+            func(session)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def hot_query_plans(engine: Engine, session_fabric) -> dict:
+    """ Возвращает планы выполнения всех запросов, которые выполняют "горячие" функции сервиса """
+    plans = {}
+    for name, func in HOT_QUERIES.items():
+        plans[name] = [(statement, explain_query_plan(engine, statement, parameters))
+                       for statement, parameters in capture_statements(engine, session_fabric, func)]
+    return plans
+
+
+def full_scans(plan: list) -> list:
+    """ Строки плана, означающие полный просмотр таблицы (SCAN без использования индекса) """
+    return [line for line in plan if line.startswith('SCAN') and 'USING' not in line]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Обновление индексов БД и проверка планов запросов')
+    parser.add_argument('--check', action='store_true', help='вывести планы "горячих" запросов (только SQLite)')
+    parser.add_argument('--rebuild-totals', action='store_true',
+                        help='пересчитать итоги (daily_sales, daily_expenses, product_sales) по операциям и расходам')
+    args = parser.parse_args()
+
+    from app.config import engine, SessionLocal
+
+    # новые таблицы (например, дневные итоги) создаются, существующие не изменяются
+    Base.metadata.create_all(bind=engine)
+    created = sync_indexes(engine)
+    print("Созданы индексы:", ', '.join(created) if created else 'нет (схема актуальна)')
+
+    if args.rebuild_totals:
+        with SessionLocal() as session:
+            if not service.rebuild_totals(session):
+                raise SystemExit("Не удалось пересчитать итоги")
+        # итоги пересчитываются после изменения данных в обход сервисного слоя: ETag списков товаров
+        # в процессах приложения (общий счетчик версий, backend = sqlite) должны смениться
+        invalidate(PRODUCT)
+        print("Итоги пересчитаны")
+
+    if args.check:
+        if engine.dialect.name != 'sqlite':
+            print("Проверка планов запросов поддерживается только для SQLite")
+        else:
+            failed = False
+            for name, statements in hot_query_plans(engine, SessionLocal).items():
+                for statement, plan in statements:
+                    scans = full_scans(plan)
+                    failed = failed or bool(scans)
+                    print(f"[{'SCAN' if scans else 'OK'}] {name}: {' | '.join(plan)}")
+            if failed:
+                raise SystemExit("Есть запросы, выполняющие полный просмотр таблицы")
@@ -1,10 +1,15 @@
-from app.config import SessionLocal
 from app.services.service import *
+from app.services.cache import invalidate
+import argparse
 import random
-from datetime import datetime, timedelta
-from sqlalchemy import delete
+import time as timer
+from collections import deque
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import delete, update
 
-""" Данный скрипт заполняет БД тестовыми данными с историей транзакций за последние 6 месяцев """
+""" Данный скрипт заполняет БД тестовыми данными с историей транзакций за последние 6 месяцев.
+    С ключом --fast данные генерируются в памяти с заданным масштабом и зерном генератора случайных чисел
+    и загружаются пакетными INSERT большими пачками (миллионы операций за минуты) """
 
 ROLE = ['admin', 'user']
 TRANSACTION_TYPE = ['sale', 'purchase', 'expense']
@@ -91,6 +96,24 @@ EXPENSE_TYPES = [
 ]
 
 
+def populate_params(db: Session) -> None:
+    """Инициализация параметров расчета цен и итогов периода"""
+    add_param(db, "VAT", 20.0, description="НДС")
+    add_param(db, "prevIndirectCosts", prevIndirectCosts,
+              description="Сумма косвенных расходов за прошлый месяц")
+    add_param(db, "prevDirectSoldCosts", prevDirectSoldCosts,
+              description="Сумма прямых расходов реализованного товара за прошлый месяц")
+    add_param(db, "IndirectCosts", 0, description="Сумма косвенных расходов")
+    add_param(db, "DirectCosts", 0, description="Сумма прямых расходов")
+    add_param(db, "DirectSoldCosts", 0, description="Сумма прямых расходов реализованного товара")
+    add_param(db, "DirectIndirectRatio", DirectIndirectRatio,
+              description="Процент косвенных расходов от реализованного товара за прошлый месяц")
+    add_param(db, "GM", 40, description="Желаемая маржинальность")
+    add_param(db, "Rev", 0, description="Доход за текущий период")
+    add_param(db, "NP", 0, description="Чистая прибыль за текущий период")
+    add_param(db, "TE", 0, description="Общие расходы за текущий период")
+
+
 def populate_role(db: Session) -> None:
     for role in ROLE:
         add_role(db, role)
@@ -137,6 +160,19 @@ def populate_products(db: Session) -> dict:
     return products_dict
 
 
+def base_purchase_price(category_name: str, rng=random) -> float:
+    """Базовая цена закупки товара в зависимости от категории"""
+    if category_name == 'Электроника':
+        return rng.uniform(1000, 10000)
+    elif category_name == 'Книги':
+        return rng.uniform(300, 1200)
+    elif category_name == 'Одежда':
+        return rng.uniform(500, 3000)
+    elif category_name == 'Спорттовары':
+        return rng.uniform(300, 2000)
+    return rng.uniform(10, 500)
+
+
 def create_purchases_with_history(db: Session, products_dict: dict, start_date: datetime, end_date: datetime):
     """Создание исторических закупок товаров"""
     current_date = start_date
@@ -158,18 +194,7 @@ def create_purchases_with_history(db: Session, products_dict: dict, start_date:
             if product_name not in product_prices:
                 # Определяем базовую цену в зависимости от категории
                 category_name = next(cat for cat, products in PRODUCTS.items() if product_name in products)
-                if category_name == 'Электроника':
-                    base_price = random.uniform(1000, 10000)
-                elif category_name == 'Книги':
-                    base_price = random.uniform(300, 1200)
-                elif category_name == 'Одежда':
-                    base_price = random.uniform(500, 3000)
-                elif category_name == 'Спорттовары':
-                    base_price = random.uniform(300, 2000)
-                else:
-                    base_price = random.uniform(10, 500)
-
-                product_prices[product_name] = round(base_price, 2)
+                product_prices[product_name] = round(base_purchase_price(category_name), 2)
 
             purchase_price = product_prices[product_name]
 
@@ -339,8 +364,8 @@ def create_writeoffs_with_history(db: Session, products_dict: dict, start_date:
         current_date += day_increment
 
 
-def create_expenses_with_history(db: Session, start_date: datetime, end_date: datetime):
-    """Создание исторических расходов"""
+def expense_schedule(start_date: datetime, end_date: datetime, rng=random):
+    """Генератор исторических расходов: (название, сумма, дата)"""
     # Определяем периодичность разных типов расходов:
     # Ежемесячные, еженедельные и нерегулярные
     monthly_expenses = [0, 2, 6]  # Аренда, зарплата, налоги
@@ -359,39 +384,41 @@ def create_expenses_with_history(db: Session, start_date: datetime, end_date: da
             for expense_idx in monthly_expenses:
                 expense_name, base_amount = EXPENSE_TYPES[expense_idx]
                 # Небольшое случайное отклонение в сумме расходов
-                amount = base_amount * (0.9 + random.random() * 0.2)
-                create_expense_with_date(db, expense_name, amount, 1, current_date)
+                yield expense_name, base_amount * (0.9 + rng.random() * 0.2), current_date
 
         # Еженедельные расходы (каждый понедельник)
         if day_of_week == 0:
             for expense_idx in weekly_expenses:
                 expense_name, base_amount = EXPENSE_TYPES[expense_idx]
                 # Небольшое случайное отклонение в сумме расходов
-                amount = base_amount * (0.8 + random.random() * 0.4)
-                create_expense_with_date(db, expense_name, amount, 1, current_date)
+                yield expense_name, base_amount * (0.8 + rng.random() * 0.4), current_date
 
         # Нерегулярные расходы (случайно с вероятностью 10%)
-        if random.random() < 0.1:
-            expense_idx = random.choice(irregular_expenses)
+        if rng.random() < 0.1:
+            expense_idx = rng.choice(irregular_expenses)
             expense_name, base_amount = EXPENSE_TYPES[expense_idx]
             # Значительное случайное отклонение в сумме нерегулярных расходов
-            amount = base_amount * (0.5 + random.random() * 1.0)
-            create_expense_with_date(db, expense_name, amount, 1, current_date)
+            yield expense_name, base_amount * (0.5 + rng.random() * 1.0), current_date
 
         # Переходим к следующему дню
         current_date += day_increment
 
 
+def create_expenses_with_history(db: Session, start_date: datetime, end_date: datetime):
+    """Создание исторических расходов"""
+    for expense_name, amount, expense_date in expense_schedule(start_date, end_date):
+        create_expense_with_date(db, expense_name, amount, 1, expense_date)
+
+
 def create_expense_with_date(db: Session, name: str, cost: float, id_user: int, date: datetime):
     """Создание расхода с указанной датой"""
     expense = Expense(name=name, cost=cost, id_user=id_user, created_on=date)
 
     try:
         db.add(expense)
-        db.commit()
-
         # Увеличиваем сумму косвенных расходов
         increase_param(db, "IndirectCosts", cost)
+        db.commit()
 
         print(f"Добавлен расход '{name}' на сумму {cost:.2f} от {date.strftime('%d.%m.%Y')}")
     except Exception as e:
@@ -399,47 +426,250 @@ def create_expense_with_date(db: Session, name: str, cost: float, id_user: int,
         db.rollback()
 
 
+
+# region
+""" _______FAST_MODE______ """
+
+# Масштаб по умолчанию для --fast (каждый параметр можно задать отдельно)
+FAST_SALES_PER_DAY = 200
+FAST_CHUNK_SIZE = 50000  # число операций в одной пачке INSERT (одна транзакция БД)
+FAST_WRITEOFF_SHARE = 0.02  # доля списаний от числа продаж
+FAST_RESTOCK = (20, 200)  # размер новой партии (если остатка не хватает для продажи)
+FAST_POPULARITY = 0.8  # показатель распределения популярности товаров (Ципф): продажи 1/место^показатель
+FAST_SEASONALITY = {9: 1.5, 12: 1.5, 1: 0.7, 2: 0.7}  # множитель продаж по месяцам, как в обычном режиме
+
+
+def fast_catalog(n_products: int, n_warehouses: int):
+    """Названия товаров (с категориями) и складов нужного количества: справочники повторяются с номером копии"""
+    catalog = [(name, category) for category, names in PRODUCTS.items() for name in names]
+    products = []
+    for i in range(n_products):
+        name, category = catalog[i % len(catalog)]
+        copy = i // len(catalog)
+        products.append((name if copy == 0 else f"{name} #{copy + 1}", category))
+    warehouses = [WAREHOUSES[i] if i < len(WAREHOUSES) else (f"Промышленная, {i + 1}", f"Склад {i + 1}")
+                  for i in range(n_warehouses)]
+    return products, warehouses
+
+
+def populate_fast(db: Session, n_products: int, n_warehouses: int, days: int, sales_per_day: int, seed: int,
+                  chunk_size: int = FAST_CHUNK_SIZE):
+    """Быстрая генерация истории за days дней до сегодняшнего дня.
+    Закупки, продажи (FIFO по партиям, как в apply_transaction), списания и расходы моделируются в памяти,
+    партии и операции записываются пакетными INSERT пачками по chunk_size операций с заранее назначенными id.
+    Остатки партий и товаров и приращения параметров записываются в конце, итоги - rebuild_totals"""
+    rng = random.Random(seed)
+    pricing = get_pricing_params(db)
+    end_day = datetime.combine(date.today(), time())
+    start_day = end_day - timedelta(days=days)
+
+    # справочники
+    products, warehouses = fast_catalog(n_products, n_warehouses)
+    categories = {category.name: category.id for category in db.query(Category)}
+    first_warehouse = (db.query(func.max(Warehouse.id)).scalar() or 0) + 1
+    db.execute(insert(Warehouse.__table__), [
+        {"id": first_warehouse + i, "address": address, "name": name, "created_on": start_day}
+        for i, (address, name) in enumerate(warehouses)
+    ])
+    first_product = (db.query(func.max(Product.id)).scalar() or 0) + 1
+    product_ids = list(range(first_product, first_product + n_products))
+    db.execute(insert(Product.__table__), [
+        {"id": id_product, "name": name, "id_category": categories[category], "total_count": 0, "price_mod": 0}
+        for id_product, (name, category) in zip(product_ids, products)
+    ])
+    db.commit()
+    invalidate(WAREHOUSE)
+    warehouse_ids = list(range(first_warehouse, first_warehouse + n_warehouses))
+    base_prices = {id_product: base_purchase_price(category, rng) for id_product, (name, category)
+                   in zip(product_ids, products)}
+
+    # популярность товаров: места перемешаны, чтобы популярные товары были в разных категориях
+    places = list(range(1, n_products + 1))
+    rng.shuffle(places)
+    cum_weights, total = [], 0.0
+    for place in places:
+        total += 1 / place ** FAST_POPULARITY
+        cum_weights.append(total)
+
+    batches = {id_product: deque() for id_product in product_ids}  # открытые партии: [id, остаток, закупка, цена]
+    stock = dict.fromkeys(product_ids, 0)
+    next_ids = {"purchase": (db.query(func.max(Purchase.id)).scalar() or 0) + 1,
+                "transaction": (db.query(func.max(Transaction.id)).scalar() or 0) + 1}
+    purchase_rows, transaction_rows = [], []
+    params = dict.fromkeys(("DirectCosts", "Rev", "DirectSoldCosts", "IndirectCosts"), Decimal(0))
+    selling_prices = {}
+    loaded = {"purchases": 0, "transactions": 0}
+    started = timer.perf_counter()
+
+    def add_operation(id_type, id_purchase, amount, id_user, created_on):
+        transaction_rows.append({"id": next_ids["transaction"], "id_type": id_type, "id_purchase": id_purchase,
+                                 "amount": amount, "id_user": id_user, "created_on": created_on})
+        next_ids["transaction"] += 1
+
+    def restock(id_product, count, created_on):
+        purchase_price = Decimal(str(round(base_prices[id_product] * rng.uniform(0.9, 1.1), 2)))
+        if purchase_price not in selling_prices:
+            selling_prices[purchase_price] = calc_selling_price(purchase_price, 0, pricing)
+        id_purchase = next_ids["purchase"]
+        next_ids["purchase"] += 1
+        # остаток партии записывается в конце: закрытые партии - 0, открытые - остаток из batches
+        purchase_rows.append({"id": id_purchase, "id_product": id_product, "purchase_price": purchase_price,
+                              "selling_price": selling_prices[purchase_price],
+                              "id_warehouse": rng.choice(warehouse_ids), "count": count, "current_count": 0,
+                              "id_user": 1, "created_on": created_on})
+        batches[id_product].append([id_purchase, count, purchase_price, selling_prices[purchase_price]])
+        stock[id_product] += count
+        params["DirectCosts"] += purchase_price * count
+        add_operation(2, id_purchase, count, 1, created_on)
+
+    def sell(id_product, amount, id_user, created_on):
+        if stock[id_product] < amount:
+            restock(id_product, max(amount, rng.randint(*FAST_RESTOCK)), created_on)
+        stock[id_product] -= amount
+        open_batches = batches[id_product]
+        while amount > 0:
+            batch = open_batches[0]
+            part = min(amount, batch[1])
+            batch[1] -= part
+            amount -= part
+            params["Rev"] += batch[3] * part
+            params["DirectSoldCosts"] += batch[2] * part
+            add_operation(1, batch[0], part, id_user, created_on)
+            if batch[1] == 0:
+                open_batches.popleft()
+
+    def write_off(id_product, id_user, created_on):
+        if not batches[id_product]:
+            return
+        batch = batches[id_product][0]  # списание - только с текущей партии
+        part = rng.randint(1, min(5, batch[1]))
+        batch[1] -= part
+        stock[id_product] -= part
+        params["IndirectCosts"] += batch[2] * part
+        add_operation(3, batch[0], part, id_user, created_on)
+        if batch[1] == 0:
+            batches[id_product].popleft()
+
+    def flush():
+        if purchase_rows:
+            db.execute(insert(Purchase.__table__), purchase_rows)
+        if transaction_rows:
+            db.execute(insert(Transaction.__table__), transaction_rows)
+        db.commit()
+        loaded["purchases"] += len(purchase_rows)
+        loaded["transactions"] += len(transaction_rows)
+        purchase_rows.clear()
+        transaction_rows.clear()
+        elapsed = timer.perf_counter() - started
+        print(f"Загружено партий: {loaded['purchases']}, операций: {loaded['transactions']} "
+              f"({loaded['transactions'] / elapsed:.0f} операций/с)")
+
+    for id_product in product_ids:
+        restock(id_product, rng.randint(*FAST_RESTOCK), start_day)
+
+    for day_number in range(days):
+        day = start_day + timedelta(days=day_number)
+        factor = (1.5 if day.weekday() >= 5 else 1) * FAST_SEASONALITY.get(day.month, 1)
+        n_sales = int(sales_per_day * factor * rng.uniform(0.8, 1.2))
+        n_writeoffs = int(n_sales * FAST_WRITEOFF_SHARE + rng.random())
+        events = [(1, id_product) for id_product in rng.choices(product_ids, cum_weights=cum_weights, k=n_sales)]
+        events += [(3, id_product) for id_product in rng.choices(product_ids, k=n_writeoffs)]
+        rng.shuffle(events)
+        seconds = sorted(rng.randrange(86400) for _ in events)
+
+        for (id_type, id_product), second in zip(events, seconds):
+            created_on = day + timedelta(seconds=second)
+            if id_type == 1:
+                sell(id_product, rng.randint(1, 10), rng.randint(1, 2), created_on)
+            else:
+                write_off(id_product, rng.randint(1, 2), created_on)
+
+        if len(transaction_rows) >= chunk_size:
+            flush()
+    flush()
+
+    # расходы
+    expenses = [{"name": name, "cost": round(amount, 2), "id_user": 1, "created_on": expense_date}
+                for name, amount, expense_date in expense_schedule(start_day, end_day - timedelta(days=1), rng)]
+    if expenses:
+        db.execute(insert(Expense.__table__), expenses)
+    params["IndirectCosts"] += sum(Decimal(str(expense["cost"])) for expense in expenses)
+
+    # остатки открытых партий, остатки и текущие партии товаров, приращения параметров
+    open_purchases = [{"id": batch[0], "current_count": batch[1]} for id_product in product_ids
+                      for batch in batches[id_product]]
+    if open_purchases:
+        db.execute(update(Purchase), open_purchases)
+    db.execute(update(Product), [
+        {"id": id_product, "total_count": stock[id_product],
+         "id_purchase": batches[id_product][0][0] if batches[id_product] else None}
+        for id_product in product_ids
+    ])
+    for param_key, delta in params.items():
+        increase_param(db, param_key, delta)
+    db.commit()
+    invalidate(PRODUCT)
+    print(f"Расходов: {len(expenses)}, время загрузки: {timer.perf_counter() - started:.1f} с")
+
+
+# endregion
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Заполнение БД тестовыми данными')
+    parser.add_argument('--fast', action='store_true',
+                        help='генерация в памяти и загрузка пакетными INSERT (для больших объемов)')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='--fast: множитель числа товаров, складов и продаж в день по умолчанию')
+    parser.add_argument('--products', type=int, help='--fast: число товаров')
+    parser.add_argument('--warehouses', type=int, help='--fast: число складов')
+    parser.add_argument('--days', type=int, default=180, help='--fast: число дней истории')
+    parser.add_argument('--sales-per-day', type=int, help='--fast: среднее число продаж в день')
+    parser.add_argument('--seed', type=int, default=42, help='--fast: зерно генератора случайных чисел')
+    parser.add_argument('--chunk-size', type=int, default=FAST_CHUNK_SIZE,
+                        help='--fast: число операций в одной пачке INSERT')
+    args = parser.parse_args()
+
+    from app.config import SessionLocal
+
     # Определяем временной период для данных (6 месяцев назад от текущей даты)
     end_date = datetime.now()
     start_date = end_date - timedelta(days=180)
 
     with SessionLocal() as session:
         # Инициализация параметров
-        add_param(session, "VAT", 20.0, description="НДС")
-        add_param(session, "prevIndirectCosts", prevIndirectCosts,
-                  description="Сумма косвенных расходов за прошлый месяц")
-        add_param(session, "prevDirectSoldCosts", prevDirectSoldCosts,
-                  description="Сумма прямых расходов реализованного товара за прошлый месяц")
-        add_param(session, "IndirectCosts", 0, description="Сумма косвенных расходов")
-        add_param(session, "DirectCosts", 0, description="Сумма прямых расходов")
-        add_param(session, "DirectSoldCosts", 0, description="Сумма прямых расходов реализованного товара")
-        add_param(session, "DirectIndirectRatio", DirectIndirectRatio,
-                  description="Процент косвенных расходов от реализованного товара за прошлый месяц")
-        add_param(session, "GM", 40, description="Желаемая маржинальность")
-        add_param(session, "Rev", 0, description="Доход за текущий период")
-        add_param(session, "NP", 0, description="Чистая прибыль за текущий период")
-        add_param(session, "TE", 0, description="Общие расходы за текущий период")
+        populate_params(session)
 
         # Заполняем базовые справочники
         populate_role(session)
         populate_transaction_type(session)
         populate_categories(session)
-        populate_warehouses(session)
 
         # Создаем пользователей
         create_user(session, 'admin', 'qwerty', 1)
         create_user(session, 'user1', 'qwerty', 2)
 
-        # Заполняем товары и получаем их ID
-        products_dict = populate_products(session)
-
-        # Создаем исторические данные
-        print(f"Создание исторических данных с {start_date.strftime('%d.%m.%Y')} по {end_date.strftime('%d.%m.%Y')}")
-        create_purchases_with_history(session, products_dict, start_date, end_date)
-        create_sales_with_history(session, products_dict, start_date, end_date)
-        create_writeoffs_with_history(session, products_dict, start_date, end_date)
-
+        if args.fast:
+            n_products = args.products or sum(len(products) for products in PRODUCTS.values()) * args.scale
+            n_warehouses = args.warehouses or len(WAREHOUSES) * args.scale
+            sales_per_day = args.sales_per_day or FAST_SALES_PER_DAY * args.scale
+            print(f"Генерация истории за {args.days} дней: товаров {n_products}, складов {n_warehouses}, "
+                  f"продаж в день {sales_per_day}, зерно {args.seed}")
+            populate_fast(session, n_products, n_warehouses, args.days, sales_per_day, args.seed, args.chunk_size)
+        else:
+            populate_warehouses(session)
+
+            # Заполняем товары и получаем их ID
+            products_dict = populate_products(session)
+
+            # Создаем исторические данные
+            print(f"Создание исторических данных с {start_date.strftime('%d.%m.%Y')} "
+                  f"по {end_date.strftime('%d.%m.%Y')}")
+            create_purchases_with_history(session, products_dict, start_date, end_date)
+            create_sales_with_history(session, products_dict, start_date, end_date)
+            create_writeoffs_with_history(session, products_dict, start_date, end_date)
+
+        # Даты операций изменены задним числом (или записаны в обход сервисного слоя) - пересчитываем итоги
+        rebuild_totals(session)
 
         # Подсчет итоговых результатов
         calc_period_results(session)